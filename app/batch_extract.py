@@ -0,0 +1,228 @@
+"""
+Headless batch extraction of sustainability reports (no Streamlit).
+
+Run from the app directory:
+
+    python batch_extract.py reports/                 # every PDF in a directory
+    python batch_extract.py "reports/**/*.pdf" --max-files 4
+
+Results are written in the same CSV schema as the Streamlit app to
+data/extracted_results and added to the Parquet metrics store
+(data/metrics_store), named by file name; a run that finds two PDFs with
+the same name in different directories stops before processing. Progress is recorded in a manifest keyed by PDF
+content hash, so rerunning the same command after an interruption skips
+reports that are already done; parts finished by an interrupted report are
+reused from its checkpoint. Stage timings and token usage of each report
+are written to data/telemetry as JSON and Prometheus text files.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from extractor.checkpoint import PartCheckpoint
+from extractor.gemini_extractor import MetricsExtractor
+from extractor.metrics_store import MetricsStore
+from extractor.page_cache import PageCache
+from extractor.page_text import BACKENDS
+from extractor.pipeline import extract_report_async, report_key, save_results
+from extractor.prefilter import RelevancePrefilter
+from extractor.rate_limiter import RateLimiter
+from extractor.resilience import ResilientCaller
+from extractor.routing import MODEL_PRICES, ModelRouter
+from extractor.tables import TableExtractor
+from extractor.telemetry import RunTelemetry
+from extractor.text_store import PageTextStore
+
+
+def collect_pdfs(inputs):
+    """Expand directories and glob patterns into a sorted list of PDF paths."""
+    pdfs = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pdfs.update(path.rglob("*.pdf"))
+        else:
+            pdfs.update(Path(match) for match in glob.glob(item, recursive=True))
+    return sorted(p for p in pdfs if p.suffix.lower() == ".pdf")
+
+
+def duplicate_stems(pdfs):
+    """File names that occur more than once; their outputs (named by stem) would overwrite each other."""
+    by_stem = {}
+    for pdf in pdfs:
+        by_stem.setdefault(pdf.stem, []).append(pdf)
+    return {stem: paths for stem, paths in by_stem.items() if len(paths) > 1}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path) -> dict:
+    if path.exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest: dict, path: Path) -> None:
+    # Write-then-rename so an interruption never leaves a truncated manifest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def process_file(pdf: Path, pdf_hash: str, args, file_slots: asyncio.Semaphore,
+                       rate_limiter: RateLimiter, caller: ResilientCaller, cache: PageCache,
+                       page_store: PageTextStore, manifest: dict) -> None:
+    async with file_slots:
+        print(f"📄 {pdf}")
+        started = time.time()
+        entry = {"file": str(pdf), "started_at": started}
+        try:
+            telemetry = RunTelemetry(pdf.name)
+            router = None if args.no_routing else ModelRouter(
+                light_model=args.light_model, full_model=args.model,
+                token_budget=args.token_budget, latency_budget=args.latency_budget)
+            extractor = MetricsExtractor(model=args.model, cache=cache, max_input_tokens=args.max_input_tokens,
+                                         structured_output=not args.no_structured_output, telemetry=telemetry,
+                                         caller=caller, router=router)
+            prefilter = RelevancePrefilter(args.relevance_threshold) if args.relevance_threshold > 0 else None
+            table_extractor = TableExtractor(args.table_backend) if args.table_backend != "off" else None
+            result = await extract_report_async(
+                pdf, pdf.name, extractor,
+                pages_per_part=args.pages_per_part,
+                prefilter=prefilter,
+                max_concurrency=args.max_concurrency,
+                rate_limiter=rate_limiter,
+                backend=args.backend,
+                workers=args.workers,
+                checkpoint=PartCheckpoint(report_key(pdf_hash, extractor, prefilter, table_extractor,
+                                                     backend=args.backend)),
+                table_extractor=table_extractor,
+                telemetry=telemetry,
+                page_store=page_store
+            )
+
+            result_csv = save_results(result, pdf.stem, pdf_hash, output_dir=args.output_dir,
+                                      store=MetricsStore(args.store_dir), telemetry=telemetry)
+            summary = telemetry.summary()
+
+            entry.update({
+                # Reports with failed pages are retried on the next run
+                "status": "partial" if result["failed_pages"] else "done",
+                "csv": str(result_csv) if result_csv else None,
+                "pages": result["pages"],
+                "resumed_parts": result["resumed_parts"],
+                "metrics": len(result["metrics"]),
+                "failed_pages": result["failed_pages"],
+                "failures": result["failures"],
+                "routing": router.summary() if router is not None else None,
+                "requests": extractor.requests_sent,
+                "cache_hits": extractor.cache_hits,
+                "table_metrics": result["table_metrics"],
+                "duplicates_merged": result["duplicates_merged"],
+                "conflicts": result["conflicts"],
+                "input_tokens": summary["input_tokens"],
+                "output_tokens": summary["output_tokens"],
+                "latency_p95": summary["latency_p95"],
+            })
+            icon = "⚠️" if result["failed_pages"] else "✅"
+            print(f"{icon} {pdf.name}: {len(result['metrics'])} metrics from {result['pages']} pages "
+                  f"({extractor.requests_sent} requests, {len(result['failed_pages'])} failed pages, "
+                  f"{summary['input_tokens'] + summary['output_tokens']} tokens, {time.time() - started:.1f}s)")
+        except Exception as e:
+            entry.update({"status": "failed", "error": str(e)})
+            print(f"❌ {pdf.name}: {e}")
+
+        entry["finished_at"] = time.time()
+        manifest[pdf_hash] = entry
+        save_manifest(manifest, args.manifest)
+
+
+async def run(args) -> None:
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        print("No PDF files matched.")
+        return
+    duplicates = duplicate_stems(pdfs)
+    if duplicates:
+        listing = "\n".join(f"  {stem}: {', '.join(map(str, paths))}" for stem, paths in duplicates.items())
+        raise SystemExit(f"Several PDFs share a file name, so their results would overwrite each other:\n"
+                         f"{listing}\nRename them or run them separately.")
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(args.manifest)
+
+    pending = []
+    for pdf in pdfs:
+        pdf_hash = file_sha256(pdf)
+        if not args.force and manifest.get(pdf_hash, {}).get("status") == "done":
+            continue
+        pending.append((pdf, pdf_hash))
+    print(f"{len(pdfs)} PDF(s) found, {len(pdfs) - len(pending)} already done, {len(pending)} to process.")
+
+    file_slots = asyncio.Semaphore(args.max_files)
+    # One limiter for the whole run: the Gemini quota is shared by all files
+    rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    # Likewise one retry layer: a 429 pauses every report until the quota recovers
+    caller = ResilientCaller(max_attempts=args.max_attempts)
+    cache = PageCache(max_bytes=args.cache_size_mb * 1024 * 1024)
+    page_store = PageTextStore(args.page_text_dir)
+    await asyncio.gather(*(
+        process_file(pdf, pdf_hash, args, file_slots, rate_limiter, caller, cache, page_store, manifest)
+        for pdf, pdf_hash in pending
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--output-dir", type=Path, default=Path("data/extracted_results"))
+    parser.add_argument("--store-dir", default="data/metrics_store", help="Parquet metrics store")
+    parser.add_argument("--manifest", type=Path, default=Path("data/batch_manifest.json"))
+    parser.add_argument("--force", action="store_true", help="Reprocess reports marked done in the manifest")
+    parser.add_argument("--max-files", type=int, default=2, help="Reports processed concurrently")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Gemini requests in flight per report")
+    parser.add_argument("--rpm", type=int, default=10, help="Requests per minute (shared by all reports)")
+    parser.add_argument("--tpm", type=int, default=250_000, help="Input tokens per minute (shared)")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="Attempts per Gemini request on 429/5xx before its pages are marked failed")
+    parser.add_argument("--model", default="gemini-2.5-flash",
+                        help="Model for dense and table-heavy pages (every page with --no-routing)")
+    parser.add_argument("--light-model", default="gemini-2.5-flash-lite", choices=list(MODEL_PRICES),
+                        help="Model for simple pages")
+    parser.add_argument("--no-routing", action="store_true", help="Send every page to --model")
+    parser.add_argument("--token-budget", type=int, default=0,
+                        help="Tokens per report after which nothing is escalated (0 = unlimited)")
+    parser.add_argument("--latency-budget", type=float, default=0,
+                        help="Seconds of request time per report after which nothing is escalated (0 = unlimited)")
+    parser.add_argument("--max-input-tokens", type=int, default=8000,
+                        help="Input-token budget per request (0 = one page per request)")
+    parser.add_argument("--no-structured-output", action="store_true",
+                        help="Ask for free-form JSON instead of the schema-constrained metric list")
+    parser.add_argument("--pages-per-part", type=int, default=5)
+    parser.add_argument("--relevance-threshold", type=float, default=0.2, help="0 sends every page")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="pdfplumber")
+    parser.add_argument("--workers", type=int, default=1, help="Text extraction processes per report")
+    parser.add_argument("--cache-size-mb", type=int, default=256)
+    parser.add_argument("--page-text-dir", default="data/page_text",
+                        help="Store of extracted page text and tables, reused by later runs")
+    parser.add_argument("--table-backend", choices=["pymupdf", "pdfplumber", "off"], default="pymupdf",
+                        help="Parse KPI tables locally instead of sending them to Gemini")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
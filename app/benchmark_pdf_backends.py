@@ -0,0 +1,75 @@
+"""
+Benchmark the page-text backends on sample PDFs.
+
+Each (backend, workers) combination runs in a fresh subprocess so peak RSS
+is measured in isolation. Run from the app directory:
+
+    python benchmark_pdf_backends.py "data/pdf_parts/*.pdf" --workers 1 4
+"""
+import argparse
+import glob
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from extractor.page_text import BACKENDS, iter_page_texts
+
+
+def _peak_rss_mb(who) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(backend: str, workers: int, pdfs) -> dict:
+    """Extract every page of `pdfs` with one backend and report throughput."""
+    pages = 0
+    started = time.perf_counter()
+    for pdf in pdfs:
+        for window in iter_page_texts(pdf, backend=backend, workers=workers):
+            pages += len(window)
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": backend,
+        "workers": workers,
+        "pages": pages,
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(pages / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        "peak_worker_rss_mb": round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+", help="PDF files or glob patterns")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--workers", nargs="+", type=int, default=[1])
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    pdfs = sorted({path for pattern in args.pdfs for path in glob.glob(pattern)})
+    if not pdfs:
+        parser.error("No PDF files matched.")
+
+    if args.run_one:
+        print(json.dumps(run_one(args.backends[0], args.workers[0], pdfs)))
+        return
+
+    print(f"{len(pdfs)} PDF(s)")
+    print(f"{'backend':<12}{'workers':>8}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'peak MB':>10}{'worker MB':>11}")
+    for backend in args.backends:
+        for workers in args.workers:
+            output = subprocess.run(
+                [sys.executable, __file__, *pdfs, "--run-one", "--backends", backend, "--workers", str(workers)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:<12}{workers:>8}{result['pages']:>8}{result['seconds']:>10}"
+                  f"{result['pages_per_sec']:>10}{result['peak_rss_mb']:>10}{result['peak_worker_rss_mb']:>11}")
+
+
+if __name__ == "__main__":
+    main()
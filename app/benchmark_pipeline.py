@@ -0,0 +1,143 @@
+"""
+End-to-end throughput benchmark of the extraction pipeline, fully offline.
+
+Generates synthetic sustainability reports, then runs the same
+read → prefilter → extract → merge path as the app against FakeGeminiClient
+(configurable latency and 429 quota) and reports pages/sec, requests per
+report and wall time. Run from the app directory:
+
+    python benchmark_pipeline.py --sizes 10 100 500 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from extractor.fake_client import CANNED_METRICS, FakeGeminiClient
+from extractor.gemini_extractor import MetricsExtractor
+from extractor.page_text import BACKENDS
+from extractor.pipeline import extract_report_async, to_results_frame
+from extractor.prefilter import RelevancePrefilter
+from extractor.rate_limiter import RateLimiter
+from extractor.routing import ModelRouter
+from extractor.tables import TableExtractor
+
+NARRATIVE = (
+    "Our purpose is to bring the potential of people, nature and technology together "
+    "to make life better. We continue to work with farmers, customers and communities "
+    "on the journey towards a more sustainable future."
+)
+
+
+TABLE_COLUMNS = [40, 250, 330, 410, 490, 570]  # x positions of the ruled KPI table's column lines
+ROW_HEIGHT = 18
+
+
+def make_synthetic_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    """Write a report whose pages alternate between ruled KPI tables and narrative."""
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        if number % 3 == 0:
+            lines = [f"Chapter {number // 3}"] + [NARRATIVE] * 8
+            page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(lines), fontsize=9)
+            continue
+
+        page.insert_text((40, 50), f"Performance data, page {number}", fontsize=9)
+        rows = [["Metric", "Unit", "2022", "2023", "2024"]]
+        for name, unit, _, (low, high) in rng.sample(CANNED_METRICS, 8):
+            rows.append([name, unit] + [f"{rng.randint(low, high):,}" for _ in range(3)])
+        top = 70
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                page.insert_text((TABLE_COLUMNS[c] + 3, top + r * ROW_HEIGHT + 12), cell, fontsize=8)
+        bottom = top + len(rows) * ROW_HEIGHT
+        for r in range(len(rows) + 1):
+            page.draw_line((TABLE_COLUMNS[0], top + r * ROW_HEIGHT), (TABLE_COLUMNS[-1], top + r * ROW_HEIGHT))
+        for x in TABLE_COLUMNS:
+            page.draw_line((x, top), (x, bottom))
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def run_one(pdf: Path, args) -> dict:
+    client = FakeGeminiClient(latency=args.latency, jitter=args.jitter, quota_rpm=args.quota_rpm, seed=args.seed)
+    router = ModelRouter() if args.routing else None
+    extractor = MetricsExtractor(client=client, max_input_tokens=args.max_input_tokens, router=router)
+    prefilter = RelevancePrefilter(args.relevance_threshold) if args.relevance_threshold > 0 else None
+    rate_limiter = RateLimiter(args.rpm, args.tpm) if args.rpm else None
+    table_extractor = TableExtractor(args.table_backend) if args.table_backend != "off" else None
+
+    started = time.perf_counter()
+    result = asyncio.run(extract_report_async(
+        pdf, pdf.name, extractor,
+        pages_per_part=args.pages_per_part,
+        prefilter=prefilter,
+        max_concurrency=args.max_concurrency,
+        rate_limiter=rate_limiter,
+        backend=args.backend,
+        workers=args.workers,
+        table_extractor=table_extractor
+    ))
+    frame = to_results_frame(result["metrics"])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "pages": result["pages"],
+        "requests": extractor.requests_sent,
+        "table_metrics": result["table_metrics"],
+        "rate_limited": client.rate_limited,
+        "failed_pages": len(result["failed_pages"]),
+        "metrics": len(frame),
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(result["pages"] / elapsed, 1),
+        "routing": router.summary() if router is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 500], help="Pages per synthetic report")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake request latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--quota-rpm", type=int, default=None, help="Fake server quota; excess calls get 429")
+    parser.add_argument("--rpm", type=int, default=None, help="Client-side rate limiter (requests/min)")
+    parser.add_argument("--tpm", type=int, default=None, help="Client-side rate limiter (tokens/min)")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-input-tokens", type=int, default=8000)
+    parser.add_argument("--pages-per-part", type=int, default=5)
+    parser.add_argument("--relevance-threshold", type=float, default=0.2)
+    parser.add_argument("--backend", choices=list(BACKENDS), default="pdfplumber")
+    parser.add_argument("--workers", type=int, default=1)
+    # Off by default: the synthetic tables all parse locally, which would leave no Gemini requests to measure
+    parser.add_argument("--table-backend", choices=["pymupdf", "pdfplumber", "off"], default="off")
+    parser.add_argument("--routing", action="store_true",
+                        help="Route simple pages to the light model (per-tier costs go to --output)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'pages':>6}{'requests':>10}{'tables':>8}{'429s':>6}{'failed':>8}{'metrics':>9}{'seconds':>9}{'pages/s':>9}")
+        for size in args.sizes:
+            pdf = make_synthetic_pdf(Path(tmp) / f"synthetic_{size}.pdf", size, seed=args.seed)
+            result = run_one(pdf, args)
+            results.append(result)
+            print(f"{result['pages']:>6}{result['requests']:>10}{result['table_metrics']:>8}{result['rate_limited']:>6}"
+                  f"{result['failed_pages']:>8}{result['metrics']:>9}{result['seconds']:>9}{result['pages_per_sec']:>9}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"settings": vars(args) | {"output": str(args.output)},
+                                           "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .normalize import unit_factor
+
+# Canonical ESG KPIs and the vocabulary reports commonly use for them
+CANONICAL_KPIS = {
+    "Scope 1 GHG emissions": ["scope 1 emissions", "scope 1 ghg emissions", "scope 1 ghg", "direct ghg emissions",
+                              "direct emissions scope 1", "scope 1 co2e emissions", "scope 1 carbon emissions"],
+    "Scope 2 GHG emissions (market-based)": ["scope 2 emissions market based", "scope 2 market based",
+                                             "market based scope 2 ghg emissions"],
+    "Scope 2 GHG emissions (location-based)": ["scope 2 emissions location based", "scope 2 location based",
+                                               "location based scope 2 ghg emissions"],
+    "Scope 2 GHG emissions": ["scope 2 emissions", "scope 2 ghg emissions", "scope 2 ghg", "indirect ghg emissions scope 2",
+                              "energy indirect ghg emissions"],
+    "Scope 1 and 2 GHG emissions": ["scope 1 and 2 emissions", "scope 1 2 emissions", "scopes 1 and 2 ghg emissions",
+                                    "combined scope 1 and 2 emissions"],
+    "Scope 3 GHG emissions": ["scope 3 emissions", "scope 3 ghg emissions", "scope 3 ghg", "other indirect ghg emissions",
+                              "value chain emissions scope 3"],
+    "GHG emissions intensity": ["ghg emissions intensity", "emissions intensity", "carbon intensity",
+                                "co2e per tonne of product"],
+    "Total energy consumption": ["total energy consumption", "energy consumption", "total energy use",
+                                 "energy consumed"],
+    "Renewable electricity share": ["renewable electricity", "renewable electricity share",
+                                    "percentage of renewable electricity", "electricity from renewable sources"],
+    "Water withdrawal": ["water withdrawal", "total water withdrawal", "water withdrawn", "water use"],
+    "Water discharge": ["water discharge", "wastewater discharge", "total water discharged"],
+    "Total waste generated": ["total waste", "waste generated", "total waste generated"],
+    "Waste diverted from landfill": ["waste diverted from landfill", "landfill diversion rate",
+                                     "waste to landfill avoided", "zero waste to landfill"],
+    "Recyclable packaging share": ["recyclable packaging", "recyclable or reusable packaging",
+                                   "packaging designed to be recyclable"],
+    "Women in workforce": ["women in workforce", "female employees", "percentage of women employees",
+                           "women in total workforce"],
+    "Women in management": ["women in management", "women in leadership", "female managers",
+                            "women in senior leadership"],
+    "Total employees": ["total employees", "number of employees", "total workforce", "headcount"],
+    "Employee turnover rate": ["employee turnover", "turnover rate", "voluntary turnover"],
+    "Total recordable incident rate": ["total recordable incident rate", "trir", "recordable injury rate",
+                                       "total recordable injury rate"],
+    "Lost time injury rate": ["lost time injury rate", "ltir", "lost time incident rate", "ltifr"],
+    "Fatalities": ["fatalities", "work related fatalities", "number of fatalities"],
+    "Training hours per employee": ["training hours per employee", "average training hours",
+                                    "average hours of training per employee"],
+    "Community investment": ["community investment", "charitable contributions", "philanthropic giving",
+                             "donations"],
+    "Independent board members": ["independent board members", "board independence",
+                                  "independent directors", "percentage of independent directors"],
+    "Women on the board": ["women on the board", "female board members", "board gender diversity"],
+    "Employees trained on code of conduct": ["employees trained on code of conduct", "code of conduct training",
+                                             "ethics training completion"],
+    "Confirmed incidents of corruption": ["confirmed incidents of corruption", "corruption incidents",
+                                          "bribery incidents"],
+}
+
+# KPIs usually reported as a percentage; a "%" name never matches any other KPI
+PERCENT_KPIS = {"Renewable electricity share", "Waste diverted from landfill", "Recyclable packaging share",
+                "Women in workforce", "Women in management", "Employee turnover rate",
+                "Independent board members", "Women on the board", "Employees trained on code of conduct"}
+
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+PARENTHETICAL = re.compile(r"\(([^()]*)\)")
+
+# Words that turn a KPI into a different measure ("water withdrawal intensity",
+# "emissions reduction vs 2019", "waste to landfill" vs "waste diverted from
+# landfill"). A name and an alias must carry the same ones to match.
+QUALIFIERS = {"intensity", "reduction", "reduced", "target", "targets", "goal", "per", "change", "increase",
+              "decrease", "vs", "versus", "baseline", "avoided", "diverted", "diversion", "ratio"}
+
+
+def normalize_name(name) -> str:
+    """Lowercase, drop years and punctuation: 'Scope 1 GHG (tCO2e), 2023' → 'scope 1 ghg tco2e'."""
+    text = YEAR_PATTERN.sub(" ", str(name).lower())
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def strip_units(name) -> str:
+    """Drop parentheticals that are units: 'Scope 1 GHG (tCO2e)' → 'Scope 1 GHG', '(market-based)' stays."""
+    def replace(match):
+        # Intensity units ("tCO2e per tonne") count by their numerator
+        content = re.split(r"\bper\b|/", match.group(1))[0]
+        return " " if "%" in content or unit_factor(content)[0] is not None else match.group(0)
+
+    return PARENTHETICAL.sub(replace, str(name))
+
+
+def _qualifiers(normalized: str) -> frozenset:
+    return frozenset(token for token in normalized.split() if token in QUALIFIERS)
+
+
+def _is_percent(name) -> bool:
+    return bool(re.search(r"%|\bpercent(?:age)?\b", str(name).lower()))
+
+
+def _numbers(normalized: str) -> frozenset:
+    return frozenset(token for token in normalized.split() if token.isdigit())
+
+
+def _trigrams(normalized: str) -> Counter:
+    padded = f"  {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CanonicalLexicon:
+    """
+    Deterministic metric-name → canonical KPI matcher.
+
+    Unit parentheticals are dropped and aliases are indexed by character
+    trigram. A name is scored against the aliases sharing its trigrams with
+    the Dice coefficient (1.0 for an exact normalized match). Candidates
+    whose numbers ("scope 1" vs "scope 2") or qualifiers ("intensity",
+    "reduction", "diverted", ...) differ are never matched, nor is a
+    percentage matched to a KPI that is never one. Only matches of at least
+    `threshold` that beat the runner-up KPI by `margin` count; the rest are
+    left to the LLM.
+
+    Names the LLM groups under a canonical KPI are recorded as votes in
+    `learned_path`; once `min_votes` comparisons agreed (and none disagreed)
+    the name becomes an alias, so repeat comparisons need fewer LLM calls.
+    """
+
+    def __init__(self, learned_path: Optional[str] = "data/lexicon/learned_aliases.json",
+                 threshold: float = 0.9, margin: float = 0.05, min_votes: int = 2):
+        self.learned_path = Path(learned_path) if learned_path else None
+        self.threshold = threshold
+        self.margin = margin
+        self.min_votes = min_votes
+        self.learned: Dict[str, str] = {}
+        self.votes: Dict[str, Dict[str, int]] = {}
+        self._aliases: List[Tuple[str, str, Counter, frozenset, frozenset]] = []  # (alias, kpi, trigrams, numbers, qualifiers)
+        self._exact: Dict[str, str] = {}
+        self._index: Dict[str, List[int]] = {}
+
+        for kpi, aliases in CANONICAL_KPIS.items():
+            for alias in [kpi, *aliases]:
+                self._add(alias, kpi)
+        if self.learned_path is not None and self.learned_path.exists():
+            with open(self.learned_path, "r") as f:
+                saved = json.load(f)
+            # Files written before votes were kept hold a bare {alias: kpi} map
+            learned = saved.get("aliases", {}) if "aliases" in saved or "votes" in saved else saved
+            self.votes = {alias: dict(votes) for alias, votes in saved.get("votes", {}).items()
+                          if isinstance(votes, dict)}
+            for alias, kpi in learned.items():
+                if kpi in CANONICAL_KPIS and self._add(alias, kpi):
+                    self.learned[alias] = kpi
+
+    def _add(self, alias: str, kpi: str) -> bool:
+        normalized = normalize_name(strip_units(alias))
+        if not normalized or normalized in self._exact:
+            return False
+        self._exact[normalized] = kpi
+        grams = _trigrams(normalized)
+        position = len(self._aliases)
+        self._aliases.append((normalized, kpi, grams, _numbers(normalized), _qualifiers(normalized)))
+        for gram in grams:
+            self._index.setdefault(gram, []).append(position)
+        return True
+
+    def match(self, metric_name) -> Tuple[Optional[str], float]:
+        """Return (canonical KPI, confidence); KPI is None unless the match is confident."""
+        stripped = strip_units(metric_name)
+        normalized = normalize_name(stripped)
+        if not normalized:
+            return None, 0.0
+        percent = _is_percent(metric_name)
+        if normalized in self._exact:
+            kpi = self._exact[normalized]
+            if percent and kpi not in PERCENT_KPIS:
+                return None, 0.0
+            return kpi, 1.0
+
+        grams = _trigrams(normalized)
+        numbers = _numbers(normalized)
+        qualifiers = _qualifiers(normalized)
+        shared = Counter()
+        for gram, count in grams.items():
+            for position in self._index.get(gram, ()):
+                shared[position] += min(count, self._aliases[position][2][gram])
+
+        size = sum(grams.values())
+        scores: Dict[str, float] = {}
+        for position, overlap in shared.items():
+            _, kpi, alias_grams, alias_numbers, alias_qualifiers = self._aliases[position]
+            if alias_numbers != numbers or alias_qualifiers != qualifiers:
+                continue
+            if percent and kpi not in PERCENT_KPIS:
+                continue
+            score = 2 * overlap / (size + sum(alias_grams.values()))
+            scores[kpi] = max(scores.get(kpi, 0.0), score)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None, 0.0
+        best_kpi, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        best_score = round(best_score, 3)
+        if best_score < self.threshold or best_score - runner_up < self.margin:
+            return None, best_score
+        return best_kpi, best_score
+
+    def learn(self, alias: str, kpi: str) -> bool:
+        """
+        Record that one comparison grouped `alias` under `kpi`; returns True
+        if the votes changed. Only canonical KPIs are learned.
+        """
+        normalized = normalize_name(strip_units(alias))
+        if kpi not in CANONICAL_KPIS or not normalized or normalized in self._exact:
+            return False
+        votes = self.votes.setdefault(normalized, {})
+        votes[kpi] = votes.get(kpi, 0) + 1
+        if votes[kpi] >= self.min_votes and len(votes) == 1 and self._add(normalized, kpi):
+            self.learned[normalized] = kpi
+            del self.votes[normalized]
+        return True
+
+    def save(self) -> None:
+        if self.learned_path is None:
+            return
+        self.learned_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.learned_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"aliases": self.learned, "votes": self.votes}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.learned_path)
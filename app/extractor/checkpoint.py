@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PartKey = Tuple[int, int]
+
+
+class PartCheckpoint:
+    """
+    Append-only JSONL checkpoint of the parts of one report.
+
+    Every finished part is written (and fsynced) as soon as it completes, so
+    a crash, browser refresh or Streamlit rerun only loses the parts still in
+    flight. Parts are identified by their (first_page, last_page) range; the
+    last record for a range wins, so a failed part that succeeds on a later
+    run simply gets a newer "ok" record.
+    """
+
+    def __init__(self, report_key: str, checkpoint_dir: str = "data/checkpoints"):
+        self.path = Path(checkpoint_dir) / f"{report_key}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[PartKey, Dict]:
+        """Latest record per part range."""
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted write
+                records[tuple(record["pages"])] = record
+        return records
+
+    def completed(self) -> Dict[PartKey, Dict]:
+        """Records of parts that finished without failed pages."""
+        return {key: record for key, record in self.load().items() if record.get("status") == "ok"}
+
+    def record(self, pages: PartKey, metrics: List[Dict], failed_pages: List,
+               decisions: Optional[List[Dict]] = None, error: Optional[str] = None) -> None:
+        record = {
+            "pages": list(pages),
+            "status": "failed" if failed_pages or error else "ok",
+            "metrics": metrics,
+            "failed_pages": failed_pages,
+            "decisions": decisions or [],
+            "error": error,
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.path, "a+b") as f:
+            # A crash mid-write leaves a torn last line; start on a fresh line
+            # so this record is not glued onto it and lost as well
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
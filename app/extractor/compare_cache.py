@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Row fields that identify a metric; display-only columns do not change the hash
+ROW_FIELDS = ["metric_name", "value", "unit", "year", "source"]
+
+
+def _row_json(row: Dict) -> str:
+    return json.dumps({field: row.get(field) for field in ROW_FIELDS}, sort_keys=True, default=str)
+
+
+def _sorted_rows(table: List[Dict]) -> List[int]:
+    """Row indices of `table` in canonical (content) order."""
+    return sorted(range(len(table)), key=lambda index: _row_json(table[index]))
+
+
+def table_hash(table: List[Dict]) -> str:
+    """Content hash of a metric table, independent of row order."""
+    digest = hashlib.sha256()
+    for index in _sorted_rows(table):
+        digest.update(_row_json(table[index]).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class ComparisonCache:
+    """
+    Comparison results keyed by the content of the compared tables.
+
+    The key is a hash of the category and the sorted table hashes, so the
+    same reports selected in any order (or re-extracted with identical
+    results under another name) hit the same entry. Groups are stored as
+    (table hash, canonical row position) members rather than positional
+    dataset ids, which lets a larger comparison start from the groups of
+    any cached subset and only align the remaining tables.
+    """
+
+    def __init__(self, cache_dir: str = "data/cached_json"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / "comparison_index.json"
+
+    def _load_index(self) -> Dict[str, Dict]:
+        return json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+
+    def _write_json(self, path: Path, payload) -> None:
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(payload, indent=2, default=str))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def key(hashes: List[str], category: str) -> str:
+        return hashlib.sha256(f"{category.lower()}|{'|'.join(sorted(hashes))}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"comparison_{key[:32]}.json"
+
+    def _to_ids(self, tables: List[List[Dict]], hashes: List[str], entry_groups: List[Dict]) -> List[Dict]:
+        """Translate stored members to "d<dataset>:<row>" ids of the current tables."""
+        positions = {}
+        for dataset, (table, table_key) in enumerate(zip(tables, hashes), start=1):
+            positions.setdefault(table_key, (dataset, _sorted_rows(table)))
+        groups = []
+        for group in entry_groups:
+            ids = []
+            for table_key, position in group["members"]:
+                if table_key in positions:
+                    dataset, order = positions[table_key]
+                    ids.append(f"d{dataset}:{order[position]}")
+            groups.append({"common_metric": group["common_metric"], "ids": ids})
+        return groups
+
+    def get(self, tables: List[List[Dict]], category: str) -> Optional[List[Dict]]:
+        """Id groups of an identical earlier comparison, or None."""
+        hashes = [table_hash(table) for table in tables]
+        path = self._path(self.key(hashes, category))
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return self._to_ids(tables, hashes, json.load(f)["groups"])
+
+    def best_subset(self, tables: List[List[Dict]], category: str) -> Tuple[List[Dict], set]:
+        """
+        Id groups of the largest cached comparison over a subset of `tables`
+        (at least two of them), and the dataset numbers it covers. Returns
+        ([], set()) when there is none.
+        """
+        hashes = [table_hash(table) for table in tables]
+        available = set(hashes)
+        best_key, best_tables = None, []
+        for key, entry in self._load_index().items():
+            if entry["category"] != category.lower() or not set(entry["tables"]) <= available:
+                continue
+            if len(set(entry["tables"])) > len(set(best_tables)) and self._path(key).exists():
+                best_key, best_tables = key, entry["tables"]
+        if best_key is None:
+            return [], set()
+
+        with open(self._path(best_key), "r") as f:
+            groups = self._to_ids(tables, hashes, json.load(f)["groups"])
+        covered = {dataset for dataset, table_key in enumerate(hashes, start=1) if table_key in set(best_tables)}
+        return groups, covered
+
+    def put(self, tables: List[List[Dict]], category: str, groups: List[Dict]) -> str:
+        """Store id groups for `tables`; returns the cache file name."""
+        hashes = [table_hash(table) for table in tables]
+        canonical_position = []
+        for table in tables:
+            order = _sorted_rows(table)
+            inverse = [0] * len(order)
+            for position, row in enumerate(order):
+                inverse[row] = position
+            canonical_position.append(inverse)
+
+        stored = []
+        for group in groups:
+            members = []
+            for metric_id in group.get("ids", []):
+                try:
+                    dataset, row = str(metric_id).lstrip("d").split(":")
+                    dataset, row = int(dataset), int(row)
+                    members.append([hashes[dataset - 1], canonical_position[dataset - 1][row]])
+                except (ValueError, IndexError):
+                    continue
+            stored.append({"common_metric": group.get("common_metric"), "members": members})
+
+        key = self.key(hashes, category)
+        path = self._path(key)
+        self._write_json(path, {"category": category.lower(), "tables": sorted(set(hashes)), "groups": stored})
+        index = self._load_index()
+        index[key] = {"category": category.lower(), "tables": sorted(set(hashes))}
+        self._write_json(self.index_path, index)
+        return path.name
@@ -1,19 +1,52 @@
 import streamlit as st
 import pandas as pd
-import os, json, re
+import os
+import asyncio
 from pathlib import Path
 from google import genai
 
+from typing import Dict, List, Optional, Tuple
+
+from .canonical import CanonicalLexicon
+from .compare_cache import ComparisonCache
+from .comparison import compare_tables_async, merge_groups
+from .metrics_store import MetricsStore
+from .rate_limiter import RateLimiter
+from .resilience import ResilientCaller
+
 
 # ------------------------------------------------------------
-# Helper to extract JSON safely from Gemini output
+# Cached data: re-read only when the extracted results change
 # ------------------------------------------------------------
-def extract_json(text: str):
-    """Extract JSON from Gemini output, even if wrapped in code fences."""
-    json_match = re.search(r"```(?:json)?\s*(\[[\s\S]*\])\s*```", text, re.DOTALL)
-    if json_match:
-        text = json_match.group(1)
-    return text.strip()
+def results_signature(results_dir: Path) -> Tuple:
+    """(name, mtime) of every result CSV; a new or rewritten file changes it."""
+    if not results_dir.exists():
+        return ()
+    return tuple(sorted((p.name, p.stat().st_mtime) for p in results_dir.glob("*.csv")))
+
+
+@st.cache_data(show_spinner=False)
+def list_reports(results_dir: str, signature: Tuple) -> List[str]:
+    store = MetricsStore()
+    if signature:
+        store.ingest_csvs(results_dir)
+    return store.reports()
+
+
+@st.cache_data(show_spinner=False)
+def load_tables(signature: Tuple, category: str, reports: Tuple[str, ...]) -> List[List[Dict]]:
+    """Metric tables of `reports` in one category, one list of rows per report."""
+    frame = MetricsStore().query(columns=["report", "metric_name", "value", "unit", "year", "category", "source",
+                                          "canonical_value", "canonical_unit"],
+                                 category=category, reports=reports)
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [frame[frame["report"] == name].drop(columns="report").to_dict(orient="records")
+            for name in reports if (frame["report"] == name).any()]
+
+
+@st.cache_resource(show_spinner=False)
+def get_lexicon() -> CanonicalLexicon:
+    return CanonicalLexicon()
 
 
 # ------------------------------------------------------------
@@ -44,6 +77,11 @@ def display_common_metrics_tables(common_metrics):
             units = [entry.get("unit", "") for entry in entries]
             years = [entry.get("year", "") for entry in entries]
             sources = [entry.get("source", "") for entry in entries]
+            normalized = [
+                f"{entry['canonical_value']:,.6g} {entry['canonical_unit']}"
+                if entry.get("canonical_value") is not None and entry.get("canonical_unit") else ""
+                for entry in entries
+            ]
 
             # Pad to align table rows
             metric_names += [""] * (max_len - len(metric_names))
@@ -51,11 +89,13 @@ def display_common_metrics_tables(common_metrics):
             units += [""] * (max_len - len(units))
             years += [""] * (max_len - len(years))
             sources += [""] * (max_len - len(sources))
+            normalized += [""] * (max_len - len(normalized))
 
-            # Add to table data (each dataset contributes 5 columns)
+            # Add to table data (each dataset contributes 6 columns)
             table_data[f"{dataset_key}_metric_name"] = metric_names
             table_data[f"{dataset_key}_value"] = values
             table_data[f"{dataset_key}_unit"] = units
+            table_data[f"{dataset_key}_normalized"] = normalized
             table_data[f"{dataset_key}_year"] = years
             table_data[f"{dataset_key}_source"] = sources
 
@@ -67,7 +107,14 @@ def display_common_metrics_tables(common_metrics):
 # ------------------------------------------------------------
 # Main Comparison Page
 # ------------------------------------------------------------
-def compare_metrics_page():
+def compare_metrics_page(client=None, max_concurrency: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                         caller: Optional[ResilientCaller] = None, model: str = "gemini-2.5-flash"):
+    """
+    Compare page. `client` overrides the genai.Client built from
+    GOOGLE_API_KEY; per-bucket Gemini calls run `max_concurrency` at a time
+    under `rate_limiter` on `model`, with retries and circuit breaker from
+    `caller`.
+    """
     st.header("📊 Compare Extracted ESG Metrics")
 
     # Directories
@@ -75,21 +122,19 @@ def compare_metrics_page():
     cache_dir = Path("data/cached_json")
     cache_dir.mkdir(parents=True, exist_ok=True)
 
-    if not results_dir.exists():
-        st.warning("⚠️ No extracted CSV files found yet.")
+    # Metrics are queried from the Parquet store; CSVs written by older runs
+    # (or copied in by hand) are ingested first
+    signature = results_signature(results_dir)
+    reports = list_reports(str(results_dir), signature)
+    if not reports:
+        st.warning("⚠️ No extracted metrics found yet.")
         return
 
-    # List extracted CSV files
-    csv_files = sorted(results_dir.glob("*.csv"))
-    if not csv_files:
-        st.warning("⚠️ No extracted CSV files found in 'data/extracted_results'.")
-        return
-
-    # File selection
+    # Report selection
     selected_files = st.multiselect(
-        "Select one or more extracted CSV files to compare:",
-        options=[f.name for f in csv_files],
-        help="These CSVs were created from your previous extractions."
+        "Select one or more extracted reports to compare:",
+        options=reports,
+        help="These reports were created from your previous extractions."
     )
 
     category = st.selectbox("Select ESG Category to Focus On",
@@ -99,95 +144,64 @@ def compare_metrics_page():
         st.info("👆 Select files above to start.")
         return
 
-    # Build cache filename
-    safe_fnames = "_".join([os.path.splitext(f)[0].replace(" ", "_") for f in selected_files])
-    cache_file = cache_dir / f"common_metrics_{category.lower()}_{safe_fnames}.json"
+    # One scan of the store: the category filter prunes partitions and only
+    # the columns the comparison uses are read
+    tables = load_tables(signature, category, tuple(selected_files))
+    if len(tables) < 2:
+        st.warning("Please select at least two reports with metrics in the chosen category.")
+        return
 
     # --------------------------------------------------------
-    # STEP 1: Check cache first
+    # STEP 1: Check cache first (keyed by table content, not selection order)
     # --------------------------------------------------------
-    if cache_file.exists():
-        st.success(f"✅ Loaded cached common metrics for {category} from {cache_file.name}")
-        with open(cache_file, "r") as f:
-            common_metrics = json.load(f)
+    comparison_cache = ComparisonCache(cache_dir)
+    cached_groups = comparison_cache.get(tables, category)
+    if cached_groups is not None:
+        st.success(f"✅ Loaded cached common metrics for {category}.")
+        common_metrics = merge_groups(tables, cached_groups)
     else:
         # --------------------------------------------------------
         # STEP 2: Generate via Gemini if cache not found
         # --------------------------------------------------------
-        if st.button("🔍 Compare Selected CSVs"):
-            api_key = os.getenv("GOOGLE_API_KEY")
-            if not api_key:
-                st.error("❌ Please enter your Google API key in the sidebar first.")
-                return
-
-            client = genai.Client(api_key=api_key)
-
-            # Load and filter CSVs
-            dataframes = []
-            for fname in selected_files:
-                path = results_dir / fname
-                try:
-                    df = pd.read_csv(path)
-                    expected_cols = {"metric_name", "value", "unit", "year", "category", "source"}
-                    if not expected_cols.issubset(df.columns):
-                        st.warning(f"{fname} missing expected columns — skipping.")
-                        continue
-                    df_filtered = df[df["category"].str.lower() == category.lower()]
-                    dataframes.append(df_filtered)
-                except Exception as e:
-                    st.warning(f"⚠️ Could not read {fname}: {e}")
-
-            if len(dataframes) < 2:
-                st.warning("Please select at least two valid CSVs with the chosen category.")
-                return
-
-            # Prepare Gemini input
-            tables = [df.to_dict(orient="records") for df in dataframes]
-            prompt = f"""
-You are an ESG data analyst. I will give you multiple sustainability metric tables (as JSON).
-
-Each dataset has the following columns:
-- "metric_name": the name of the metric (e.g., Scope 1 GHG emissions, renewable electricity use)
-- "value": the reported figure
-- "unit": the measurement unit (e.g., metric tons CO2e)
-- "year": the reporting year
-- "category": one of Environmental, Social, or Governance
-- "source": file and page origin
-
-Your task:
-1. Identify and group metrics that are **semantically common** across these datasets for the category: {category}.
-   - “Common” means they refer to the same underlying sustainability indicator (e.g., GHG emissions, water use, energy consumption).
-   - Names do not have to match exactly; interpret semantically.
-2. For each group of common metrics, return a structured JSON object with:
-   - "common_metric": a concise name summarizing the shared topic (e.g. "GHG Emissions (Scopes 1 & 2)")
-   - "dataset_1": an array of matching metric objects from the first dataset
-   - "dataset_2": an array of matching metric objects from the second dataset
-   - etc. for all datasets.
-
-Return **only** a valid JSON array, no explanations or text.
-"""
-
+        if st.button("🔍 Compare Selected Reports"):
+            if client is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    st.error("❌ Please enter your Google API key in the sidebar first.")
+                    return
+                client = genai.Client(api_key=api_key)
+
+            # Start from the groups of the largest cached subset of these
+            # reports, so only the other reports' metrics need aligning
+            prior_groups, covered = comparison_cache.best_subset(tables, category)
+            new_datasets = set(range(1, len(tables) + 1)) - covered if covered else None
+            if covered:
+                st.info(f"♻️ Reusing a cached comparison of {len(covered)} of these reports.")
+
+            # Map-reduce comparison: match canonical KPI names locally, bucket
+            # the rest by topic, compare the buckets with concurrent Gemini
+            # calls, then merge the groups
             with st.spinner("🤖 Analyzing and comparing data using Gemini..."):
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=[prompt, json.dumps(tables, indent=2)]
-                )
-
-            with st.expander("🧾 See Raw Gemini Output"):
-                st.code(response.text)
-
-            # Extract JSON safely
-            metrics_text = extract_json(response.text)
-
-            try:
-                common_metrics = json.loads(metrics_text)
-                # Cache result
-                with open(cache_file, "w") as f:
-                    json.dump(common_metrics, f, indent=2)
-                st.success(f"✅ Analysis complete and cached as {cache_file.name}")
-            except json.JSONDecodeError:
-                st.error("❌ Gemini output was not valid JSON.")
-                return
+                comparison = asyncio.run(compare_tables_async(
+                    client, tables, category,
+                    max_concurrency=max_concurrency,
+                    rate_limiter=rate_limiter,
+                    lexicon=get_lexicon(),
+                    prior_groups=prior_groups,
+                    new_datasets=new_datasets,
+                    caller=caller,
+                    model=model
+                ))
+            common_metrics = comparison["groups"]
+            st.info(f"🧮 Compared {sum(len(t) for t in tables)} metrics: {comparison['matched_locally']} matched "
+                    f"locally, {comparison['sent_to_llm']} sent to Gemini in {comparison['buckets']} topic buckets.")
+
+            if comparison["failed_buckets"]:
+                st.error(f"❌ Comparison failed for: {', '.join(comparison['failed_buckets'])}. "
+                         "Results are shown but not cached.")
+            else:
+                cache_name = comparison_cache.put(tables, category, comparison["id_groups"])
+                st.success(f"✅ Analysis complete and cached as {cache_name}")
         else:
             st.stop()
 
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from .canonical import CANONICAL_KPIS, CanonicalLexicon
+from .rate_limiter import RateLimiter
+from .resilience import ResilientCaller
+from .utils import estimate_tokens, load_json_output
+
+logger = logging.getLogger(__name__)
+
+# Local pre-grouping: a metric only needs to be compared with metrics of the
+# same topic, so each topic bucket becomes an independent (small) LLM call.
+TOPIC_BUCKETS = {
+    "GHG emissions": ["scope", "ghg", "greenhouse", "emission", "co2", "carbon", "climate"],
+    "Energy": ["energy", "electricity", "renewable", "fuel", "mwh", "gwh", "power"],
+    "Water": ["water", "withdrawal", "discharge", "effluent", "m3"],
+    "Waste and packaging": ["waste", "landfill", "recycl", "packaging", "plastic", "circular"],
+    "Agriculture and land": ["agricultur", "farm", "crop", "land", "deforestation", "biodiversity",
+                             "regenerative", "sourcing", "hectare", "soil"],
+    "Health and safety": ["safety", "injury", "incident", "fatalit", "trir", "ltir", "recordable", "health"],
+    "Workforce and diversity": ["employee", "workforce", "women", "gender", "divers", "inclusion",
+                                "turnover", "hire", "headcount", "pay"],
+    "Training and development": ["training", "learning", "development"],
+    "Community": ["community", "donation", "volunteer", "philanthrop", "contribution"],
+    "Board and governance": ["board", "director", "independent", "governance", "shareholder"],
+    "Ethics and compliance": ["ethic", "compliance", "bribery", "corruption", "conduct", "whistle"],
+    "Supply chain": ["supplier", "supply", "procure", "vendor"],
+}
+OTHER_BUCKET = "Other"
+
+BUCKET_PROMPT = """
+You are an ESG data analyst. Below are sustainability metrics (as JSON) from {datasets} datasets,
+all about the topic "{topic}" in the category {category}. Each metric has an "id" whose prefix
+("d1", "d2", ...) identifies its dataset.
+
+Group metrics that are **semantically common** across datasets, i.e. that refer to the same
+underlying sustainability indicator. Names do not have to match exactly; interpret semantically.
+Only return groups containing metrics from at least two different datasets.
+
+Return **only** a valid JSON array of objects with:
+  - "common_metric": a concise name summarizing the shared indicator
+  - "ids": the ids of the metrics in the group
+"""
+
+EXISTING_PROMPT = """
+These indicators were already matched in other datasets: {names}.
+If a metric refers to one of them, put it in a group whose "common_metric" is exactly that name
+(a group with a single metric is fine in that case).
+"""
+
+
+def _normalize_name(name) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+def topic_of(metric: Dict) -> str:
+    """Local topic bucket of one metric, from its name and unit."""
+    text = f"{_normalize_name(metric.get('metric_name', ''))} {str(metric.get('unit', '')).lower()}"
+    for topic, keywords in TOPIC_BUCKETS.items():
+        if any(keyword in text for keyword in keywords):
+            return topic
+    return OTHER_BUCKET
+
+
+def bucket_metrics(tables: List[List[Dict]], max_rows_per_call: int = 150, skip: Optional[set] = None,
+                   existing: Optional[Dict[str, List[str]]] = None,
+                   new_datasets: Optional[set] = None) -> List[Dict]:
+    """
+    Map step: assign every metric an id and bucket it by topic.
+
+    Ids in `skip` (metrics already grouped locally) are left out. Buckets
+    with metrics from fewer than two datasets cannot contain a common metric
+    and are dropped, unless `existing` lists already-matched indicator names
+    for their topic that the metrics could still join. With `new_datasets`,
+    only buckets containing a metric of one of those datasets are kept (the
+    others were compared before). Buckets larger than
+    `max_rows_per_call` are split into slices of alphabetically sorted
+    names, which keeps similarly named metrics in the same call.
+
+    Returns a list of {"topic": str, "rows": [...], "existing": [...]} where
+    each row is a compact copy of the metric with an "id" of the form
+    "d<dataset>:<row>".
+    """
+    skip = skip or set()
+    existing = existing or {}
+    buckets: Dict[str, List[Dict]] = {}
+    for dataset_index, table in enumerate(tables, start=1):
+        for row_index, metric in enumerate(table):
+            if f"d{dataset_index}:{row_index}" in skip:
+                continue
+            buckets.setdefault(topic_of(metric), []).append({
+                "id": f"d{dataset_index}:{row_index}",
+                "metric_name": metric.get("metric_name"),
+                "value": metric.get("value"),
+                "unit": metric.get("unit"),
+                "year": metric.get("year"),
+            })
+
+    calls = []
+    for topic, rows in buckets.items():
+        datasets = {int(row["id"].split(":")[0].lstrip("d")) for row in rows}
+        if len(datasets) < 2 and not existing.get(topic):
+            continue
+        if new_datasets is not None and not datasets & new_datasets:
+            continue
+        rows = sorted(rows, key=lambda row: _normalize_name(row["metric_name"]))
+        for start in range(0, len(rows), max_rows_per_call):
+            calls.append({"topic": topic, "rows": rows[start:start + max_rows_per_call],
+                          "existing": existing.get(topic, [])})
+    return calls
+
+
+async def compare_bucket_async(client, bucket: Dict, category: str, datasets: int,
+                               semaphore: asyncio.Semaphore, rate_limiter: Optional[RateLimiter] = None,
+                               model: str = "gemini-2.5-flash",
+                               caller: Optional[ResilientCaller] = None) -> List[Dict]:
+    """One per-bucket LLM call (retried by `caller`); returns [{"common_metric", "ids"}, ...]."""
+    prompt = BUCKET_PROMPT.format(datasets=datasets, topic=bucket["topic"], category=category)
+    if bucket.get("existing"):
+        prompt += EXISTING_PROMPT.format(names=json.dumps(bucket["existing"]))
+    payload = json.dumps(bucket["rows"], separators=(",", ":"), default=str)
+
+    async def send():
+        async with semaphore:
+            if rate_limiter is not None:
+                await rate_limiter.acquire(estimate_tokens(prompt + payload))
+            return await client.aio.models.generate_content(model=model, contents=[prompt, payload])
+
+    response = await (caller or ResilientCaller()).call(send)
+
+    groups = load_json_output(response.text)
+    if not isinstance(groups, list):
+        raise ValueError(f"Gemini output for bucket '{bucket['topic']}' was not a JSON array.")
+    return [group for group in groups if isinstance(group, dict) and group.get("ids")]
+
+
+def resolve_groups(tables: List[List[Dict]], groups: List[Dict]) -> List[Dict]:
+    """
+    Reduce step on ids: groups with the same name are merged, ids the model
+    made up are dropped, each metric is used in at most one group, and only
+    groups spanning at least two datasets are kept.
+    """
+    merged: Dict[str, Dict] = {}
+    used = set()
+    for group in groups:
+        name = str(group.get("common_metric") or "Unnamed Metric")
+        target = merged.setdefault(_normalize_name(name), {"common_metric": name, "ids": []})
+        for metric_id in group.get("ids", []):
+            try:
+                dataset, row = str(metric_id).lstrip("d").split(":")
+                dataset, row = int(dataset), int(row)
+                tables[dataset - 1][row]
+            except (ValueError, IndexError):
+                continue  # id the model made up
+            if dataset < 1 or row < 0 or (dataset, row) in used:
+                continue
+            used.add((dataset, row))
+            target["ids"].append(f"d{dataset}:{row}")
+
+    return [
+        group for group in merged.values()
+        if len({metric_id.split(":")[0] for metric_id in group["ids"]}) >= 2
+    ]
+
+
+def merge_groups(tables: List[List[Dict]], groups: List[Dict]) -> List[Dict]:
+    """
+    Map ids back to the original rows and build the `common_metric` /
+    `dataset_N` structure of the compare page (see `resolve_groups`).
+    """
+    merged = []
+    for group in resolve_groups(tables, groups):
+        target = {"common_metric": group["common_metric"], **{f"dataset_{i}": [] for i in range(1, len(tables) + 1)}}
+        for metric_id in group["ids"]:
+            dataset, row = metric_id.lstrip("d").split(":")
+            target[f"dataset_{dataset}"].append(tables[int(dataset) - 1][int(row)])
+        merged.append(target)
+    return merged
+
+
+def canonical_groups(tables: List[List[Dict]], lexicon: CanonicalLexicon) -> List[Dict]:
+    """Group metrics whose names the lexicon maps to a canonical KPI; returns id groups."""
+    groups: Dict[str, List[str]] = {}
+    for dataset_index, table in enumerate(tables, start=1):
+        for row_index, metric in enumerate(table):
+            kpi, _ = lexicon.match(metric.get("metric_name", ""))
+            if kpi is not None:
+                groups.setdefault(kpi, []).append(f"d{dataset_index}:{row_index}")
+    return [{"common_metric": kpi, "ids": ids} for kpi, ids in groups.items()]
+
+
+def learn_aliases(tables: List[List[Dict]], llm_groups: List[Dict], kept_groups: List[Dict],
+                  lexicon: CanonicalLexicon) -> int:
+    """
+    Vote for the names of metrics the LLM grouped into a kept group named
+    after a canonical KPI (one vote per name and comparison); the lexicon
+    adopts a name once enough comparisons agree. Returns the votes cast.
+    """
+    kept = {_normalize_name(group["common_metric"]): group["common_metric"] for group in kept_groups}
+    pairs = set()
+    for group in llm_groups:
+        kpi = kept.get(_normalize_name(group.get("common_metric") or ""))
+        # Names the LLM made up are never learned
+        if kpi not in CANONICAL_KPIS:
+            continue
+        for metric_id in group.get("ids", []):
+            try:
+                dataset, row = str(metric_id).lstrip("d").split(":")
+                metric = tables[int(dataset) - 1][int(row)]
+            except (ValueError, IndexError):
+                continue
+            pairs.add((str(metric.get("metric_name", "")), kpi))
+    return sum(lexicon.learn(alias, kpi) for alias, kpi in sorted(pairs))
+
+
+async def compare_tables_async(client, tables: List[List[Dict]], category: str,
+                               max_concurrency: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                               model: str = "gemini-2.5-flash", max_rows_per_call: int = 150,
+                               lexicon: Optional[CanonicalLexicon] = None,
+                               prior_groups: Optional[List[Dict]] = None,
+                               new_datasets: Optional[set] = None,
+                               caller: Optional[ResilientCaller] = None) -> Dict:
+    """
+    Map-reduce comparison of several metric tables.
+
+    With a `lexicon`, metrics whose names map confidently to a canonical KPI
+    are grouped locally first and only the remainder goes to the LLM (which
+    is told the already-matched names so it can attach metrics to them). The
+    rest are bucketed by topic, the buckets are compared with concurrent LLM
+    calls, and the replies are merged into the compare page's
+    `common_metric` / `dataset_N` groups. Names the LLM files under a
+    canonical KPI are voted into the lexicon and saved.
+
+    `prior_groups` are id groups known from an earlier comparison of a
+    subset of the tables; they are kept like local matches, and with
+    `new_datasets` only buckets involving those datasets' metrics are sent.
+    Bucket calls are retried by `caller` (shared with the extraction jobs
+    when given, so they respect the same circuit breaker).
+
+    Returns {"groups", "id_groups", "buckets", "failed_buckets",
+    "matched_locally", "sent_to_llm"}.
+    """
+    local_groups = list(prior_groups or [])
+    if lexicon is not None:
+        local_groups += canonical_groups(tables, lexicon)
+    matched, existing = set(), {}
+    for group in local_groups:
+        matched.update(group["ids"])
+        names = existing.setdefault(topic_of({"metric_name": group["common_metric"]}), [])
+        if group["common_metric"] not in names:
+            names.append(group["common_metric"])
+
+    buckets = bucket_metrics(tables, max_rows_per_call=max_rows_per_call, skip=matched, existing=existing,
+                             new_datasets=new_datasets)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    caller = caller or ResilientCaller()
+    results = await asyncio.gather(
+        *(compare_bucket_async(client, bucket, category, len(tables), semaphore, rate_limiter, model, caller)
+          for bucket in buckets),
+        return_exceptions=True
+    )
+
+    llm_groups, failed = [], []
+    for bucket, result in zip(buckets, results):
+        if isinstance(result, Exception):
+            logger.warning("Comparison failed for bucket '%s': %s", bucket["topic"], result)
+            failed.append(bucket["topic"])
+            continue
+        llm_groups.extend(result)
+
+    # Known and local groups go first so their names win and they keep their rows
+    id_groups = resolve_groups(tables, local_groups + llm_groups)
+    if lexicon is not None and learn_aliases(tables, llm_groups, id_groups, lexicon):
+        lexicon.save()
+
+    return {
+        "groups": merge_groups(tables, id_groups),
+        "id_groups": id_groups,
+        "buckets": len(buckets),
+        "failed_buckets": failed,
+        "matched_locally": len(matched),
+        "sent_to_llm": sum(len(bucket["rows"]) for bucket in buckets),
+    }
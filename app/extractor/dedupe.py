@@ -0,0 +1,73 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .canonical import normalize_name
+from .normalize import normalize_metrics
+
+
+def metric_keys(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalized (name, value, unit, year) of a metrics frame, as strings.
+
+    Numeric values are compared in their canonical unit ("1,200 MWh" and
+    "1.2 GWh" match), rounded to six significant digits; other values by
+    their lowercased text. Names go through `normalize_name`.
+    """
+    names = frame.get("metric_name", pd.Series("", index=frame.index)).astype("string").fillna("")
+    codes, uniques = pd.factorize(names)
+    name_key = np.array([normalize_name(name) for name in uniques] + [""], dtype=object)[codes]
+
+    normalized = normalize_metrics(frame.reindex(columns=["value", "unit"]))
+    raw_unit = normalized["unit"].astype("string").str.lower().str.strip().fillna("")
+    canonical_unit = normalized["canonical_unit"].astype("string")
+    unit_key = canonical_unit.fillna(raw_unit)
+
+    numeric = normalized["canonical_value"].fillna(normalized["value_numeric"])
+    text_value = normalized["value"].astype("string").str.lower().str.strip().fillna("")
+    value_key = numeric.map(lambda value: f"{value:.6g}", na_action="ignore").astype("string").fillna(text_value)
+
+    year = frame.get("year", pd.Series(pd.NA, index=frame.index)).astype("string")
+    year_key = year.str.extract(r"((?:19|20)\d{2})", expand=False).fillna("")
+
+    return pd.DataFrame({"name": name_key, "value": value_key, "unit": unit_key, "year": year_key},
+                        index=frame.index)
+
+
+def dedupe_metrics(metrics: List[Dict]) -> List[Dict]:
+    """
+    Merge repeated extractions of the same KPI within one report.
+
+    Metrics with the same normalized (name, value, unit, year) become one
+    row, kept where the KPI was first seen, with every page it was found on
+    in `source_pages` and the number of copies in `occurrences`. Metrics
+    that share name, unit and year but disagree on the value are all kept
+    and marked `conflict`. Rows are grouped by a 64-bit hash of their keys.
+    Entries without a metric name (unparsed model output) pass through.
+    """
+    named = [m for m in metrics if m.get("metric_name")]
+    if not named:
+        return metrics
+    frame = pd.DataFrame(named)
+    keys = metric_keys(frame)
+    frame["_identity"] = pd.util.hash_pandas_object(keys[["name", "value", "unit", "year"]], index=False)
+    frame["_measure"] = pd.util.hash_pandas_object(keys[["name", "unit", "year"]], index=False)
+    # From the dicts, so integer pages do not become floats next to missing ones
+    frame["_page"] = pd.Series([m.get("source_page") for m in named], index=frame.index, dtype="object")
+
+    groups = frame.groupby("_identity", sort=False)
+    first = groups.head(1)
+    occurrences = groups.size()
+    source_pages = frame.drop_duplicates(["_identity", "_page"]).groupby("_identity", sort=False)["_page"].agg(list)
+    # A measure with more than one distinct value is a conflict
+    conflict = first.groupby("_measure")["_identity"].transform("size") > 1
+
+    merged = []
+    for position, identity, is_conflict in zip(first.index, first["_identity"], conflict):
+        metric = dict(named[position])
+        metric["source_pages"] = [page for page in source_pages[identity] if pd.notna(page)]
+        metric["occurrences"] = int(occurrences[identity])
+        metric["conflict"] = bool(is_conflict)
+        merged.append(metric)
+    return merged + [m for m in metrics if not m.get("metric_name")]
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from google.genai import _transformers, errors, types
+
+# (metric_name, unit, category, value range) used for canned extraction replies
+CANNED_METRICS = [
+    ("Scope 1 GHG emissions", "tCO2e", "Environmental", (10_000, 900_000)),
+    ("Scope 2 GHG emissions (market-based)", "tCO2e", "Environmental", (5_000, 500_000)),
+    ("Total energy consumption", "MWh", "Environmental", (50_000, 9_000_000)),
+    ("Renewable electricity share", "%", "Environmental", (5, 100)),
+    ("Water withdrawal", "m3", "Environmental", (100_000, 90_000_000)),
+    ("Waste diverted from landfill", "%", "Environmental", (20, 99)),
+    ("Women in management", "%", "Social", (10, 60)),
+    ("Total recordable incident rate", "per 200,000 hours", "Social", (0, 5)),
+    ("Employee training hours", "hours", "Social", (1_000, 900_000)),
+    ("Independent board members", "%", "Governance", (50, 100)),
+    ("Employees trained on code of conduct", "%", "Governance", (60, 100)),
+]
+
+PAGE_PATTERN = re.compile(r"=== PAGE (\S+) ===\n(.*?)\n=== END PAGE \1 ===", re.DOTALL)
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = FakeUsageMetadata(prompt_tokens, max(1, len(text) // 4))
+
+
+class FakeGeminiClient:
+    """
+    Offline stand-in for `genai.Client` for benchmarks and regression runs.
+
+    Replies are deterministic canned JSON derived from the request: PAGE
+    blocks get metrics seeded by the page text, comparison prompts get
+    groups of identically named metrics (as dataset_N tables or id lists,
+    matching the payload). Each call sleeps `latency` seconds
+    (plus up to `jitter`), and when more than `quota_rpm` calls arrive within
+    a minute it raises the same 429 `ClientError` as the real API, with a
+    RetryInfo delay. The request `config` goes through the SDK's own
+    validation and `response_schema` conversion first, so a request the
+    real client would refuse to send fails here too.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, quota_rpm: Optional[int] = None,
+                 metrics_per_page: int = 3, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_rpm = quota_rpm
+        self.metrics_per_page = metrics_per_page
+        self.seed = seed
+        self.calls = 0
+        self.rate_limited = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    @staticmethod
+    def check_config(config) -> None:
+        """Validate `config` as `generate_content` does before sending; raises on what the SDK rejects."""
+        if config is None:
+            return
+        if isinstance(config, dict):
+            config = types.GenerateContentConfig.model_validate(config)
+        if config.response_schema is not None:
+            _transformers.t_schema(None, config.response_schema)
+
+    def _admit(self) -> float:
+        """Count the call, enforce the quota and return the simulated latency."""
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.quota_rpm is not None and len(self._recent) >= self.quota_rpm:
+                self.rate_limited += 1
+                retry_after = 60 - (now - self._recent[0])
+                raise errors.ClientError(429, {"error": {
+                    "code": 429,
+                    "status": "RESOURCE_EXHAUSTED",
+                    "message": "Fake quota exceeded.",
+                    "details": [{
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": f"{max(retry_after, 1):.0f}s",
+                    }],
+                }})
+            self._recent.append(now)
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def respond(self, contents) -> FakeResponse:
+        text = contents if isinstance(contents, str) else "\n".join(str(c) for c in contents)
+        pages = PAGE_PATTERN.findall(text)
+        if pages:
+            reply = [metric for page, page_text in pages for metric in self._page_metrics(page, page_text)]
+        elif "common_metric" in text and not isinstance(contents, str):
+            reply = self._group_metrics(contents[-1])
+        else:
+            reply = []
+        return FakeResponse(json.dumps(reply), max(1, len(text) // 4))
+
+    def _page_metrics(self, page: str, page_text: str):
+        digest = hashlib.sha256(f"{self.seed}:{page_text}".encode("utf-8")).hexdigest()
+        rng = random.Random(int(digest[:16], 16))
+        metrics = []
+        count = min(self.metrics_per_page, len(CANNED_METRICS))
+        for name, unit, category, (low, high) in rng.sample(CANNED_METRICS, count):
+            metrics.append({
+                "metric_name": name,
+                "value": str(rng.randint(low, high)),
+                "unit": unit,
+                "year": rng.choice([2022, 2023, 2024]),
+                "category": category,
+                "source_page": int(page) if page.isdigit() else page,
+            })
+        return metrics
+
+    @staticmethod
+    def _group_metrics(payload: str):
+        try:
+            rows = json.loads(payload)
+        except (TypeError, json.JSONDecodeError):
+            return []
+        if rows and isinstance(rows[0], list):
+            # Whole tables: [[row, ...], ...] → dataset_N groups
+            names = {}
+            for index, table in enumerate(rows, start=1):
+                for row in table:
+                    names.setdefault(str(row.get("metric_name", "")).lower(), {}).setdefault(
+                        f"dataset_{index}", []).append(row)
+            return [
+                {"common_metric": members[next(iter(members))][0].get("metric_name"), **members}
+                for members in names.values() if len(members) > 1
+            ]
+
+        # Per-bucket rows with ids ("d<dataset>:<row>") → id groups
+        names = {}
+        for row in rows:
+            names.setdefault(str(row.get("metric_name", "")).lower(), []).append(row)
+        return [
+            {"common_metric": members[0].get("metric_name"), "ids": [row["id"] for row in members]}
+            for members in names.values()
+            if len({str(row["id"]).split(":")[0] for row in members}) > 1
+        ]
+
+
+class _FakeModels:
+    def __init__(self, client: FakeGeminiClient):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        self._client.check_config(config)
+        time.sleep(self._client._admit())
+        return self._client.respond(contents)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: FakeGeminiClient):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        self._client.check_config(config)
+        await asyncio.sleep(self._client._admit())
+        return self._client.respond(contents)
+
+
+class _FakeAio:
+    def __init__(self, client: FakeGeminiClient):
+        self.models = _FakeAsyncModels(client)
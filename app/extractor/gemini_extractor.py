@@ -1,78 +1,423 @@
 from google import genai
+from google.genai import types
 import os, json
-from typing import List, Dict
-import re
+import asyncio
+import inspect
+import logging
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Dict, Optional
+
+from pydantic import ValidationError
+
+from .page_cache import PageCache
+from .rate_limiter import RateLimiter
+from .resilience import ResilientCaller, describe
+from .routing import ModelRouter
+from .schema import Metric, MetricList
+from .telemetry import RunTelemetry, usage_tokens
+from .utils import estimate_tokens, load_json_output
+
+logger = logging.getLogger(__name__)
 
 class MetricsExtractor:
-    def __init__(self, api_key: str = None):
-        if api_key is None:
-            api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("Google API key not found. Please set GOOGLE_API_KEY.")
-        self.client = genai.Client(api_key=api_key)
-
-    def extract_metrics(self, text_chunks: List[Dict[str, str]]) -> List[Dict]:
-        """
-        Extract ESG metrics from text chunks.
-        Each chunk is expected to be a dict with:
-          {
-            "page_number": int,
-            "text": str
-          }
-        """
-        base_prompt = """
+    base_prompt = """
         You are an ESG data extraction assistant.
-        Extract sustainability metrics from the text and return a **valid JSON array**.
+        Extract sustainability metrics from the report pages below and return a **valid JSON array**.
+        Each page starts with "=== PAGE <n> ===" and ends with "=== END PAGE <n> ===".
         Each entry must include:
           - metric_name
           - value
           - unit
           - year
           - category (Environmental, Social, Governance)
+          - source_page (the number <n> of the page the metric was found on)
         Do NOT include any explanations, markdown, or code fences. Return strictly JSON.
 
-        Text:
+        Pages:
         {text}
         """
+    page_template = "=== PAGE {page_number} ===\n{text}\n=== END PAGE {page_number} ==="
+
+    def __init__(self, api_key: str = None, model: str = "gemini-2.5-flash",
+                 cache: Optional[PageCache] = None, max_input_tokens: Optional[int] = 8000,
+                 structured_output: bool = True, client=None, telemetry: Optional[RunTelemetry] = None,
+                 caller: Optional[ResilientCaller] = None, router: Optional[ModelRouter] = None):
+        # `client` can be any object with the genai.Client interface
+        # (`models.generate_content` and `aio.models.generate_content`),
+        # e.g. the offline FakeGeminiClient used for benchmarks.
+        if client is None:
+            if api_key is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError("Google API key not found. Please set GOOGLE_API_KEY.")
+            client = genai.Client(api_key=api_key)
+        self.client = client
+        self.model = model
+        # With a router, each request's model is chosen per batch (and `model` is unused)
+        self.router = router
+        # The model part of cache and checkpoint keys
+        self.model_key = router.fingerprint if router is not None else model
+        self.cache = cache
+        # Input-token budget per request; falsy sends one page per request
+        self.max_input_tokens = max_input_tokens
+        # Schema-constrained mode: Gemini must answer with a JSON list of `Metric`
+        self.structured_output = structured_output
+        self.generation_config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=list[Metric]
+        ) if structured_output else None
+        # Everything besides the page text that determines the reply (used in cache keys)
+        self.prompt_fingerprint = self.base_prompt
+        if structured_output:
+            self.prompt_fingerprint += json.dumps(MetricList.json_schema(), sort_keys=True)
+        # Optional per-run request latency, token and parse timings
+        self.telemetry = telemetry
+        # Retries and circuit breaker; share one caller so all extractions pause together
+        self.caller = caller or ResilientCaller()
+        self.failed_pages: List[int] = []
+        # {"pages", "error"} of every request that failed after its retries
+        self.failures: List[Dict] = []
+        self.cache_hits = 0
+        self.requests_sent = 0
+
+    def _stage(self, name: str):
+        return self.telemetry.stage(name) if self.telemetry is not None else nullcontext()
+
+    def _record_request(self, batch: List[Dict], started: float, seconds: float, model: str,
+                        response=None) -> None:
+        """Record one request's latency and token usage; no response means it failed."""
+        if self.telemetry is None:
+            return
+        input_tokens, output_tokens = usage_tokens(response)
+        self.telemetry.record_request(started, seconds, len(batch), input_tokens, output_tokens,
+                                      status="ok" if response is not None else "error", model=model)
+
+    def _route_record(self, batch: List[Dict], model: str, reason: str, response, seconds: float,
+                      escalated: bool = False) -> None:
+        input_tokens, output_tokens = usage_tokens(response)
+        self.router.record(self._batch_label(batch), model, reason, input_tokens, output_tokens, seconds,
+                           escalated=escalated)
+
+    def _send_sync(self, batch: List[Dict], prompt: str, model: str, rate_limiter: Optional[RateLimiter]):
+        """One request with retries; returns (response, latency of the successful attempt)."""
+        def send():
+            if rate_limiter is not None:
+                rate_limiter.acquire_sync(estimate_tokens(prompt))
+            self.requests_sent += 1
+            started, clock = time.time(), time.perf_counter()
+            try:
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=self.generation_config
+                )
+            except Exception:
+                self._record_request(batch, started, time.perf_counter() - clock, model)
+                raise
+            seconds = time.perf_counter() - clock
+            self._record_request(batch, started, seconds, model, response)
+            return response, seconds
+
+        return self.caller.call_sync(send)
+
+    async def _send(self, batch: List[Dict], prompt: str, model: str, semaphore: asyncio.Semaphore,
+                    rate_limiter: Optional[RateLimiter]):
+        """Async `_send_sync`; the slot is only held for an attempt, not while backing off."""
+        async def send():
+            async with semaphore:
+                if rate_limiter is not None:
+                    await rate_limiter.acquire(estimate_tokens(prompt))
+                self.requests_sent += 1
+                started, clock = time.time(), time.perf_counter()
+                try:
+                    response = await self.client.aio.models.generate_content(
+                        model=model,
+                        contents=prompt,
+                        config=self.generation_config
+                    )
+                except Exception:
+                    self._record_request(batch, started, time.perf_counter() - clock, model)
+                    raise
+                seconds = time.perf_counter() - clock
+                self._record_request(batch, started, seconds, model, response)
+                return response, seconds
+
+        return await self.caller.call(send)
+
+    def _parse_batch(self, batch: List[Dict], response) -> List[Dict]:
+        logger.debug("Raw Gemini response for pages %s: %.500s", self._batch_label(batch), response.text)
+        with self._stage("parse"):
+            return self._parse_response(response.text, [chunk.get("page_number") for chunk in batch])
+
+    def _from_cache(self, text: str, page_number) -> Optional[List[Dict]]:
+        """Return cached metrics for a page, or None if it still has to be sent."""
+        if self.cache is None:
+            return None
+        metrics = self.cache.get(PageCache.make_key(text, self.prompt_fingerprint, self.model_key))
+        if metrics is None:
+            return None
+        for item in metrics:
+            item["source_page"] = page_number
+        self.cache_hits += 1
+        return metrics
+
+    def _to_cache(self, text: str, metrics: List[Dict]) -> None:
+        # Unparseable replies are not cached so the page is retried next time
+        if self.cache is None or any("raw_output" in m for m in metrics):
+            return
+        self.cache.put(PageCache.make_key(text, self.prompt_fingerprint, self.model_key), metrics)
+
+    def _format_page(self, chunk: Dict) -> str:
+        return self.page_template.format(page_number=chunk.get("page_number"), text=chunk.get("text", ""))
+
+    def _build_prompt(self, batch: List[Dict]) -> str:
+        return self.base_prompt.format(text="\n\n".join(self._format_page(chunk) for chunk in batch))
+
+    def pack_pages(self, text_chunks: List[Dict]) -> List[List[Dict]]:
+        """
+        Group consecutive pages into batches whose prompt fits `max_input_tokens`.
+        A page that is larger than the budget on its own gets a batch of its own.
+        """
+        if not self.max_input_tokens:
+            return [[chunk] for chunk in text_chunks]
 
-        all_metrics = []
+        overhead = estimate_tokens(self.base_prompt)
+        batches, batch, used = [], [], overhead
         for chunk in text_chunks:
-            page_number = chunk.get("page_number")
-            text = chunk.get("text", "")
+            cost = estimate_tokens(self._format_page(chunk))
+            if batch and used + cost > self.max_input_tokens:
+                batches.append(batch)
+                batch, used = [], overhead
+            batch.append(chunk)
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _resolve_page(value, page_numbers: List, fallback):
+        """Map the model's `source_page` back onto a page that was actually sent."""
+        for page in page_numbers:
+            if value == page or str(value).strip() == str(page):
+                return page
+        return fallback
+
+    def _parse_response(self, raw_text: str, page_numbers: List) -> List[Dict]:
+        """
+        Turn a raw Gemini reply into metric dicts tagged with `source_page`.
+        Metrics the model did not attribute to one of `page_numbers` get the
+        page range of the batch (e.g. "12-15") rather than a guessed page.
 
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=base_prompt.format(text=text)
-            )
+        In structured mode the reply is validated against `Metric` in one
+        pass; only a reply that fails validation goes through the lenient
+        JSON recovery.
+        """
+        raw_text = (raw_text or "").strip()
+        if len(page_numbers) == 1:
+            fallback = page_numbers[0]
+        else:
+            fallback = f"{page_numbers[0]}-{page_numbers[-1]}"
 
-            print(f"🧾 Raw Gemini 2.5 flash response for page {page_number}:", response.text)
-            raw_text = response.text.strip()
+        parsed = None
+        if self.structured_output:
             try:
-                parsed = json.loads(raw_text)
-                if isinstance(parsed, list):
-                    for item in parsed:
-                        if isinstance(item, dict):
-                            item["source_page"] = page_number
-                            all_metrics.append(item)
-                elif isinstance(parsed, dict):
-                    parsed["source_page"] = page_number
-                    all_metrics.append(parsed)
-            except json.JSONDecodeError:
-                match = re.search(r'(\[.*\]|\{.*\})', raw_text, re.DOTALL)
-                if match:
-                    parsed = json.loads(match.group())
-                    if isinstance(parsed, list):
-                        for item in parsed:
-                            if isinstance(item, dict):
-                                item["source_page"] = page_number
-                                all_metrics.append(item)
-                    elif isinstance(parsed, dict):
-                        parsed["source_page"] = page_number
-                        all_metrics.append(parsed)
-                else:
-                    all_metrics.append({
-                        "raw_output": raw_text,
-                        "source_page": page_number
-                    })
-
-        return all_metrics
+                parsed = [metric.model_dump(mode="json") for metric in MetricList.validate_json(raw_text)]
+            except ValidationError:
+                parsed = None
+        if parsed is None:
+            parsed = load_json_output(raw_text)
+        if parsed is None:
+            return [{
+                "raw_output": raw_text,
+                "source_page": fallback
+            }]
+
+        items = parsed if isinstance(parsed, list) else [parsed]
+        metrics = []
+        for item in items:
+            if isinstance(item, dict):
+                item["source_page"] = self._resolve_page(item.get("source_page"), page_numbers, fallback)
+                metrics.append(item)
+        return metrics
+
+    def _finish_batch(self, batch: List[Dict], metrics: List[Dict]) -> List[Dict]:
+        """Cache the batch page by page, when every metric could be attributed."""
+        per_page = {chunk.get("page_number"): [] for chunk in batch}
+        unattributed = []
+        for item in metrics:
+            per_page.get(item["source_page"], unattributed).append(item)
+        if not unattributed:
+            for chunk in batch:
+                self._to_cache(chunk.get("text", ""), per_page[chunk.get("page_number")])
+        return metrics
+
+    def _plan(self, text_chunks: List[Dict]):
+        """Answer cached pages locally and pack the remaining ones into batches."""
+        cached, pending = [], []
+        for chunk in text_chunks:
+            hit = self._from_cache(chunk.get("text", ""), chunk.get("page_number"))
+            if hit is None:
+                pending.append(chunk)
+            else:
+                cached.extend(hit)
+        if self.router is None:
+            return cached, self.pack_pages(pending)
+        # Keep light and full pages in separate batches so one dense page
+        # does not send its simple neighbours to the full model
+        batches, run = [], []
+        for chunk in pending:
+            if run and self.router.page_tier(chunk)[0] != self.router.page_tier(run[-1])[0]:
+                batches.extend(self.pack_pages(run))
+                run = []
+            run.append(chunk)
+        batches.extend(self.pack_pages(run))
+        return cached, batches
+
+    def _batch_steps(self, batch: List[Dict]):
+        """
+        Request logic of one batch, shared by the sync and async paths:
+        yields (prompt, model) for each request to send, is sent back its
+        (response, seconds), and returns the batch's metrics. Handles model
+        routing and the escalation of empty or invalid light answers.
+        """
+        prompt = self._build_prompt(batch)
+        model, reason = self.router.route(batch) if self.router is not None else (self.model, None)
+        response, seconds = yield prompt, model
+        metrics = self._parse_batch(batch, response)
+        if self.router is not None:
+            self._route_record(batch, model, reason, response, seconds)
+            escalation = self.router.escalation(model, metrics)
+            if escalation:
+                response, seconds = yield prompt, self.router.full_model
+                metrics = self._parse_batch(batch, response)
+                self._route_record(batch, self.router.full_model, escalation, response, seconds, escalated=True)
+        return self._finish_batch(batch, metrics)
+
+    def _run_batch_sync(self, batch: List[Dict], rate_limiter: Optional[RateLimiter]) -> List[Dict]:
+        steps = self._batch_steps(batch)
+        request = next(steps)
+        try:
+            while True:
+                prompt, model = request
+                request = steps.send(self._send_sync(batch, prompt, model, rate_limiter))
+        except StopIteration as done:
+            return done.value
+
+    async def _run_batch(self, batch: List[Dict], semaphore: asyncio.Semaphore,
+                         rate_limiter: Optional[RateLimiter]) -> List[Dict]:
+        steps = self._batch_steps(batch)
+        request = next(steps)
+        try:
+            while True:
+                prompt, model = request
+                request = steps.send(await self._send(batch, prompt, model, semaphore, rate_limiter))
+        except StopIteration as done:
+            return done.value
+
+    @staticmethod
+    def _in_page_order(text_chunks: List[Dict], metrics: List[Dict]) -> List[Dict]:
+        # Stable sort: metrics of one page keep the model's order, and
+        # batch-level (unattributed) metrics go last
+        position = {chunk.get("page_number"): i for i, chunk in enumerate(text_chunks)}
+        return sorted(metrics, key=lambda m: position.get(m.get("source_page"), len(position)))
+
+    def _batch_label(self, batch: List[Dict]) -> str:
+        pages = [chunk.get("page_number") for chunk in batch]
+        return str(pages[0]) if len(pages) == 1 else f"{pages[0]}-{pages[-1]}"
+
+    def extract_metrics(self, text_chunks: List[Dict[str, str]],
+                        rate_limiter: Optional[RateLimiter] = None) -> List[Dict]:
+        """
+        Extract ESG metrics from text chunks.
+        Each chunk is expected to be a dict with:
+          {
+            "page_number": int,
+            "text": str
+          }
+        Pages are packed into requests of at most `max_input_tokens`.
+        """
+        self.cache_hits = 0
+        self.requests_sent = 0
+        self.failed_pages = []
+        self.failures = []
+        all_metrics, batches = self._plan(text_chunks)
+        for batch in batches:
+            all_metrics.extend(self._run_batch_sync(batch, rate_limiter))
+
+        return self._in_page_order(text_chunks, all_metrics)
+
+    async def _extract_async(self, text_chunks: List[Dict], semaphore: asyncio.Semaphore,
+                             rate_limiter: Optional[RateLimiter]):
+        """Extract one group of pages; returns (metrics in page order, failed pages)."""
+        all_metrics, batches = self._plan(text_chunks)
+        results = await asyncio.gather(
+            *(self._run_batch(batch, semaphore, rate_limiter) for batch in batches),
+            return_exceptions=True
+        )
+
+        failed_pages = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.warning("Extraction failed for pages %s: %s", self._batch_label(batch), describe(result))
+                failed_pages.extend(chunk.get("page_number") for chunk in batch)
+                self.failures.append({"pages": self._batch_label(batch), "error": str(result)})
+                continue
+            all_metrics.extend(result)
+
+        return self._in_page_order(text_chunks, all_metrics), failed_pages
+
+    async def extract_metrics_async(self, text_chunks: List[Dict[str, str]],
+                                    max_concurrency: int = 4,
+                                    rate_limiter: Optional[RateLimiter] = None) -> List[Dict]:
+        """
+        Concurrent version of `extract_metrics`.
+
+        At most `max_concurrency` requests are in flight, and each request waits
+        for `rate_limiter` before being sent. Results are returned in page
+        order, regardless of completion order. Transient errors are retried by
+        `self.caller`; pages whose request still fails are skipped and listed
+        in `self.failed_pages` (with the error in `self.failures`). Pages already in the cache
+        are answered locally without a request.
+        """
+        self.cache_hits = 0
+        self.requests_sent = 0
+        self.failures = []
+        metrics, self.failed_pages = await self._extract_async(
+            text_chunks, asyncio.Semaphore(max_concurrency), rate_limiter
+        )
+        return metrics
+
+    async def extract_parts_async(self, parts: List[List[Dict]],
+                                  max_concurrency: int = 4,
+                                  rate_limiter: Optional[RateLimiter] = None,
+                                  on_part: Optional[Callable[[int, List[Dict], List], None]] = None,
+                                  semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict]:
+        """
+        Extract several parts (lists of page chunks) concurrently under one
+        request cap. Pages are only packed together within a part, so each
+        part completes independently: `on_part(index, metrics, failed_pages)`
+        is called as soon as a part is done, e.g. to checkpoint it (it may be
+        a coroutine function, to do its I/O off the event loop).
+
+        Pass a shared `semaphore` to cap requests across several extractions
+        (it replaces `max_concurrency`).
+
+        Returns one {"metrics", "failed_pages"} dict per part, in part order.
+        """
+        semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+        self.cache_hits = 0
+        self.requests_sent = 0
+        self.failures = []
+
+        async def extract_part(index, part):
+            metrics, failed_pages = await self._extract_async(part, semaphore, rate_limiter)
+            if on_part is not None:
+                done = on_part(index, metrics, failed_pages)
+                if inspect.isawaitable(done):
+                    await done
+            return {"metrics": metrics, "failed_pages": failed_pages}
+
+        results = await asyncio.gather(*(extract_part(i, part) for i, part in enumerate(parts)))
+        self.failed_pages = [page for result in results for page in result["failed_pages"]]
+        return results
@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .checkpoint import PartCheckpoint
+from .gemini_extractor import MetricsExtractor
+from .page_cache import PageCache
+from .pipeline import extract_report_async, report_key, save_results
+from .prefilter import RelevancePrefilter
+from .rate_limiter import AdjustableSemaphore, RateLimiter
+from .resilience import ResilientCaller
+from .routing import ModelRouter
+from .tables import TableExtractor
+from .telemetry import RunTelemetry
+from .text_store import PageTextStore
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Per-job extraction settings and their defaults
+DEFAULT_SETTINGS = {
+    "model": "gemini-2.5-flash",
+    # Model routing: simple pages go to `light_model`, hard ones to `model`
+    "routing": True,
+    "light_model": "gemini-2.5-flash-lite",
+    "token_budget": 0,
+    "latency_budget": 0,
+    "pages_per_part": 5,
+    "backend": "pdfplumber",
+    "text_workers": 1,
+    "max_input_tokens": 8000,
+    "structured_output": True,
+    "relevance_threshold": 0.2,
+    "table_backend": "pymupdf",
+}
+
+
+class JobStore:
+    """
+    SQLite-backed queue of extraction jobs.
+
+    Uploaded PDFs are saved under `upload_dir` by content hash; a job row
+    holds its settings, status (queued → running → done / partial / failed, or
+    needs_key when no API key came with it),
+    part progress and the checkpoint key its partial results are written
+    under. Safe to share between the Streamlit script threads and the
+    runner thread.
+    """
+
+    COLUMNS = ["id", "file_name", "pdf_path", "pdf_hash", "settings", "status", "parts_done", "parts_total",
+               "checkpoint_key", "result", "error", "created_at", "started_at", "finished_at"]
+
+    def __init__(self, path: str = "data/jobs/jobs.sqlite", upload_dir: str = "data/jobs/uploads"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " file_name TEXT NOT NULL,"
+                " pdf_path TEXT NOT NULL,"
+                " pdf_hash TEXT NOT NULL,"
+                " settings TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " parts_done INTEGER NOT NULL DEFAULT 0,"
+                " parts_total INTEGER,"
+                " checkpoint_key TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _row(self, row) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["settings"] = json.loads(job["settings"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, file_name: str, pdf_bytes: bytes, settings: Optional[Dict] = None) -> str:
+        """Save the upload and queue a job; an identical queued or running job is reused."""
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        settings_json = json.dumps(settings, sort_keys=True)
+        pdf_path = self.upload_dir / f"{pdf_hash}.pdf"
+        if not pdf_path.exists():
+            tmp_path = pdf_path.with_suffix(".tmp")
+            tmp_path.write_bytes(pdf_bytes)
+            os.replace(tmp_path, pdf_path)
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE pdf_hash = ? AND settings = ? AND file_name = ? "
+                f"AND status IN {ACTIVE_STATUSES}", (pdf_hash, settings_json, file_name)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            job_id = uuid.uuid4().hex[:12]
+            self._conn.execute(
+                "INSERT INTO jobs (id, file_name, pdf_path, pdf_hash, settings, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, file_name, str(pdf_path), pdf_hash, settings_json, time.time())
+            )
+        return job_id
+
+    def claim_next(self) -> Optional[Dict]:
+        """Atomically mark the oldest queued job running and return it."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, parts_done = 0, error = NULL WHERE id = ?",
+                (time.time(), row[0])
+            )
+            return self._row(self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (row[0],)).fetchone())
+
+    def update(self, job_id: str, **fields) -> None:
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def requeue(self, job_id: str) -> None:
+        """Queue a finished (partial or failed) job again; finished parts are resumed."""
+        self.update(job_id, status="queued", finished_at=None, created_at=time.time())
+
+    def requeue_running(self) -> int:
+        """Jobs left running by a stopped process go back to the queue."""
+        with self._lock, self._conn:
+            return self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._row(self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def partial_metrics(self, job: Dict) -> List[Dict]:
+        """Metrics of the parts a job has finished so far, from its checkpoint."""
+        if not job.get("checkpoint_key"):
+            return []
+        records = PartCheckpoint(job["checkpoint_key"]).load()
+        return [dict(m) for _, record in sorted(records.items()) for m in record["metrics"]]
+
+
+class JobRunner:
+    """
+    Worker pool that processes queued jobs in the background.
+
+    All workers run as tasks on one event loop in a daemon thread, so every
+    job shares a single request semaphore and rate limiter: several reports
+    (from several users) progress in parallel while Gemini sees at most
+    `max_concurrency` requests at a time. They also share one retry layer,
+    so a quota error pauses every job until the quota recovers. Text and
+    table extraction run off the loop, as in `extract_report_async`.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, max_concurrency: int = 8,
+                 requests_per_minute: int = 10, tokens_per_minute: Optional[int] = None,
+                 page_cache: Optional[PageCache] = None,
+                 page_store: Optional[PageTextStore] = None,
+                 client_factory: Optional[Callable[[str], object]] = None,
+                 poll_interval: float = 0.5):
+        self.store = store
+        self.workers = workers
+        self.page_cache = page_cache
+        # Page text and tables of every upload, so a retry or a rerun with
+        # other settings does not parse the PDF again
+        self.page_store = page_store or PageTextStore()
+        self.client_factory = client_factory or _genai_client
+        self.caller = ResilientCaller()
+        self.poll_interval = poll_interval
+        self._clients: Dict[str, object] = {}
+        self._api_keys: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = threading.Event()
+        self._limits = (max_concurrency, requests_per_minute, tokens_per_minute)
+        self.semaphore = AdjustableSemaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+
+    def configure(self, max_concurrency: int, requests_per_minute: int,
+                  tokens_per_minute: Optional[int] = None) -> None:
+        """Change the global limits in place, so running jobs are held to them too."""
+        limits = (max_concurrency, requests_per_minute, tokens_per_minute)
+        if limits == self._limits:
+            return
+        self._limits = limits
+        self.rate_limiter.configure(requests_per_minute, tokens_per_minute)
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            # The semaphore belongs to the workers' loop
+            loop.call_soon_threadsafe(self.semaphore.resize, max_concurrency)
+        else:
+            self.semaphore.resize(max_concurrency)
+
+    def start(self) -> "JobRunner":
+        if self._thread is None or not self._thread.is_alive():
+            self.store.requeue_running()
+            self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True,
+                                            name="extraction-jobs")
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def submit(self, file_name: str, pdf_bytes: bytes, settings: Optional[Dict] = None,
+               api_key: Optional[str] = None) -> str:
+        """Queue a report; the API key is kept in memory only and required to run it."""
+        job_id = self.store.enqueue(file_name, pdf_bytes, settings)
+        if api_key:
+            self._api_keys[job_id] = api_key
+        return job_id
+
+    def retry(self, job_id: str, api_key: Optional[str] = None) -> None:
+        """Queue a finished job again; finished parts are reused from its checkpoint."""
+        if api_key:
+            self._api_keys[job_id] = api_key
+        self.store.requeue(job_id)
+
+    def _forget_key(self, job_id: str) -> None:
+        """Drop a job's API key, and its client once no other pending job uses the key."""
+        api_key = self._api_keys.pop(job_id, None)
+        if api_key is not None and api_key not in self._api_keys.values():
+            self._clients.pop(api_key, None)
+
+    def _client(self, api_key: str):
+        if api_key not in self._clients:
+            self._clients[api_key] = self.client_factory(api_key)
+        return self._clients[api_key]
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def _worker(self) -> None:
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job["id"] not in self._api_keys:
+                # Keys live in memory only, so jobs requeued after a restart
+                # have none; they wait for a retry instead of borrowing a key
+                await asyncio.to_thread(self.store.update, job["id"], status="needs_key",
+                                        error="No API key was submitted with this job; retry it with a key.",
+                                        finished_at=time.time())
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.warning("Job %s (%s) failed: %s", job["id"], job["file_name"], e)
+                await asyncio.to_thread(self.store.update, job["id"], status="failed", error=str(e),
+                                        finished_at=time.time())
+            finally:
+                # Keys are not kept past the job, whether it succeeded, failed or was cancelled
+                self._forget_key(job["id"])
+
+    async def _run(self, job: Dict) -> None:
+        settings = {**DEFAULT_SETTINGS, **job["settings"]}
+        telemetry = RunTelemetry(job["file_name"])
+        router = ModelRouter(
+            light_model=settings["light_model"],
+            full_model=settings["model"],
+            token_budget=settings["token_budget"],
+            latency_budget=settings["latency_budget"]
+        ) if settings["routing"] else None
+        extractor = MetricsExtractor(
+            model=settings["model"],
+            client=self._client(self._api_keys[job["id"]]),
+            cache=self.page_cache,
+            max_input_tokens=settings["max_input_tokens"],
+            structured_output=settings["structured_output"],
+            telemetry=telemetry,
+            caller=self.caller,
+            router=router
+        )
+        threshold = settings["relevance_threshold"]
+        prefilter = RelevancePrefilter(threshold) if threshold > 0 else None
+        table_extractor = TableExtractor(settings["table_backend"]) if settings["table_backend"] != "off" else None
+        checkpoint_key = report_key(job["pdf_hash"], extractor, prefilter, table_extractor,
+                                    backend=settings["backend"])
+        # SQLite writes run off the loop so disk I/O never stalls the other jobs
+        await asyncio.to_thread(self.store.update, job["id"], checkpoint_key=checkpoint_key)
+
+        finished = set()
+
+        async def on_part(index, total_parts, record):
+            finished.add(index)
+            await asyncio.to_thread(self.store.update, job["id"], parts_done=len(finished),
+                                    parts_total=total_parts)
+
+        result = await extract_report_async(
+            Path(job["pdf_path"]), job["file_name"], extractor,
+            pages_per_part=settings["pages_per_part"],
+            prefilter=prefilter,
+            rate_limiter=self.rate_limiter,
+            backend=settings["backend"],
+            workers=settings["text_workers"],
+            checkpoint=PartCheckpoint(checkpoint_key),
+            on_part=on_part,
+            table_extractor=table_extractor,
+            semaphore=self.semaphore,
+            telemetry=telemetry,
+            page_store=self.page_store
+        )
+        result_csv = await asyncio.to_thread(save_results, result, Path(job["file_name"]).stem, job["pdf_hash"],
+                                             telemetry=telemetry)
+
+        await asyncio.to_thread(
+            self.store.update,
+            job["id"],
+            status="partial" if result["failed_pages"] else "done",
+            finished_at=time.time(),
+            result={
+                "csv": str(result_csv) if result_csv else None,
+                "pages": result["pages"],
+                "metrics": len(result["metrics"]),
+                "resumed_parts": result["resumed_parts"],
+                "table_metrics": result["table_metrics"],
+                "duplicates_merged": result["duplicates_merged"],
+                "conflicts": result["conflicts"],
+                "failed_pages": result["failed_pages"],
+                "failures": result["failures"],
+                "requests": extractor.requests_sent,
+                "cache_hits": extractor.cache_hits,
+                "telemetry": telemetry.summary(),
+                "routing": router.summary() if router is not None else None,
+            }
+        )
+
+
+def _genai_client(api_key: str):
+    from google import genai
+
+    return genai.Client(api_key=api_key)
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .normalize import normalize_metrics
+from .schema import Category
+
+logger = logging.getLogger(__name__)
+
+# Words that describe the document rather than the company in report file names
+REPORT_WORDS = {"sustainability", "impact", "report", "esg", "annual", "summary", "performance", "lite",
+                "without", "source", "error", "test", "the", "and", "of", "csv", "pdf"}
+
+SCHEMA = pa.schema([
+    ("report", pa.string()),
+    ("metric_name", pa.string()),
+    ("value", pa.string()),
+    ("value_numeric", pa.float64()),
+    ("unit", pa.dictionary(pa.int32(), pa.string())),
+    ("canonical_value", pa.float64()),
+    ("canonical_unit", pa.dictionary(pa.int32(), pa.string())),
+    ("source", pa.string()),
+    ("company", pa.string()),
+    ("year", pa.int32()),
+    ("category", pa.dictionary(pa.int32(), pa.string())),
+])
+# Serializes report writes and the ingest index across MetricsStore
+# instances: the app's job workers and compare page share one store
+_WRITE_LOCK = threading.RLock()
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("company", pa.string()), ("year", pa.int32()), ("category", pa.string())]),
+    flavor="hive"
+)
+
+
+def company_of(report: str) -> str:
+    """Best guess of the company from a report name: 'ADM-2024-sustainability - lite' → 'adm'."""
+    for token in re.split(r"[^A-Za-z]+", Path(report).stem):
+        if len(token) > 1 and token.lower() not in REPORT_WORDS:
+            return token.lower()
+    return "unknown"
+
+
+def _slug(report: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", report.lower()).strip("-") or "report"
+
+
+def _file_key(report: str) -> str:
+    """File name prefix of a report: readable slug plus a hash of the exact name (slugs can collide)."""
+    return f"{_slug(report)}-{hashlib.sha256(report.encode('utf-8')).hexdigest()[:8]}"
+
+
+def to_store_frame(frame: pd.DataFrame, report: str, company: Optional[str] = None) -> pd.DataFrame:
+    """Type a results frame (RESULT_COLUMNS, or the legacy metric/value/category CSVs) for the store."""
+    frame = frame.rename(columns={"metric": "metric_name"})
+    out = pd.DataFrame(index=frame.index)
+    out["report"] = report
+    out["metric_name"] = frame.get("metric_name", pd.Series(index=frame.index, dtype="object")).astype("string")
+    out["value"] = frame.get("value", pd.Series(index=frame.index, dtype="object")).astype("string")
+    out["unit"] = frame.get("unit", pd.Series(index=frame.index, dtype="object")).astype("string")
+    normalized = normalize_metrics(out[["value", "unit"]])
+    out["value_numeric"] = normalized["value_numeric"]
+    out["canonical_value"] = normalized["canonical_value"]
+    out["canonical_unit"] = normalized["canonical_unit"]
+    out["source"] = frame.get("source", pd.Series(index=frame.index, dtype="object")).astype("string")
+    out["company"] = company or company_of(report)
+    year = frame.get("year", pd.Series(index=frame.index, dtype="object")).astype("string")
+    out["year"] = pd.to_numeric(year.str.extract(r"((?:19|20)\d{2})", expand=False), errors="coerce").astype("Int32")
+    category = frame.get("category", pd.Series(index=frame.index, dtype="object")).astype("string").str.strip()
+    # Case variants of the pipeline's categories share one partition
+    canonical = category.str.lower().map({c.value.lower(): c.value for c in Category})
+    out["category"] = canonical.fillna(category).fillna("Unknown")
+    return out
+
+
+class MetricsStore:
+    """
+    Parquet dataset of extracted metrics, hive-partitioned by company, year
+    and category (`company=adm/year=2024/category=Environmental/...`).
+
+    Each report is written as its own files, so re-extracting a report
+    replaces just that report. `query` pushes category/company/year filters
+    down to partition pruning and report filters to Parquet row-group
+    statistics, and only reads the requested columns.
+    """
+
+    def __init__(self, root: str = "data/metrics_store"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "_ingested.json"
+
+    def _dataset(self) -> ds.Dataset:
+        return ds.dataset(self.root, schema=SCHEMA, format="parquet", partitioning=PARTITIONING,
+                          exclude_invalid_files=True, ignore_prefixes=["_", "."])
+
+    def delete_report(self, report: str) -> None:
+        # Files of other reports can share the slug prefix: check the report column
+        for path in self.root.rglob(f"{_slug(report)}-*.parquet"):
+            if report in pq.read_table(path, columns=["report"]).column("report").unique().to_pylist():
+                path.unlink()
+
+    def _load_index(self) -> dict:
+        return json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+
+    def _save_index(self, ingested: dict) -> None:
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(ingested, indent=2))
+        os.replace(tmp_path, self.index_path)
+
+    def write_report(self, report: str, frame: pd.DataFrame, company: Optional[str] = None,
+                     source_csv: Optional[Path] = None) -> int:
+        """
+        Replace the stored metrics of `report` with `frame`; returns the row
+        count. `source_csv` marks the CSV export written alongside as already
+        ingested.
+        """
+        with _WRITE_LOCK:
+            self.delete_report(report)
+            store_frame = to_store_frame(frame, report, company)
+            if not store_frame.empty:
+                table = pa.Table.from_pandas(store_frame, schema=SCHEMA, preserve_index=False)
+                ds.write_dataset(
+                    table, self.root, format="parquet", partitioning=PARTITIONING,
+                    basename_template=f"{_file_key(report)}-part-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore"
+                )
+            if source_csv is not None:
+                ingested = self._load_index()
+                ingested[Path(source_csv).name] = Path(source_csv).stat().st_mtime
+                self._save_index(ingested)
+        return len(store_frame)
+
+    def query(self, columns: Optional[List[str]] = None, category: Optional[str] = None,
+              reports: Optional[Iterable[str]] = None, companies: Optional[Iterable[str]] = None,
+              years: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Scan the dataset with column and predicate pushdown; returns a DataFrame."""
+        conditions = []
+        if category is not None:
+            conditions.append(ds.field("category") == category)
+        if reports is not None:
+            conditions.append(ds.field("report").isin(list(reports)))
+        if companies is not None:
+            conditions.append(ds.field("company").isin([c.lower() for c in companies]))
+        if years is not None:
+            conditions.append(ds.field("year").isin([int(y) for y in years]))
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        frame = self._dataset().to_table(columns=columns, filter=expression).to_pandas()
+        if "year" in frame.columns:
+            frame["year"] = frame["year"].astype("Int32")
+        return frame
+
+    def reports(self) -> List[str]:
+        """Names of all stored reports."""
+        table = self._dataset().to_table(columns=["report"])
+        return sorted(table.column("report").unique().to_pylist())
+
+    def ingest_csvs(self, results_dir: str = "data/extracted_results") -> List[str]:
+        """
+        Load per-report CSVs (including the legacy metric/value/category
+        layout) that are new or changed since the last ingest; returns the
+        ingested report names.
+        """
+        with _WRITE_LOCK:
+            ingested = self._load_index()
+            updated = []
+            for path in sorted(Path(results_dir).glob("*.csv")):
+                mtime = path.stat().st_mtime
+                if ingested.get(path.name) == mtime:
+                    continue
+                try:
+                    frame = pd.read_csv(path)
+                except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+                    logger.warning("Could not ingest %s: %s", path.name, e)
+                    continue
+                self.write_report(path.stem, frame)
+                ingested[path.name] = mtime
+                updated.append(path.stem)
+
+            if updated:
+                self._save_index(ingested)
+        return updated
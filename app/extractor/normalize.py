@@ -0,0 +1,170 @@
+import re
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SCALE_WORDS = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "trillion": 1e12,
+}
+
+# A value that is a number, optionally qualified, with a scale word, percent
+# sign and at most two trailing words ("approximately 66%", "$3.4 million",
+# "1,234 tonnes", "(12.5)", "1.234,5 MWh"). Anything else ("in place since
+# 2018") is text. A bare "m" is a unit (metres), not a scale: "100 m" is 100.
+VALUE_PATTERN = re.compile(
+    r"^\s*(?:approximately|approx\.?|about|around|over|more than|nearly|almost|up to|~|<|>|≈)?\s*"
+    r"(?P<open>\()?\s*(?P<sign>[-−–+])?\s*(?:[$€£]|usd)?\s*"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d{1,3}(?:\.\d{3})+,\d+|\d+,\d+|\d+(?:\.\d+)?|\.\d+)\s*\)?\s*"
+    r"(?P<scale>thousand|million|billion|trillion|mn|bn|k|b)?\.?\s*"
+    r"(?P<percent>%|percent)?"
+    r"(?:\s+[^\s\d]+){0,2}\s*$",
+    re.IGNORECASE
+)
+
+# Unit conversion table: (pattern on the cleaned unit, canonical unit, factor to canonical).
+# Checked in order; the first match wins, so specific prefixes come before bare ones.
+GHG_MASS = [
+    (r"\b(?:mmt|mmtco2e?|megatonnes?|mt co2e? million)\b", 1e6),
+    (r"\b(?:kt|ktco2e?|kilotonnes?|kilotons?)\b", 1e3),
+    (r"\b(?:kg|kgco2e?|kilograms?)\b", 1e-3),
+    (r"\b(?:lbs?|pounds?)\b", 0.000453592),
+    (r"\b(?:g|gco2e?|grams?)\b", 1e-6),
+    (r"\b(?:t|mt|mtco2e?|tco2e?|tonnes?|tons?|metric tons?|metric tonnes?)\b", 1.0),
+]
+CONVERSIONS = [
+    (r"^%|\bpercent(?:age)?\b|%", "%", 1.0),
+    (r"\bmwh\b", "MWh", 1.0),
+    (r"\bkwh\b", "MWh", 1e-3),
+    (r"\bgwh\b", "MWh", 1e3),
+    (r"\btwh\b", "MWh", 1e6),
+    (r"\bgj\b|gigajoules?", "MWh", 1 / 3.6),
+    (r"\btj\b|terajoules?", "MWh", 1e3 / 3.6),
+    (r"\bpj\b|petajoules?", "MWh", 1e6 / 3.6),
+    (r"\bmj\b|megajoules?", "MWh", 1 / 3600),
+    (r"\bmmbtu\b", "MWh", 0.293071),
+    (r"\bm3\b|cubic met(?:er|re)s?", "m3", 1.0),
+    (r"\bml\b|megalit(?:er|re)s?", "m3", 1e3),
+    (r"\bkilolit(?:er|re)s?|\bkl\b", "m3", 1.0),
+    (r"\blit(?:er|re)s?\b|\bl\b", "m3", 1e-3),
+    (r"\bgallons?\b|\bgal\b", "m3", 0.00378541),
+    (r"\busd\b|\$|dollars?", "USD", 1.0),
+    (r"\b(?:mmt|megatonnes?)\b", "t", 1e6),
+    (r"\b(?:kt|kilotonnes?|kilotons?)\b", "t", 1e3),
+    (r"\b(?:t|mt|tonnes?|tons?|metric tons?|metric tonnes?)\b", "t", 1.0),
+    (r"\b(?:kg|kilograms?)\b", "t", 1e-3),
+    (r"\b(?:lbs?|pounds?)\b", "t", 0.000453592),
+]
+
+
+def _clean_unit(unit: str) -> str:
+    # "Mt" is a megatonne; "MT" and "mt" are metric tons, so this is decided before lowercasing
+    text = re.sub(r"\bMt(?=\b|CO)", "megatonnes ", str(unit))
+    text = text.lower().replace("₂", "2").replace("³", "3")
+    # CO₂e loses its subscript in extraction: "mtCOe", "CO -e", "CO2-e" → "co2e"
+    text = re.sub(r"co\s*2?\s*-?\s*e\b", " co2e ", text)
+    text = re.sub(r"co\s*2\b", " co2 ", text)
+    text = re.sub(r"[()\[\],;]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def unit_factor(unit) -> Tuple[Optional[str], float]:
+    """Canonical unit and conversion factor of one unit string, e.g. 'million metric tons of CO2e' → ('tCO2e', 1e6)."""
+    if unit is None or (isinstance(unit, float) and np.isnan(unit)):
+        return None, np.nan
+    text = _clean_unit(unit)
+    if "%" not in text and re.search(r"\bper\b|/", text):
+        return None, np.nan  # intensities ("kg CO2e per kg fish") have no canonical base
+    scale = 1.0
+    for word in ("thousand", "million", "billion"):
+        if re.search(rf"\b{word}\b", text):
+            scale *= SCALE_WORDS[word]
+            text = re.sub(rf"\b{word}\b", " ", text).strip()
+
+    if "co2" in text or "ghg" in text:
+        # Split glued forms like "mtco2e" so the mass unit can be matched
+        mass_text = re.sub(r"(\w+?)co2e?\b", r"\1 co2e", text)
+        for pattern, factor in GHG_MASS:
+            if re.search(pattern, mass_text):
+                return "tCO2e", scale * factor
+        return None, np.nan
+    for pattern, canonical, factor in CONVERSIONS:
+        if re.search(pattern, text):
+            return canonical, scale * factor
+    return None, np.nan
+
+
+def _to_number(text: pd.Series) -> pd.Series:
+    """
+    Numbers in either separator convention. A comma followed by exactly three
+    digits groups thousands ("1,234", "1,234.5"); any other comma is the
+    decimal mark ("12,5", "1.234,5"), and dots before it group thousands.
+    """
+    text = text.str.strip()
+    decimal_comma = text.str.contains(r",(?:\d{1,2}|\d{4,})$", regex=True).fillna(False).astype(bool)
+    grouped = text.str.replace(",", "", regex=False)
+    european = text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(grouped.where(~decimal_comma, european), errors="coerce").astype("float64")
+
+
+def parse_values(values: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized parse of free-text values into numbers.
+
+    Returns a frame with `value_numeric` (scale words applied, NaN when the
+    value is not a number) and `is_percent`, aligned with `values`.
+    """
+    text = values.astype("string")
+    # Fast path: plain numbers ("1,234", "0.27") need no regex
+    plain = _to_number(text)
+    value_numeric = plain.to_numpy(copy=True)
+    is_percent = np.zeros(len(text), dtype=bool)
+
+    rest = (plain.isna() & text.notna()).to_numpy()
+    if rest.any():
+        # Parse each distinct remaining string once ("100%" repeats a lot)
+        codes, uniques = pd.factorize(text[rest])
+        parts = pd.Series(uniques, dtype="string").str.replace("\u00a0", " ", regex=False).str.extract(VALUE_PATTERN)
+        number = _to_number(parts["number"])
+        negative = (parts["sign"].isin(["-", "−", "–"]) | parts["open"].eq("(")).fillna(False).to_numpy(dtype=bool)
+        scale = parts["scale"].str.lower().map(SCALE_WORDS).astype("float64").fillna(1.0).to_numpy()
+        parsed = np.where(negative, -number.to_numpy(), number.to_numpy()) * scale
+        value_numeric[rest] = parsed[codes]
+        is_percent[rest] = parts["percent"].notna().to_numpy(dtype=bool)[codes]
+
+    return pd.DataFrame({"value_numeric": value_numeric, "is_percent": is_percent}, index=values.index)
+
+
+def normalize_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add numeric columns to a metrics frame with `value` and `unit` columns.
+
+    - `value_numeric`: the parsed value ("3.4 million" → 3400000.0)
+    - `canonical_unit`: tCO2e, MWh, m3, %, t or USD when the unit is known
+    - `canonical_value`: `value_numeric` converted to `canonical_unit`
+
+    Units are resolved once per distinct unit string and broadcast, so the
+    cost is dominated by the vectorized value parse.
+    """
+    out = frame.copy()
+    parsed = parse_values(out["value"]) if "value" in out else pd.DataFrame(
+        {"value_numeric": np.nan, "is_percent": False}, index=out.index)
+
+    units = out["unit"] if "unit" in out else pd.Series(pd.NA, index=out.index, dtype="object")
+    codes, uniques = pd.factorize(units.astype("string"), use_na_sentinel=True)
+    resolved = [unit_factor(unit) for unit in uniques]
+    canonical = np.array([unit for unit, _ in resolved] + [None], dtype=object)[codes]
+    factor = np.array([f for _, f in resolved] + [np.nan], dtype="float64")[codes]
+
+    # "12.5%" with no (or a percent) unit is a percentage
+    percent = parsed["is_percent"].to_numpy() & ((codes == -1) | (canonical == "%") | (canonical == None))  # noqa: E711
+    canonical = np.where(percent, "%", canonical)
+    factor = np.where(percent, 1.0, factor)
+
+    out["value_numeric"] = parsed["value_numeric"]
+    out["canonical_unit"] = pd.Categorical(canonical)
+    out["canonical_value"] = parsed["value_numeric"].to_numpy() * factor
+    return out
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class PageCache:
+    """
+    Content-addressed cache of extracted metrics, one entry per page.
+
+    Entries are keyed by a hash of (page text, prompt template, model name),
+    so renamed or partly changed reports only pay for pages never seen before,
+    and changing the prompt or model invalidates old results automatically.
+    Stored in SQLite and trimmed least-recently-used first once the payloads
+    exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str = "data/cache/page_cache.sqlite", max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages (last_access)")
+
+    @staticmethod
+    def make_key(text: str, prompt_template: str, model: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, prompt_template, text or ""):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Return the cached metrics for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, metrics: List[Dict]) -> None:
+        """Store page metrics (without `source_page`, which depends on the report)."""
+        payload = json.dumps([
+            {k: v for k, v in m.items() if k != "source_page"} for m in metrics
+        ])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM pages ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM pages WHERE key = ?", stale)
+
+    def close(self) -> None:
+        self._conn.close()
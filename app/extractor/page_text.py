@@ -0,0 +1,223 @@
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+from .text_store import PageTextStore, content_hash
+
+logger = logging.getLogger(__name__)
+
+PdfSource = Union[str, Path, bytes, BinaryIO]
+
+
+# ------------------------------------------------------------
+# Backends: (open, count, pages). `open` opens a path or binary buffer
+# once; `count` is the page count of the open document and `pages` yields
+# the text of pages [start, stop) of it.
+# ------------------------------------------------------------
+def _open_pypdf2(source):
+    from PyPDF2 import PdfReader
+
+    return PdfReader(source)
+
+
+def _pypdf2_pages(reader, start: int, stop: int) -> Iterator[str]:
+    for index in range(start, stop):
+        yield reader.pages[index].extract_text() or ""
+
+
+def _open_pdfplumber(source):
+    import pdfplumber
+
+    return pdfplumber.open(source)
+
+
+def _pdfplumber_pages(pdf, start: int, stop: int) -> Iterator[str]:
+    for page in pdf.pages[start:stop]:
+        yield page.extract_text() or ""
+        page.flush_cache()  # drop parsed layout objects once the text is out
+
+
+def _open_pymupdf(source):
+    import fitz  # PyMuPDF
+
+    if isinstance(source, io.BytesIO):
+        return fitz.open(stream=source.getvalue(), filetype="pdf")
+    return fitz.open(source)
+
+
+def _pymupdf_pages(doc, start: int, stop: int) -> Iterator[str]:
+    for index in range(start, stop):
+        yield doc[index].get_text("text")
+
+
+def _markdown_pages(doc, start: int, stop: int) -> Iterator[str]:
+    import pymupdf4llm
+
+    for index in range(start, stop):
+        try:
+            # Layout-aware markdown of one page (tables as pipe tables)
+            yield pymupdf4llm.to_markdown(doc, pages=[index], page_chunks=True, show_progress=False)[0]["text"]
+        except Exception as e:
+            logger.warning("pymupdf4llm failed on page %d, using fallback text extraction: %s", index + 1, e)
+            yield doc[index].get_text("text")
+
+
+def _count_pages(doc) -> int:
+    return len(doc.pages)
+
+
+BACKENDS = {
+    "pypdf2": (_open_pypdf2, _count_pages, _pypdf2_pages),
+    "pdfplumber": (_open_pdfplumber, _count_pages, _pdfplumber_pages),
+    "pymupdf": (_open_pymupdf, len, _pymupdf_pages),
+    "markdown": (_open_pymupdf, len, _markdown_pages),
+}
+
+
+def _close(doc) -> None:
+    close = getattr(doc, "close", None)
+    if close is not None:
+        close()
+
+
+def _resolve(source: PdfSource):
+    """Normalize a source to a path string or raw bytes (both picklable)."""
+    if hasattr(source, "read"):
+        return source.read()
+    if isinstance(source, bytes):
+        return source
+    return str(source)
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+# Process-pool worker state: the backend and the document it opened
+_worker_backend: Optional[str] = None
+_worker_doc = None
+
+
+def _init_worker(path: str, backend: str) -> None:
+    """Process-pool initializer: each worker opens the PDF once."""
+    global _worker_backend, _worker_doc
+    _worker_backend = backend
+    _worker_doc = BACKENDS[backend][0](path)
+
+
+def _worker_page_count() -> int:
+    return BACKENDS[_worker_backend][1](_worker_doc)
+
+
+def _extract_range(start: int, stop: int) -> List[str]:
+    """Process-pool task: extract one window of pages from the worker's open document."""
+    return list(BACKENDS[_worker_backend][2](_worker_doc, start, stop))
+
+
+def _window(texts: List[str], start: int) -> List[Dict]:
+    return [
+        {"page_number": start + offset + 1, "text": text}
+        for offset, text in enumerate(texts)
+    ]
+
+
+def iter_page_texts(source: PdfSource, backend: str = "pdfplumber", workers: int = 1,
+                    pages_per_window: int = 5, store: Optional[PageTextStore] = None) -> Iterator[List[Dict]]:
+    """
+    Yield page-numbered text in windows of `pages_per_window` pages.
+
+    `backend` selects the PDF library (see `BACKENDS`). With `workers > 1`
+    windows are extracted in a process pool and yielded in page order; at
+    most two windows per worker are in flight, so memory stays bounded.
+    Each window is a list of {"page_number": int, "text": str} with absolute
+    1-based page numbers.
+
+    With a `store`, a document whose text was extracted before (by content
+    hash and backend) is read from it without opening the PDF; otherwise
+    each window is appended to the store as it is yielded and the document
+    becomes visible there once every page has been read.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    source = _resolve(source)
+    if store is None:
+        yield from _extract_windows(source, backend, workers, pages_per_window)
+        return
+
+    pdf_hash = content_hash(source)
+    pages = store.get(pdf_hash, backend)
+    if pages is not None:
+        try:
+            for start in range(0, len(pages), pages_per_window):
+                yield _window([pages[index] for index in range(start, min(start + pages_per_window, len(pages)))],
+                              start)
+        finally:
+            pages.close()
+        return
+
+    # Pages go to disk window by window; the kind is committed after the last one
+    with store.writer(pdf_hash, backend) as writer:
+        for window in _extract_windows(source, backend, workers, pages_per_window):
+            for chunk in window:
+                writer.append(chunk["text"])
+            yield window
+
+
+def _extract_windows(source, backend: str, workers: int, pages_per_window: int) -> Iterator[List[Dict]]:
+    if workers <= 1:
+        # Single open of the document, pages read lazily
+        opener, count, pages = BACKENDS[backend]
+        doc = opener(_open(source))
+        try:
+            total = count(doc)
+            window, start = [], 0
+            for text in pages(doc, 0, total):
+                window.append(text)
+                if len(window) == pages_per_window:
+                    yield _window(window, start)
+                    start += len(window)
+                    window = []
+            if window:
+                yield _window(window, start)
+        finally:
+            _close(doc)
+        return
+
+    # Workers get a path, never the PDF bytes: an upload is spilled to a
+    # temporary file once instead of being pickled into every task
+    with tempfile.TemporaryDirectory() if isinstance(source, bytes) else nullcontext() as spill_dir:
+        path = source
+        if spill_dir is not None:
+            path = os.path.join(spill_dir, "source.pdf")
+            with open(path, "wb") as f:
+                f.write(source)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path, backend)) as pool:
+            # The page count comes from a worker's open document, so this
+            # process never parses the PDF
+            total = pool.submit(_worker_page_count).result()
+            starts = list(range(0, total, pages_per_window))
+            pending = []
+            next_index = 0
+            for start in starts:
+                while next_index < len(starts) and len(pending) < workers * 2:
+                    window_start = starts[next_index]
+                    window_stop = min(window_start + pages_per_window, total)
+                    pending.append(pool.submit(_extract_range, window_start, window_stop))
+                    next_index += 1
+                yield _window(pending.pop(0).result(), start)
+
+
+def page_markdown(source: PdfSource, store: Optional[PageTextStore] = None, workers: int = 1) -> List[str]:
+    """
+    Layout-aware markdown of every page (pymupdf4llm), one string per page.
+
+    Pages are converted by `workers` processes in parallel; with a `store`
+    the layout analysis runs once per PDF.
+    """
+    return [chunk["text"] for window in iter_page_texts(source, backend="markdown", workers=workers, store=store)
+            for chunk in window]
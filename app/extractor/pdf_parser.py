@@ -1,29 +1,75 @@
-from typing import List, Dict
+from bisect import bisect_right
+from typing import List, Dict, Iterator, Optional
 from PyPDF2 import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from .page_text import iter_page_texts
+from .text_store import PageTextStore
+
 class PDFParser:
-    def __init__(self, chunk_size: int = 4000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 4000, chunk_overlap: int = 200,
+                 store: Optional[PageTextStore] = None):
+        # Page text is read from `store` when this PDF was parsed before
+        self.store = store
+        self.chunk_size = chunk_size
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=len
+            length_function=len,
+            add_start_index=True
         )
-    
-    def extract_text(self, file_path: str) -> List[str]:
-        """Extract text from PDF and split into chunks."""
+
+    def iter_chunks(self, file_path: str) -> Iterator[Dict]:
+        """
+        Lazily yield text chunks with the pages they came from.
+
+        Pages are read one window at a time and only the text not yet
+        emitted (a few chunks' worth) is held, so memory stays flat however
+        long the report is. Overlap carries across page boundaries. Each
+        chunk is {"text", "page_start", "page_end", "page_number"}, where
+        `page_number` is `page_start` so chunks can go straight to
+        `MetricsExtractor.extract_metrics`.
+        """
+        buffer = ""
+        # Buffer offset at which each buffered page starts, and its page number
+        offsets: List[int] = []
+        pages: List[int] = []
+
+        def chunk(document) -> Dict:
+            start = document.metadata["start_index"]
+            end = start + len(document.page_content) - 1
+            first = pages[max(bisect_right(offsets, start) - 1, 0)]
+            last = pages[max(bisect_right(offsets, end) - 1, 0)]
+            return {"text": document.page_content, "page_start": first, "page_end": last, "page_number": first}
+
         try:
-            with open(file_path, 'rb') as file:
-                pdf = PdfReader(file)
-                text = ''
-                for page in pdf.pages:
-                    text += page.extract_text()
-                
-                # Split text into chunks
-                chunks = self.text_splitter.split_text(text)
-                return chunks
+            for window in iter_page_texts(file_path, backend="pypdf2", store=self.store):
+                for page in window:
+                    offsets.append(len(buffer))
+                    pages.append(page["page_number"])
+                    buffer += page["text"] + "\n"
+                if len(buffer) < 2 * self.chunk_size:
+                    continue
+                documents = self.text_splitter.create_documents([buffer])
+                if len(documents) < 2:
+                    continue
+                # The last chunk may continue on the next page: keep it (it
+                # already includes the overlap with the chunk before it)
+                for document in documents[:-1]:
+                    yield chunk(document)
+                keep = documents[-1].metadata["start_index"]
+                first_kept = max(bisect_right(offsets, keep) - 1, 0)
+                buffer = buffer[keep:]
+                offsets = [max(offset - keep, 0) for offset in offsets[first_kept:]]
+                pages = pages[first_kept:]
+            for document in self.text_splitter.create_documents([buffer]):
+                yield chunk(document)
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
+
+    def extract_text(self, file_path: str) -> List[str]:
+        """Extract text from PDF and split into chunks."""
+        return [chunk["text"] for chunk in self.iter_chunks(file_path)]
     
     def get_document_info(self, file_path: str) -> Dict:
         """Get basic information about the PDF document."""
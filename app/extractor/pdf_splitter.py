@@ -1,5 +1,9 @@
 from PyPDF2 import PdfReader, PdfWriter
 from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+from .page_text import iter_page_texts
+from .text_store import PageTextStore
 
 def split_pdf(input_path, output_dir, pages_per_part=5):
     reader = PdfReader(input_path)
@@ -20,3 +24,19 @@ def split_pdf(input_path, output_dir, pages_per_part=5):
         part_files.append(part_path)
 
     return part_files
+
+
+def iter_page_windows(source: Union[str, Path, BinaryIO], pages_per_window: int = 5,
+                      backend: str = "pdfplumber", workers: int = 1,
+                      store: Optional[PageTextStore] = None) -> Iterator[List[Dict]]:
+    """
+    Stream page-numbered text from a PDF in windows of `pages_per_window` pages.
+
+    The PDF (a path or a binary file object such as an upload buffer) is read
+    without writing part files, so concurrent runs cannot clobber each other.
+    Each window is a list of {"page_number": int, "text": str} with absolute
+    1-based page numbers. See `iter_page_texts` for `backend`, `workers` and
+    the page-text `store`.
+    """
+    return iter_page_texts(source, backend=backend, workers=workers, pages_per_window=pages_per_window,
+                           store=store)
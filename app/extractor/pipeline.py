@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .checkpoint import PartCheckpoint
+from .dedupe import dedupe_metrics
+from .gemini_extractor import MetricsExtractor
+from .metrics_store import MetricsStore
+from .pdf_splitter import iter_page_windows
+from .prefilter import RelevancePrefilter
+from .rate_limiter import RateLimiter
+from .tables import TableExtractor
+from .telemetry import RunTelemetry
+from .text_store import PageTextStore, content_hash
+
+RESULT_COLUMNS = ["metric_name", "value", "unit", "year", "category", "source"]
+CATEGORIES = ["Environmental", "Social", "Governance"]
+
+
+def read_pages(source, pages_per_part: int = 5, backend: str = "pdfplumber", workers: int = 1,
+               store: Optional[PageTextStore] = None) -> List[Dict]:
+    """Read every page of a PDF into page-numbered text chunks (from `store` when it has them)."""
+    text_chunks = []
+    for window in iter_page_windows(source, pages_per_window=pages_per_part, backend=backend, workers=workers,
+                                    store=store):
+        text_chunks.extend(window)
+    return text_chunks
+
+
+def read_tables(source, table_extractor: TableExtractor, pages: List[int], total_pages: int,
+                store: Optional[PageTextStore] = None) -> Dict[int, Dict]:
+    """
+    `table_extractor.extract` for `pages`. With a `store`, the tables of
+    every page are parsed once per document and settings, kept as JSON per
+    page, and later runs read them from the store.
+    """
+    if store is None:
+        return table_extractor.extract(source, pages)
+    kind = f"tables-{table_extractor.fingerprint}"
+    pdf_hash = content_hash(source)
+    stored = store.texts(pdf_hash, kind)
+    if stored is None:
+        found = table_extractor.extract(source)
+        stored = [json.dumps(found[number]) if number in found else "" for number in range(1, total_pages + 1)]
+        store.put(pdf_hash, kind, stored)
+    wanted = set(pages)
+    return {number: json.loads(text) for number, text in enumerate(stored, start=1) if text and number in wanted}
+
+
+def _first_page(metric: Dict) -> int:
+    """Sort key for metrics whose `source_page` is a number or a range like "3-5"."""
+    page = str(metric.get("source_page", "")).split("-")[0].strip()
+    return int(page) if page.isdigit() else 0
+
+
+def add_source_info(metrics: List[Dict], file_name: str) -> List[Dict]:
+    """Add the `source` column and fold unknown categories into Environmental."""
+    for m in metrics:
+        pages = m.get("source_pages") or [m.get("source_page", "unknown")]
+        m["source"] = f"{file_name} - {'page' if len(pages) == 1 else 'pages'} {', '.join(map(str, pages))}"
+        category = m.get("category", "").capitalize()
+        if category not in CATEGORIES:
+            m["category"] = "Environmental"
+    return metrics
+
+
+def to_results_frame(metrics: List[Dict]) -> pd.DataFrame:
+    """Build the result table in the CSV schema used by the compare page."""
+    return pd.DataFrame(metrics).reindex(columns=RESULT_COLUMNS)
+
+
+def prefilter_report(decisions: List[Dict], metrics: List[Dict]) -> pd.DataFrame:
+    """Prefilter decisions with the number of metrics each page produced."""
+    report = pd.DataFrame(decisions)
+    if not report.empty:
+        pages = [page for m in metrics for page in m.get("source_pages") or [m.get("source_page")]]
+        found = pd.Series(pages, dtype="object").value_counts()
+        report["metrics_found"] = report["page_number"].map(found).fillna(0).astype(int)
+    return report
+
+
+def report_key(pdf_hash: str, extractor: MetricsExtractor, prefilter: Optional[RelevancePrefilter] = None,
+               table_extractor: Optional[TableExtractor] = None, backend: str = "pdfplumber") -> str:
+    """Checkpoint key: the report content plus the settings that change its results (text backend included)."""
+    settings = json.dumps([extractor.model_key, extractor.prompt_fingerprint,
+                           prefilter.threshold if prefilter else None, backend])
+    if table_extractor is not None:
+        settings += table_extractor.fingerprint
+    return f"{pdf_hash[:32]}-{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:8]}"
+
+
+async def extract_report_async(source, file_name: str, extractor: MetricsExtractor,
+                               pages_per_part: int = 5,
+                               prefilter: Optional[RelevancePrefilter] = None,
+                               max_concurrency: int = 4,
+                               rate_limiter: Optional[RateLimiter] = None,
+                               backend: str = "pdfplumber",
+                               workers: int = 1,
+                               checkpoint: Optional[PartCheckpoint] = None,
+                               on_part: Optional[Callable[[int, int, Dict], None]] = None,
+                               table_extractor: Optional[TableExtractor] = None,
+                               semaphore: Optional[asyncio.Semaphore] = None,
+                               telemetry: Optional[RunTelemetry] = None,
+                               page_store: Optional[PageTextStore] = None) -> Dict:
+    """
+    Run the read → tables → prefilter → extract pipeline for one report, part by part.
+
+    With a `table_extractor`, KPI tables that parse confidently become metric
+    rows locally and only the rest of their page's text goes on to the
+    prefilter and Gemini. A shared `semaphore` caps Gemini requests across
+    concurrent reports (instead of `max_concurrency` per report). With
+    `telemetry`, the text, split, tables and prefilter stages are timed
+    (pass the same object to the extractor for request and parse timings).
+    With a `page_store`, page text and parsed tables are read from it when
+    this PDF was processed before, so a rerun with other settings starts at
+    the LLM stage.
+
+    Parts already finished in `checkpoint` are reused without any request;
+    every other part is written to it as soon as it completes.
+    `on_part(index, total_parts, record)` (a function or coroutine
+    function) is called for each resumed part up front and for every other
+    part as it completes, for progress reporting.
+
+    Returns a dict with the normalized `metrics`, the number of `pages` and
+    `parts`, how many parts were `resumed_parts`, the prefilter `decisions`
+    the `failed_pages` (with the errors of this run's failed requests in
+    `failures`), the number of `table_metrics` parsed locally and the model
+    `routing` decisions of this run (empty without a router). Repeated
+    extractions of a KPI are merged (`dedupe_metrics`); `duplicates_merged`
+    and `conflicts` count the merged copies and the conflicting values.
+    """
+    def stage(name: str):
+        return telemetry.stage(name) if telemetry is not None else nullcontext()
+
+    if hasattr(source, "read"):
+        source = source.read()  # read once; both the text and the table stage open it
+    with stage("text"):
+        text_chunks = await asyncio.to_thread(read_pages, source, pages_per_part, backend, workers, page_store)
+    if telemetry is not None:
+        telemetry.pages = len(text_chunks)
+    with stage("split"):
+        parts = [text_chunks[i:i + pages_per_part] for i in range(0, len(text_chunks), pages_per_part)]
+        done = await asyncio.to_thread(checkpoint.completed) if checkpoint is not None else {}
+        pending = [index for index, part in enumerate(parts)
+                   if (part[0]["page_number"], part[-1]["page_number"]) not in done]
+    tables: Dict[int, Dict] = {}
+    if table_extractor is not None and pending:
+        pending_pages = [chunk["page_number"] for index in pending for chunk in parts[index]]
+        with stage("tables"):
+            tables = await asyncio.to_thread(read_tables, source, table_extractor, pending_pages,
+                                             len(text_chunks), page_store)
+
+    records: List[Optional[Dict]] = [None] * len(parts)
+    todo, todo_chunks, todo_decisions, todo_tables = [], [], [], []
+    for index, part in enumerate(parts):
+        pages = (part[0]["page_number"], part[-1]["page_number"])
+        if pages in done:
+            records[index] = done[pages]
+            continue
+        table_metrics = [m for chunk in part for m in tables.get(chunk["page_number"], {}).get("metrics", [])]
+        # Pages whose text was all table need no request at all
+        part = [
+            {**chunk, "text": tables[chunk["page_number"]]["text"]} if chunk["page_number"] in tables else chunk
+            for chunk in part
+            if chunk["page_number"] not in tables or tables[chunk["page_number"]]["text"].strip()
+        ]
+        relevant, decisions = part, []
+        if prefilter is not None:
+            with stage("prefilter"):
+                relevant, decisions = prefilter.split(part)
+        todo.append(index)
+        todo_chunks.append(relevant)
+        todo_decisions.append(decisions)
+        todo_tables.append(table_metrics)
+
+    async def report_part(index: int, record: Dict) -> None:
+        if on_part is not None:
+            done = on_part(index, len(parts), record)
+            if inspect.isawaitable(done):
+                await done
+
+    async def finish_part(todo_index: int, metrics: List[Dict], failed_pages: List) -> None:
+        index = todo[todo_index]
+        metrics = sorted(todo_tables[todo_index] + metrics, key=_first_page)
+        pages = (parts[index][0]["page_number"], parts[index][-1]["page_number"])
+        record = {
+            "pages": list(pages),
+            "status": "failed" if failed_pages else "ok",
+            "metrics": metrics,
+            "failed_pages": failed_pages,
+            "decisions": todo_decisions[todo_index],
+        }
+        records[index] = record
+        if checkpoint is not None:
+            with stage("write"):
+                # fsynced write: off the loop, so other parts and jobs keep going
+                await asyncio.to_thread(checkpoint.record, pages, metrics, failed_pages,
+                                        todo_decisions[todo_index])
+        await report_part(index, record)
+
+    for index, record in enumerate(records):
+        if record is not None:
+            await report_part(index, record)  # resumed parts show up immediately
+
+    await extractor.extract_parts_async(
+        todo_chunks,
+        max_concurrency=max_concurrency,
+        rate_limiter=rate_limiter,
+        on_part=finish_part,
+        semaphore=semaphore
+    )
+
+    metrics = [m for record in records for m in record["metrics"]]
+    with stage("dedupe"):
+        merged = dedupe_metrics(metrics)
+    return {
+        "metrics": add_source_info(merged, file_name),
+        "duplicates_merged": len(metrics) - len(merged),
+        "conflicts": sum(1 for m in merged if m.get("conflict")),
+        "pages": len(text_chunks),
+        "parts": len(parts),
+        "resumed_parts": len(parts) - len(todo),
+        "decisions": [d for record in records for d in record["decisions"]],
+        "failed_pages": [p for record in records for p in record["failed_pages"]],
+        "failures": list(extractor.failures),
+        "routing": list(extractor.router.decisions) if extractor.router is not None else [],
+        "table_metrics": sum(len(metrics) for metrics in todo_tables),
+    }
+
+
+def save_results(result: Dict, stem: str, pdf_hash: str, output_dir: str = "data/extracted_results",
+                 store: Optional[MetricsStore] = None,
+                 prefilter_dir: str = "data/prefilter_reports",
+                 telemetry: Optional[RunTelemetry] = None,
+                 routing_dir: str = "data/routing_reports",
+                 conflicts_dir: str = "data/conflict_reports") -> Optional[Path]:
+    """
+    Write the outputs of `extract_report_async`: the results CSV with its
+    `.sha256` sidecar, the metrics store entry, the prefilter report, the
+    model routing report and the rows with conflicting values (the results
+    CSV keeps its RESULT_COLUMNS schema).
+    With `telemetry`, the writes are timed and the run's telemetry report is
+    written to data/telemetry as well. Returns the CSV path, or None when no
+    metrics were found.
+    """
+    with telemetry.stage("write") if telemetry is not None else nullcontext():
+        result_csv = _write_outputs(result, stem, pdf_hash, output_dir, store, prefilter_dir, routing_dir,
+                                    conflicts_dir)
+    if telemetry is not None:
+        telemetry.write(stem, run_id=time.strftime("%Y%m%d-%H%M%S"))
+    return result_csv
+
+
+def _write_outputs(result: Dict, stem: str, pdf_hash: str, output_dir: str,
+                   store: Optional[MetricsStore], prefilter_dir: str, routing_dir: str,
+                   conflicts_dir: str) -> Optional[Path]:
+    result_csv = None
+    if result["metrics"]:
+        frame = to_results_frame(result["metrics"])
+        result_csv = Path(output_dir) / f"{stem}.csv"
+        result_csv.parent.mkdir(parents=True, exist_ok=True)
+        frame.to_csv(result_csv, index=False)
+        result_csv.with_suffix(".sha256").write_text(pdf_hash)
+        (store or MetricsStore()).write_report(stem, frame, source_csv=result_csv)
+    if result["decisions"]:
+        Path(prefilter_dir).mkdir(parents=True, exist_ok=True)
+        prefilter_report(result["decisions"], result["metrics"]).to_csv(
+            Path(prefilter_dir) / f"{stem}.csv", index=False)
+    if result.get("routing"):
+        Path(routing_dir).mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(result["routing"]).to_csv(Path(routing_dir) / f"{stem}.csv", index=False)
+    conflicts = [m for m in result["metrics"] if m.get("conflict")]
+    if conflicts:
+        Path(conflicts_dir).mkdir(parents=True, exist_ok=True)
+        to_results_frame(conflicts).to_csv(Path(conflicts_dir) / f"{stem}.csv", index=False)
+    return result_csv
@@ -0,0 +1,79 @@
+import re
+from typing import Dict, List, Tuple
+
+# Vocabulary that signals a page reports ESG figures rather than narrative
+ESG_KEYWORDS = [
+    "emission", "scope 1", "scope 2", "scope 3", "ghg", "greenhouse", "carbon", "co2",
+    "energy", "electricity", "renewable", "fuel", "water", "withdrawal", "discharge",
+    "waste", "landfill", "recycl", "packaging", "biodiversity", "deforestation",
+    "employee", "workforce", "diversity", "women", "gender", "injury", "fatalit",
+    "safety", "trir", "ltir", "training", "turnover", "community", "donation",
+    "board", "independent", "ethics", "compliance", "bribery", "supplier", "audit",
+    "target", "baseline", "reduction", "intensity", "total", "kpi", "performance",
+]
+
+UNIT_PATTERN = re.compile(
+    r"(?<![a-z])(?:[mk]?tco2e?|co2e|[kmgt]wh|[gt]j|m3|m³|megalit(?:er|re)s?|lit(?:er|re)s?|"
+    r"tonnes?|tons?|hectares?|percent|%)(?![a-z])",
+    re.IGNORECASE
+)
+NUMBER_PATTERN = re.compile(r"(?<![\w.])\d[\d,]*(?:\.\d+)?")
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+
+
+def score_page(text: str) -> Dict[str, float]:
+    """
+    Score how likely a page is to contain extractable ESG figures.
+
+    Combines numeric density, unit tokens (tCO2e, MWh, %, m3, ...), year
+    mentions and ESG keyword hits into a score between 0 and 1. Pages
+    without any figure other than years score 0.
+    """
+    text = text or ""
+    words = text.split()
+    lowered = text.lower()
+
+    years = len(YEAR_PATTERN.findall(text))
+    numbers = len(NUMBER_PATTERN.findall(text)) - years  # figures other than years
+    units = len(UNIT_PATTERN.findall(text))
+    keywords = sum(lowered.count(keyword) for keyword in ESG_KEYWORDS)
+    numeric_density = max(numbers, 0) / max(len(words), 1)
+
+    # Numbers alone (page numbers, tables of contents) are not enough: the
+    # numeric density is weighted by evidence that the figures are ESG data
+    evidence = (
+        0.45 * min(units / 2, 1.0)
+        + 0.2 * min(years, 1)
+        + 0.35 * min(keywords / 2, 1.0)
+    )
+    score = min(numeric_density / 0.03, 1.0) * evidence
+
+    return {
+        "score": round(score, 3),
+        "numeric_density": round(numeric_density, 3),
+        "units": units,
+        "years": years,
+        "keywords": keywords,
+    }
+
+
+class RelevancePrefilter:
+    """Skip pages whose relevance score is below `threshold` before the LLM stage."""
+
+    def __init__(self, threshold: float = 0.2):
+        self.threshold = threshold
+
+    def split(self, text_chunks: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Return (pages to extract, decisions). Each decision records the page
+        number, its score components and whether it was sent or skipped, so
+        the threshold can be tuned against recall.
+        """
+        kept, decisions = [], []
+        for chunk in text_chunks:
+            scores = score_page(chunk.get("text", ""))
+            decision = "extract" if scores["score"] >= self.threshold else "skip"
+            decisions.append({"page_number": chunk.get("page_number"), **scores, "decision": decision})
+            if decision == "extract":
+                kept.append(chunk)
+        return kept, decisions
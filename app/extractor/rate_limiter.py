@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.refill_rate = float(per_minute) / 60.0
+        self.updated = time.monotonic()
+
+    def resize(self, per_minute: float) -> None:
+        """Change the quota in place, keeping what is available up to the new capacity."""
+        self.refill(time.monotonic())
+        self.capacity = float(per_minute)
+        self.refill_rate = float(per_minute) / 60.0
+        self.available = min(self.available, self.capacity)
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.available = min(self.capacity, self.available + elapsed * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_rate
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for Gemini calls, configured in requests per minute
+    and (input) tokens per minute. A call only proceeds when both buckets can
+    cover it, so bursts are allowed up to the per-minute quota and then
+    throttled smoothly instead of with fixed sleeps.
+
+    Safe to share between threads and between coroutines of one event loop.
+    """
+
+    def __init__(self, requests_per_minute: float = 10, tokens_per_minute: Optional[float] = None):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def configure(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None) -> None:
+        """Change the quotas in place; callers sharing this limiter see them on their next request."""
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        with self._lock:
+            self.requests.resize(requests_per_minute)
+            if not tokens_per_minute:
+                self.tokens = None
+            elif self.tokens is None:
+                self.tokens = TokenBucket(tokens_per_minute)
+            else:
+                self.tokens.resize(tokens_per_minute)
+
+    def _reserve(self, tokens: int) -> float:
+        """Consume capacity for one request if possible, otherwise return the wait."""
+        with self._lock:
+            now = time.monotonic()
+            buckets = [(self.requests, 1)]
+            if self.tokens is not None:
+                buckets.append((self.tokens, tokens))
+            for bucket, _ in buckets:
+                bucket.refill(now)
+            wait = max(bucket.wait_time(amount) for bucket, amount in buckets)
+            if wait > 0:
+                return wait
+            for bucket, amount in buckets:
+                bucket.available -= min(amount, bucket.capacity)
+            return 0.0
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait (without blocking the event loop) until a request may be sent."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int = 0) -> None:
+        """Blocking variant of `acquire` for the synchronous extraction path."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class AdjustableSemaphore:
+    """
+    `asyncio.Semaphore` whose limit can be changed while it is in use.
+
+    Lowering the limit lets requests already inside finish; new ones wait
+    until fewer than `limit` are in flight. Use from one event loop;
+    `resize` from another thread must go through `call_soon_threadsafe`.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+
+    def resize(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.active
+        for waiter in list(self._waiters):
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def acquire(self) -> None:
+        while self.active >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._waiters.remove(waiter)
+                self._wake()  # pass on a slot this waiter may have been given
+                raise
+            self._waiters.remove(waiter)
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+from google.genai import errors
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: quota/rate limits and transient server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+
+def describe(error: BaseException) -> str:
+    """Short label for log lines: "429 RESOURCE_EXHAUSTED" rather than the full error body."""
+    if isinstance(error, errors.APIError):
+        return f"{error.code} {error.status or ''}".strip()
+    return f"{type(error).__name__}: {error}"
+
+
+def server_retry_delay(error: BaseException) -> Optional[float]:
+    """
+    Seconds the server asked us to wait: the RetryInfo `retryDelay` in the
+    error details ("12s", "0.5s"), or else the Retry-After header.
+    """
+    if not isinstance(error, errors.APIError):
+        return None
+    details = error.details.get("error", error.details) if isinstance(error.details, dict) else {}
+    for detail in details.get("details", []) if isinstance(details, dict) else []:
+        if isinstance(detail, dict) and detail.get("@type") == RETRY_INFO_TYPE:
+            match = re.fullmatch(r"\s*([\d.]+)s\s*", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    headers = getattr(error.response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after and str(retry_after).strip().replace(".", "", 1).isdigit():
+        return float(retry_after)
+    return None
+
+
+class CircuitBreaker:
+    """
+    Pause shared by every caller of the Gemini API.
+
+    A 429 opens the breaker for the server's retry delay, so all workers
+    wait out an exhausted quota together instead of each burning attempts
+    on it. `failure_threshold` consecutive server errors open it for
+    `cooldown` seconds. Safe to share between threads and coroutines.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds until calls may go out again (0 when closed)."""
+        return max(0.0, self.open_until - time.monotonic())
+
+    def open(self, seconds: float) -> None:
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self.open_until:
+                self.open_until = until
+                self.trips += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self, error: BaseException, delay: float) -> None:
+        if isinstance(error, errors.APIError) and error.code == 429:
+            self.open(delay)
+            return
+        with self._lock:
+            self.consecutive_failures += 1
+            tripped = self.consecutive_failures >= self.failure_threshold
+            if tripped:
+                self.consecutive_failures = 0
+        if tripped:
+            self.open(self.cooldown)
+
+    async def wait(self) -> None:
+        while (remaining := self.remaining()) > 0:
+            await asyncio.sleep(remaining)
+
+    def wait_sync(self) -> None:
+        while (remaining := self.remaining()) > 0:
+            time.sleep(remaining)
+
+
+class ResilientCaller:
+    """
+    Retry layer for Gemini calls.
+
+    Retryable errors (429, 5xx, timeouts and connection errors) are retried
+    up to `max_attempts` times with full-jitter exponential backoff, never
+    sooner than the server's retry hint. Every attempt first waits for the
+    shared `breaker`. Other errors, and the last failed attempt, are raised
+    to the caller, which reports the affected pages as failed.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 breaker: Optional[CircuitBreaker] = None, seed: Optional[int] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+        self._random = random.Random(seed)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Delay before retry number `attempt` (1-based)."""
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = server_retry_delay(error)
+        if hint is not None:
+            # Small spread so paused workers do not all resume in the same instant
+            delay = max(delay, hint + self._random.uniform(0, self.base_delay))
+        return delay
+
+    def _failed(self, attempt: int, error: Exception) -> Optional[float]:
+        """Record a failed attempt; returns the delay before retrying, or None to give up."""
+        if not is_retryable(error):
+            return None
+        delay = self.backoff(attempt, error)
+        self.breaker.record_failure(error, delay)
+        if attempt >= self.max_attempts:
+            return None
+        self.retries += 1
+        return delay
+
+    async def call(self, send: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.breaker.wait()
+            try:
+                result = await send()
+            except Exception as e:
+                delay = self._failed(attempt, e)
+                if delay is None:
+                    raise
+                logger.warning("Gemini call failed (%s); retry %d/%d in %.1fs", describe(e), attempt,
+                               self.max_attempts - 1, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def call_sync(self, send: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.wait_sync()
+            try:
+                result = send()
+            except Exception as e:
+                delay = self._failed(attempt, e)
+                if delay is None:
+                    raise
+                logger.warning("Gemini call failed (%s); retry %d/%d in %.1fs", describe(e), attempt,
+                               self.max_attempts - 1, delay)
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .utils import estimate_tokens
+
+# USD per million (input, output) tokens, text, paid tier list prices; used
+# for the cost estimates in routing reports only
+MODEL_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+NUMBER = re.compile(r"\d[\d,.]*%?")
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1_000_000
+
+
+def table_share(text: str) -> float:
+    """Share of non-empty lines that hold two or more numbers (table rows)."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+    return sum(1 for line in lines if len(NUMBER.findall(line)) >= 2) / len(lines)
+
+
+class ModelRouter:
+    """
+    Chooses the Gemini model per request for one report.
+
+    Pages go to the `light_model` unless they are dense (more than
+    `dense_tokens` estimated tokens) or table-heavy (at least `table_lines`
+    of their lines are number rows); those go to the `full_model`. A light
+    answer that is empty or fails validation is sent again to the full
+    model (unless both tiers use the same model). Once the report has used `token_budget` tokens or
+    `latency_budget` seconds of request time, nothing is escalated any more
+    (requests already in flight still finish, so the budget can be
+    overshot by up to one request per concurrency slot).
+
+    Every request is recorded in `decisions` with its tier, reason, tokens,
+    latency and estimated cost.
+    """
+
+    def __init__(self, light_model: str = "gemini-2.5-flash-lite", full_model: str = "gemini-2.5-flash",
+                 dense_tokens: int = 1000, table_lines: float = 0.35,
+                 token_budget: Optional[int] = None, latency_budget: Optional[float] = None):
+        self.light_model = light_model
+        self.full_model = full_model
+        self.dense_tokens = dense_tokens
+        self.table_lines = table_lines
+        self.token_budget = token_budget or None
+        self.latency_budget = latency_budget or None
+        self.decisions: List[Dict] = []
+        self.tokens_used = 0
+        self.seconds_used = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self) -> str:
+        """Settings that change the results, for cache and checkpoint keys."""
+        return f"route:{self.light_model}>{self.full_model}:{self.dense_tokens}:{self.table_lines}"
+
+    def over_budget(self) -> bool:
+        with self._lock:
+            return ((self.token_budget is not None and self.tokens_used >= self.token_budget)
+                    or (self.latency_budget is not None and self.seconds_used >= self.latency_budget))
+
+    def page_tier(self, chunk: Dict) -> Tuple[str, str]:
+        """("light" | "full", reason) for one page."""
+        text = chunk.get("text", "")
+        if estimate_tokens(text) > self.dense_tokens:
+            return "full", "dense"
+        if table_share(text) >= self.table_lines:
+            return "full", "tables"
+        return "light", "simple"
+
+    def route(self, batch: List[Dict]) -> Tuple[str, str]:
+        """(model, reason) for a batch of pages; any hard page sends the batch to the full model."""
+        reasons = sorted({reason for tier, reason in map(self.page_tier, batch) if tier == "full"})
+        if not reasons:
+            return self.light_model, "simple"
+        if self.over_budget():
+            return self.light_model, "budget"
+        return self.full_model, "+".join(reasons)
+
+    def escalation(self, model: str, metrics: List[Dict]) -> Optional[str]:
+        """Reason to resend a light answer to the full model, or None to keep it."""
+        # With one model for both tiers a resend would repeat the same request
+        if model != self.light_model or self.light_model == self.full_model or self.over_budget():
+            return None
+        if not metrics:
+            return "empty"
+        if any("raw_output" in m for m in metrics):
+            return "invalid"
+        return None
+
+    def record(self, pages: str, model: str, reason: str, input_tokens: int, output_tokens: int,
+               seconds: float, escalated: bool = False) -> None:
+        with self._lock:
+            self.tokens_used += input_tokens + output_tokens
+            self.seconds_used += seconds
+            self.decisions.append({
+                "pages": pages,
+                "tier": "light" if model == self.light_model else "full",
+                "model": model,
+                "reason": reason,
+                "escalated": escalated,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "seconds": round(seconds, 3),
+                "cost_usd": estimate_cost(model, input_tokens, output_tokens),
+                "recorded_at": time.time(),
+            })
+
+    def summary(self) -> Dict:
+        """Requests, tokens, seconds and cost per tier, plus escalations."""
+        with self._lock:
+            decisions = list(self.decisions)
+        tiers = {}
+        for decision in decisions:
+            tier = tiers.setdefault(decision["tier"], {"model": decision["model"], "requests": 0, "input_tokens": 0,
+                                                       "output_tokens": 0, "seconds": 0.0, "cost_usd": 0.0})
+            tier["requests"] += 1
+            tier["input_tokens"] += decision["input_tokens"]
+            tier["output_tokens"] += decision["output_tokens"]
+            tier["seconds"] += decision["seconds"]
+            tier["cost_usd"] += decision["cost_usd"] or 0.0
+        return {
+            "tiers": tiers,
+            "escalations": sum(1 for d in decisions if d["escalated"]),
+            "over_budget": self.over_budget(),
+            "cost_usd": sum(tier["cost_usd"] for tier in tiers.values()),
+        }
@@ -0,0 +1,24 @@
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+
+class Category(str, Enum):
+    environmental = "Environmental"
+    social = "Social"
+    governance = "Governance"
+
+
+class Metric(BaseModel):
+    """One ESG metric as returned by Gemini in schema-constrained mode."""
+    # Hints go in `description`: the genai schema conversion rejects `examples`
+    metric_name: str = Field(description='Name of the metric, e.g. "Scope 1 GHG emissions" or "Water withdrawal"')
+    value: str = Field(description='The figure as reported, e.g. "1,234", "12.5%" or "3.4 million"')
+    unit: Optional[str] = Field(default=None, description='Unit of the value, e.g. "tCO2e", "MWh", "m3" or "%"')
+    year: Optional[int] = Field(default=None, description="Reporting year the value refers to, e.g. 2024")
+    category: Category
+    source_page: int = Field(description="Number of the PAGE block the metric was found on")
+
+
+MetricList = TypeAdapter(List[Metric])
@@ -0,0 +1,191 @@
+import io
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .comparison import topic_of
+from .normalize import parse_values
+
+YEAR_HEADER = re.compile(r"^(?:fy\s?)?((?:19|20)\d{2})$", re.IGNORECASE)
+UNIT_HEADERS = {"unit", "units", "uom", "unit of measure", "measure"}
+UNIT_IN_NAME = re.compile(r"\s*\(([^()]{1,30})\)\s*$")
+# Footnote markers glued to values: "67%2", "1.72" cannot be told apart, so only after a percent sign
+FOOTNOTE = re.compile(r"(%)\d{1,2}(?:,\d{1,2})*$")
+
+TOPIC_CATEGORIES = {
+    "Health and safety": "Social",
+    "Workforce and diversity": "Social",
+    "Training and development": "Social",
+    "Community": "Social",
+    "Board and governance": "Governance",
+    "Ethics and compliance": "Governance",
+}
+
+
+def _cell(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip() if value is not None else ""
+
+
+def category_of(metric_name: str, unit: str = "") -> str:
+    """ESG category of a table row from its topic bucket."""
+    return TOPIC_CATEGORIES.get(topic_of({"metric_name": metric_name, "unit": unit}), "Environmental")
+
+
+def parse_table(rows: List[List], page_number: int) -> Tuple[List[Dict], float]:
+    """
+    Turn a KPI table (metric names down one column, years across the
+    header) into metric rows.
+
+    Returns (metrics, confidence) where confidence is the share of filled
+    cells under year columns that parsed as numbers; tables without a year
+    header or a text column for names get 0.
+    """
+    rows = [[_cell(cell) for cell in row] for row in rows if row]
+    if len(rows) < 2:
+        return [], 0.0
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+
+    header_index, year_columns = None, {}
+    for index, row in enumerate(rows[:3]):
+        year_columns = {col: int(m.group(1)) for col, cell in enumerate(row) if (m := YEAR_HEADER.match(cell))}
+        if year_columns:
+            header_index = index
+            break
+    if header_index is None:
+        return [], 0.0
+
+    header, body = rows[header_index], rows[header_index + 1:]
+    if not body:
+        return [], 0.0
+    unit_column = next((col for col, cell in enumerate(header) if cell.lower() in UNIT_HEADERS), None)
+
+    # Parse every body cell in one vectorized call
+    cells = pd.Series([FOOTNOTE.sub(r"\1", cell) for row in body for cell in row], dtype="object")
+    numeric = parse_values(cells)["value_numeric"].notna().to_numpy().reshape(len(body), width)
+
+    candidates = [col for col in range(width) if col not in year_columns and col != unit_column]
+    if not candidates:
+        return [], 0.0
+    name_column = max(candidates, key=lambda col: sum(1 for r, row in enumerate(body)
+                                                      if row[col] and not numeric[r][col]))
+
+    metrics, filled, parsed = [], 0, 0
+    for r, row in enumerate(body):
+        values = [(col, year) for col, year in year_columns.items() if row[col]]
+        if not values:
+            continue  # section heading or empty row
+        filled += len(values)
+        name = row[name_column]
+        if not name or numeric[r][name_column]:
+            continue  # values without a usable name count against the table
+
+        unit = row[unit_column] if unit_column is not None else ""
+        unit_match = UNIT_IN_NAME.search(name)
+        if unit_match:
+            unit = unit or unit_match.group(1)
+            name = name[:unit_match.start()].strip()
+        for col, year in values:
+            if not numeric[r][col]:
+                continue
+            value = FOOTNOTE.sub(r"\1", row[col])
+            parsed += 1
+            metrics.append({
+                "metric_name": name,
+                "value": value,
+                "unit": unit or ("%" if value.endswith("%") else ""),
+                "year": year,
+                "category": category_of(name, unit),
+                "source_page": page_number,
+            })
+
+    return metrics, (parsed / filled if filled else 0.0)
+
+
+class TableExtractor:
+    """
+    Local KPI-table stage in front of the LLM.
+
+    Finds tables with PyMuPDF's or pdfplumber's table finder and parses them
+    with `parse_table`. Tables that parse with at least `min_confidence` and
+    `min_metrics` rows become metric rows directly, and their text is removed
+    from what is sent to Gemini; narrative text and tables that do not parse
+    cleanly are left to the LLM.
+    """
+
+    def __init__(self, backend: str = "pymupdf", min_confidence: float = 0.8, min_metrics: int = 2):
+        if backend not in ("pymupdf", "pdfplumber"):
+            raise ValueError(f"Unknown table backend '{backend}'. Choose pymupdf or pdfplumber.")
+        self.backend = backend
+        self.min_confidence = min_confidence
+        self.min_metrics = min_metrics
+
+    @property
+    def fingerprint(self) -> str:
+        """Settings that change the results, for checkpoint keys."""
+        return f"{self.backend}:{self.min_confidence}:{self.min_metrics}"
+
+    def _accept(self, rows: List[List], page_number: int) -> Optional[List[Dict]]:
+        metrics, confidence = parse_table(rows, page_number)
+        if confidence >= self.min_confidence and len(metrics) >= self.min_metrics:
+            return metrics
+        return None
+
+    def _pymupdf(self, source, pages: Optional[set]) -> Iterable[Tuple[int, List[Dict], str]]:
+        import fitz  # PyMuPDF
+
+        doc = fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+        try:
+            for page in doc:
+                page_number = page.number + 1
+                if pages is not None and page_number not in pages:
+                    continue
+                metrics, boxes = [], []
+                for table in page.find_tables().tables:
+                    accepted = self._accept(table.extract(), page_number)
+                    if accepted:
+                        metrics.extend(accepted)
+                        boxes.append(fitz.Rect(table.bbox))
+                if not metrics:
+                    continue
+                # Keep only the text blocks outside the parsed tables
+                remaining = []
+                for block in page.get_text("blocks"):
+                    rect = fitz.Rect(block[:4])
+                    center = (rect.tl + rect.br) / 2
+                    if not any(box.contains(center) for box in boxes):
+                        remaining.append(block[4].strip())
+                yield page_number, metrics, "\n".join(remaining)
+        finally:
+            doc.close()
+
+    def _pdfplumber(self, source, pages: Optional[set]) -> Iterable[Tuple[int, List[Dict], str]]:
+        import pdfplumber
+
+        with pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source) as pdf:
+            for index, page in enumerate(pdf.pages):
+                page_number = index + 1
+                if pages is not None and page_number not in pages:
+                    continue
+                metrics, remaining = [], page
+                for table in page.find_tables():
+                    accepted = self._accept(table.extract(), page_number)
+                    if accepted:
+                        metrics.extend(accepted)
+                        remaining = remaining.outside_bbox(table.bbox)
+                if metrics:
+                    yield page_number, metrics, remaining.extract_text() or ""
+                page.flush_cache()
+
+    def extract(self, source, pages: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+        """
+        Parse the tables of `pages` (all by default) of a PDF path or bytes.
+
+        Returns {page_number: {"metrics": [...], "text": remaining text}} for
+        the pages where at least one table was parsed confidently.
+        """
+        pages = set(pages) if pages is not None else None
+        run = self._pymupdf if self.backend == "pymupdf" else self._pdfplumber
+        return {page_number: {"metrics": metrics, "text": text}
+                for page_number, metrics, text in run(source, pages)}
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Pipeline stages in run order; "llm" is the request latency alone
+# (without semaphore or rate-limiter waits)
+STAGES = ["split", "text", "tables", "prefilter", "llm", "parse", "dedupe", "write"]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0–100), None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def usage_tokens(response) -> tuple:
+    """(input, output) tokens from a response's `usage_metadata`; thinking tokens count as output."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    output = (getattr(usage, "candidates_token_count", None) or 0) + (getattr(usage, "thoughts_token_count", None) or 0)
+    return getattr(usage, "prompt_token_count", None) or 0, output
+
+
+class RunTelemetry:
+    """
+    Stage timings and token usage of one extraction run.
+
+    Stages are timed with `stage(name)`; every Gemini request is recorded
+    with its latency, pages and the token counts Gemini reports. `summary()`
+    derives requests/min, tokens/page and p50/p95 latencies; `write()`
+    exports the run as a JSON report and a Prometheus text file (for the
+    node_exporter textfile collector). Safe to share between threads.
+    """
+
+    def __init__(self, report: str = ""):
+        self.report = report
+        self.started_at = time.time()
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.requests: List[Dict] = []
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name].append(seconds)
+
+    def record_request(self, started: float, seconds: float, pages: int, input_tokens: int = 0,
+                       output_tokens: int = 0, status: str = "ok", model: Optional[str] = None) -> None:
+        """One Gemini call; `started` is its wall-clock start (time.time())."""
+        self.record("llm", seconds)
+        with self._lock:
+            self.requests.append({
+                "started": started,
+                "seconds": seconds,
+                "pages": pages,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "status": status,
+                "model": model,
+            })
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stages = {name: list(samples) for name, samples in self.stages.items()}
+            requests = list(self.requests)
+        latencies = [r["seconds"] for r in requests]
+        input_tokens = sum(r["input_tokens"] for r in requests)
+        output_tokens = sum(r["output_tokens"] for r in requests)
+        llm_pages = sum(r["pages"] for r in requests if r["status"] == "ok")
+        # Request rate over the span the requests were actually in flight
+        span = (max(r["started"] + r["seconds"] for r in requests) - min(r["started"] for r in requests)
+                if requests else 0.0)
+        return {
+            "report": self.report,
+            "started_at": self.started_at,
+            "pages": self.pages,
+            "requests": len(requests),
+            "failed_requests": sum(1 for r in requests if r["status"] != "ok"),
+            "requests_per_minute": len(requests) / (span / 60) if span > 0 else None,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_per_page": (input_tokens + output_tokens) / llm_pages if llm_pages else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "stages": {
+                name: {
+                    "count": len(stages[name]),
+                    "total": sum(stages[name]),
+                    "p50": percentile(stages[name], 50),
+                    "p95": percentile(stages[name], 95),
+                }
+                for name in STAGES + sorted(set(stages) - set(STAGES)) if name in stages
+            },
+        }
+
+    def to_prometheus(self, prefix: str = "esg_extract") -> str:
+        """The run in Prometheus text exposition format, labelled by report."""
+        summary = self.summary()
+        report = summary["report"].replace("\\", "\\\\").replace('"', '\\"')
+        label = f'report="{report}"'
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stage in summary["stages"].items():
+            stage_label = f'{label},stage="{name}"'
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(f'{prefix}_stage_seconds{{{stage_label},quantile="{quantile}"}} {stage[key]}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{stage_label}}} {stage['total']}")
+            lines.append(f"{prefix}_stage_seconds_count{{{stage_label}}} {stage['count']}")
+
+        ok = summary["requests"] - summary["failed_requests"]
+        lines += [
+            f"# HELP {prefix}_requests_total Gemini requests sent.",
+            f"# TYPE {prefix}_requests_total counter",
+            f'{prefix}_requests_total{{{label},status="ok"}} {ok}',
+            f'{prefix}_requests_total{{{label},status="error"}} {summary["failed_requests"]}',
+            f"# HELP {prefix}_tokens_total Tokens reported in the response usage metadata.",
+            f"# TYPE {prefix}_tokens_total counter",
+            f'{prefix}_tokens_total{{{label},direction="input"}} {summary["input_tokens"]}',
+            f'{prefix}_tokens_total{{{label},direction="output"}} {summary["output_tokens"]}',
+            f"# HELP {prefix}_pages_total Pages read from the report.",
+            f"# TYPE {prefix}_pages_total counter",
+            f"{prefix}_pages_total{{{label}}} {summary['pages']}",
+        ]
+        for gauge, help_text in (("requests_per_minute", "Request rate while requests were in flight."),
+                                 ("tokens_per_page", "Input plus output tokens per page sent to Gemini.")):
+            if summary[gauge] is not None:
+                lines += [
+                    f"# HELP {prefix}_{gauge} {help_text}",
+                    f"# TYPE {prefix}_{gauge} gauge",
+                    f"{prefix}_{gauge}{{{label}}} {summary[gauge]}",
+                ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, name: str, output_dir: str = "data/telemetry", run_id: Optional[str] = None) -> Path:
+        """
+        Write `<name>-<run_id>.json` (summary and raw requests; `<name>.json`
+        without a `run_id`) and `<name>.prom`; returns the JSON path.
+
+        The Prometheus file is overwritten by every run of the report: the
+        textfile collector rejects series that appear in two files.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            requests = list(self.requests)
+        report = {**self.summary(), "requests_log": requests}
+        json_path = output_dir / (f"{name}-{run_id}.json" if run_id else f"{name}.json")
+        for path, text in ((json_path, json.dumps(report, indent=2)),
+                           (output_dir / f"{name}.prom", self.to_prometheus())):
+            # The textfile collector may read at any time: write-then-rename
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            tmp_path.write_text(text)
+            os.replace(tmp_path, path)
+        return json_path
+
+
+def latest_summary(output_dir: str = "data/telemetry") -> Optional[Dict]:
+    """Summary of the most recently written run, or None."""
+    reports = sorted(Path(output_dir).glob("*.json"), key=lambda path: path.stat().st_mtime)
+    if not reports:
+        return None
+    with open(reports[-1], "r") as f:
+        report = json.load(f)
+    report.pop("requests_log", None)
+    return report
@@ -0,0 +1,151 @@
+import hashlib
+import mmap
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+def content_hash(source) -> str:
+    """sha256 of a PDF given as bytes, a binary file object or a path."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    if hasattr(source, "getvalue"):
+        return hashlib.sha256(source.getvalue()).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageTexts:
+    """
+    Read-only, memory-mapped page texts of one PDF.
+
+    Pages are decoded on access, so opening a stored document costs two
+    mmaps regardless of its size. Index with 0-based page indices.
+    """
+
+    def __init__(self, blob_path: Path, index_path: Path):
+        self.offsets = np.load(index_path, mmap_mode="r")
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file (a document whose pages have no text)
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._blob[int(self.offsets[index]):int(self.offsets[index + 1])].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[index] for index in range(len(self)))
+
+    def close(self) -> None:
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class PageTextWriter:
+    """Appends page texts to a blob file; only the page offsets stay in memory."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offsets = [0]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def append(self, text: str) -> None:
+        data = (text or "").encode("utf-8", errors="surrogatepass")
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+
+class PageTextStore:
+    """
+    On-disk store of extracted page text, keyed by PDF content hash.
+
+    Each document gets a directory holding one pair of files per `kind` of
+    text (a text backend such as "pdfplumber", or "markdown"): a blob with
+    the UTF-8 page texts back to back and a .npy array of page offsets.
+    Both are memory-mapped on read. The index is written last, so a kind
+    only becomes visible once all its pages are on disk.
+
+    Re-running a report with other part sizes, prompts or models reads the
+    text from here instead of parsing the PDF again.
+    """
+
+    def __init__(self, root: str = "data/page_text"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _paths(self, pdf_hash: str, kind: str):
+        directory = self.root / pdf_hash[:2] / pdf_hash
+        name = re.sub(r"[^\w.-]", "_", kind)
+        return directory, directory / f"{name}.bin", directory / f"{name}.idx.npy"
+
+    def has(self, pdf_hash: str, kind: str) -> bool:
+        return self._paths(pdf_hash, kind)[2].exists()
+
+    def get(self, pdf_hash: str, kind: str) -> Optional[PageTexts]:
+        """Stored pages of a document, or None if this kind was never stored."""
+        _, blob_path, index_path = self._paths(pdf_hash, kind)
+        if not index_path.exists():
+            return None
+        return PageTexts(blob_path, index_path)
+
+    @contextmanager
+    def writer(self, pdf_hash: str, kind: str):
+        """
+        Context manager yielding a `PageTextWriter` that appends pages as
+        they are extracted. The kind is committed when the block exits
+        normally and discarded if it raises (or a generator using it is
+        closed early), so a partial document is never stored.
+        """
+        directory, blob_path, index_path = self._paths(pdf_hash, kind)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Unique temporary names: two runs may store the same document at once
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        blob_tmp, index_tmp = Path(str(blob_path) + suffix), Path(str(index_path) + suffix)
+        writer = PageTextWriter(open(blob_tmp, "wb"))
+        try:
+            yield writer
+            writer.file.close()
+            with open(index_tmp, "wb") as f:
+                np.save(f, np.asarray(writer.offsets, dtype=np.int64))
+            with self._lock:
+                os.replace(blob_tmp, blob_path)
+                os.replace(index_tmp, index_path)
+        finally:
+            writer.file.close()
+            for tmp in (blob_tmp, index_tmp):
+                if tmp.exists():
+                    tmp.unlink()
+
+    def put(self, pdf_hash: str, kind: str, texts: Iterable[str]) -> int:
+        """Store the pages of a document in order; returns the page count."""
+        with self.writer(pdf_hash, kind) as writer:
+            for text in texts:
+                writer.append(text)
+        return len(writer)
+
+    def texts(self, pdf_hash: str, kind: str) -> Optional[List[str]]:
+        """All pages of a stored kind as a list, or None."""
+        pages = self.get(pdf_hash, kind)
+        if pages is None:
+            return None
+        try:
+            return list(pages)
+        finally:
+            pages.close()
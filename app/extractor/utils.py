@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import re
 import json
 
@@ -10,6 +10,35 @@ def clean_text(text: str) -> str:
     text = re.sub(r'[^\w\s.,()-]', '', text)
     return text.strip()
 
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def load_json_output(text: str) -> Optional[Any]:
+    """
+    Parse a JSON list/object from free-form LLM output.
+
+    Strips markdown code fences and, if the reply has text around the JSON,
+    decodes the first complete array or object. Returns None instead of
+    raising when nothing decodes.
+    """
+    if not isinstance(text, str):
+        return None
+    cleaned = re.sub(r"^\s*```(?:json)?|```\s*$", "", text.strip(), flags=re.IGNORECASE).strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", cleaned):
+        try:
+            parsed, _ = decoder.raw_decode(cleaned, match.start())
+            return parsed
+        except json.JSONDecodeError:
+            continue
+    return None
+
 def format_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
     """Format and standardize extracted metrics."""
     formatted = {}
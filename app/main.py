@@ -3,20 +3,48 @@ import os
 import json
 from pathlib import Path
 import pandas as pd
-import time
-import pdfplumber
+import hashlib
 from google import genai
-import re
 
-from extractor.pdf_splitter import split_pdf  # your PDF splitting helper
 from extractor.compare_metrics import compare_metrics_page
-from extractor.gemini_extractor import MetricsExtractor  # your custom extractor
+from extractor.jobs import JobRunner, JobStore
+from extractor.page_cache import PageCache
+from extractor.page_text import BACKENDS
+from extractor.pipeline import add_source_info, to_results_frame
+from extractor.routing import MODEL_PRICES
+from extractor.telemetry import latest_summary
 
 # ------------------------------------------------------------
 # Page config
 # ------------------------------------------------------------
 st.set_page_config(page_title="Sustainability Metrics Extractor", page_icon="🌍", layout="wide")
 
+# ------------------------------------------------------------
+# Cached resources and data (kept across Streamlit reruns)
+# ------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def get_client(api_key: str):
+    return genai.Client(api_key=api_key)
+
+
+@st.cache_resource(show_spinner=False)
+def get_page_cache(max_bytes: int) -> PageCache:
+    return PageCache(max_bytes=max_bytes)
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner() -> JobRunner:
+    # One worker pool per server process, shared by every session, so all
+    # uploads queue behind the same Gemini concurrency and rate limits
+    return JobRunner(JobStore(), workers=2).start()
+
+
+@st.cache_data(show_spinner=False)
+def load_csv(path: str, mtime: float) -> pd.DataFrame:
+    """CSV contents, re-read only when the file's mtime changes."""
+    return pd.read_csv(path)
+
+
 # ------------------------------------------------------------
 # Sidebar: API Key & settings
 # ------------------------------------------------------------
@@ -24,8 +52,57 @@ with st.sidebar:
     st.header("Configuration")
     api_key = st.text_input("Enter Google API Key", type="password")
     pages_per_part = st.number_input("Pages per part", min_value=2, max_value=20, value=5)
-    if api_key:
-        os.environ["GOOGLE_API_KEY"] = api_key
+    pdf_backend = st.selectbox("PDF text backend", list(BACKENDS), index=list(BACKENDS).index("pdfplumber"))
+    text_workers = st.number_input("Text extraction processes", min_value=1, max_value=os.cpu_count() or 1, value=1)
+    max_concurrency = st.number_input("Concurrent Gemini requests", min_value=1, max_value=32, value=4)
+    requests_per_minute = st.number_input("Requests per minute", min_value=1, max_value=2000, value=10)
+    tokens_per_minute = st.number_input("Input tokens per minute", min_value=1000, max_value=10_000_000,
+                                        value=250_000, step=1000)
+    max_input_tokens = st.number_input("Max input tokens per request (0 = one page per request)",
+                                       min_value=0, max_value=500_000, value=8000, step=1000)
+    structured_output = st.checkbox("Schema-constrained JSON output", value=True,
+                                    help="Gemini must answer in the metric schema; replies are validated in one pass.")
+    relevance_threshold = st.slider("Page relevance threshold (0 = send every page)",
+                                    min_value=0.0, max_value=1.0, value=0.2, step=0.05)
+    table_backend = st.selectbox("Parse KPI tables locally", ["pymupdf", "pdfplumber", "off"],
+                                 help="Tables that parse cleanly become metrics without a Gemini request.")
+    cache_size_mb = st.number_input("Page cache size (MB)", min_value=16, max_value=10_000, value=256)
+    full_model = st.selectbox("Model", list(MODEL_PRICES), index=list(MODEL_PRICES).index("gemini-2.5-flash"),
+                              help="Used for dense and table-heavy pages, escalations and comparisons.")
+    routing = st.checkbox("Route simple pages to a lighter model", value=True)
+    light_model = st.selectbox("Light model", list(MODEL_PRICES), disabled=not routing,
+                               index=list(MODEL_PRICES).index("gemini-2.5-flash-lite"))
+    token_budget = st.number_input("Token budget per report (0 = unlimited)", min_value=0, value=0, step=10_000,
+                                   disabled=not routing, help="Past the budget nothing is escalated.")
+    latency_budget = st.number_input("Request-time budget per report in seconds (0 = unlimited)",
+                                     min_value=0, value=0, step=30, disabled=not routing)
+
+# The request limits are global: they apply to the jobs of all users
+runner = get_job_runner()
+runner.configure(max_concurrency, requests_per_minute, tokens_per_minute)
+runner.page_cache = get_page_cache(cache_size_mb * 1024 * 1024)
+job_store = runner.store
+
+# ------------------------------------------------------------
+# Sidebar: timings and token usage of the latest run
+# ------------------------------------------------------------
+run_summary = latest_summary()
+if run_summary:
+    def fmt(value, pattern):
+        return pattern.format(value) if value is not None else "–"
+
+    with st.sidebar:
+        st.subheader("📈 Last run")
+        st.caption(f"{run_summary['report']} — {run_summary['requests']} requests, "
+                   f"{run_summary['input_tokens']:,} in / {run_summary['output_tokens']:,} out tokens")
+        left, right = st.columns(2)
+        left.metric("Requests/min", fmt(run_summary["requests_per_minute"], "{:.1f}"))
+        right.metric("Tokens/page", fmt(run_summary["tokens_per_page"], "{:,.0f}"))
+        left.metric("LLM p50", fmt(run_summary["latency_p50"], "{:.2f}s"))
+        right.metric("LLM p95", fmt(run_summary["latency_p95"], "{:.2f}s"))
+        stages = pd.DataFrame(run_summary["stages"]).T
+        if not stages.empty:
+            st.dataframe(stages[["count", "total", "p50", "p95"]].astype(float).round(3))
 
 # ------------------------------------------------------------
 # Page selection
@@ -36,18 +113,16 @@ page = st.sidebar.selectbox(
 )
 
 if page == "Compare ESG Metrics":
-    compare_metrics_page()  # Call your compare page
+    compare_metrics_page(  # Call your compare page
+        client=get_client(api_key) if api_key else None,
+        max_concurrency=max_concurrency,
+        # Shared with the job runner so both pages draw on one Gemini quota
+        rate_limiter=runner.rate_limiter,
+        caller=runner.caller,
+        model=full_model
+    )
     st.stop()
 
-# ------------------------------------------------------------
-# JSON cleanup helper
-# ------------------------------------------------------------
-def extract_json(text):
-    json_match = re.search(r"```(?:json)?\s*(\[\s*{.*}\s*\])\s*```", text, re.DOTALL)
-    if json_match:
-        text = json_match.group(1)
-    return text.strip()
-
 # ------------------------------------------------------------
 # Main App
 # ------------------------------------------------------------
@@ -66,91 +141,128 @@ if uploaded_file and not api_key:
 if uploaded_file:
     file_name = uploaded_file.name
     results_dir = Path("data/extracted_results")
-    temp_dir = Path("data/pdf_parts")
     results_dir.mkdir(parents=True, exist_ok=True)
-    temp_dir.mkdir(parents=True, exist_ok=True)
     result_csv = results_dir / f"{Path(file_name).stem}.csv"
+    # Content hash of the report the CSV was built from, so a different report
+    # uploaded under the same name is not answered with stale results
+    result_hash_file = result_csv.with_suffix(".sha256")
+    pdf_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    already_processed = False
 
     # -------------------------
     # Check if cached CSV exists
     # -------------------------
     if result_csv.exists():
-        st.success(f"✅ Report '{file_name}' already processed.")
-        df = pd.read_csv(result_csv)
-        st.subheader("Previously Extracted Metrics")
-        st.dataframe(df)
-        st.stop()
-
-    # Save uploaded file temporarily
-    temp_pdf_path = temp_dir / file_name
-    with open(temp_pdf_path, "wb") as f:
-        f.write(uploaded_file.getvalue())
-
-    # -------------------------
-    # Split the PDF into parts
-    # -------------------------
-    st.info("✂️ Splitting PDF into smaller parts...")
-    pdf_parts = split_pdf(temp_pdf_path, temp_dir, pages_per_part=pages_per_part)
-    st.success(f"✅ Split into {len(pdf_parts)} parts.")
+        if not result_hash_file.exists() or result_hash_file.read_text().strip() == pdf_hash:
+            st.success(f"✅ Report '{file_name}' already processed.")
+            df = load_csv(str(result_csv), result_csv.stat().st_mtime)
+            st.subheader("Previously Extracted Metrics")
+            st.dataframe(df)
+            already_processed = True
+        else:
+            st.info(f"♻️ '{file_name}' differs from the report processed under this name. "
+                    "Re-extracting; unchanged pages are served from the page cache.")
 
     # -------------------------
-    # Initialize MetricsExtractor
+    # Queue the report; a background worker extracts it
     # -------------------------
-    extractor = MetricsExtractor(api_key=os.environ.get("GOOGLE_API_KEY"))
-    all_metrics = []
+    settings = {
+        "pages_per_part": int(pages_per_part),
+        "backend": pdf_backend,
+        "text_workers": int(text_workers),
+        "max_input_tokens": int(max_input_tokens),
+        "structured_output": structured_output,
+        "relevance_threshold": float(relevance_threshold),
+        "table_backend": table_backend,
+        "model": full_model,
+        "routing": routing,
+        "light_model": light_model,
+        "token_budget": int(token_budget),
+        "latency_budget": float(latency_budget),
+    }
+    # Reruns of this script must not queue the same upload again
+    submission = (pdf_hash, json.dumps(settings, sort_keys=True))
+    submitted = st.session_state.setdefault("submitted_jobs", {})
+    if not already_processed and submission not in submitted:
+        submitted[submission] = runner.submit(file_name, uploaded_file.getvalue(), settings, api_key=api_key)
+        st.info(f"📥 '{file_name}' queued for extraction.")
 
-    # -------------------------
-    # Process each PDF part
-    # -------------------------
-    st.info("🔍 Extracting metrics from PDF parts...")
-
-    page_offset = 0  # keep track of where the chunk starts in the full PDF
-
-    for idx, part in enumerate(pdf_parts, start=1):
-        st.write(f"📄 Processing part {idx}/{len(pdf_parts)}: {Path(part).name}")
-        try:
-            # Extract text per page
-            text_chunks = []
-            with pdfplumber.open(part) as pdf:
-                for i, page in enumerate(pdf.pages, start=1):
-                    text_chunks.append({
-                        "page_number": page_offset + i,  # absolute page number
-                        "text": page.extract_text()
-                    })
-
-            # Extract metrics
-            metrics = extractor.extract_metrics(text_chunks)
-
-            # Add source info & normalize categories
-            for m in metrics:
-                m["source"] = f"{file_name} - page {m.get('source_page', 'unknown')}"
-                category = m.get("category", "").capitalize()
-                if category not in ["Environmental", "Social", "Governance"]:
-                    m["category"] = "Environmental"
-            all_metrics.extend(metrics)
-
-            # Update offset for next chunk
-            page_offset += len(pdf.pages)
-
-            # Cooldown to prevent rate limit
-            time.sleep(5)
-
-        except Exception as e:
-            st.error(f"❌ Error on part {idx}: {str(e)}")
-            time.sleep(5)
+# ------------------------------------------------------------
+# Job status: polled every few seconds without rerunning the page
+# ------------------------------------------------------------
+@st.fragment(run_every=2)
+def show_jobs():
+    job_ids = list(st.session_state.get("submitted_jobs", {}).values())
+    if not job_ids:
+        return
+    st.subheader("📋 Extraction jobs")
+    paused = runner.caller.breaker.remaining()
+    if paused:
+        st.warning(f"⏸️ Gemini quota exhausted or unavailable; all jobs resume in {paused:.0f}s.")
+    for job_id in reversed(job_ids):
+        job = job_store.get(job_id)
+        if job is None:
             continue
+        icon = {"queued": "⏳", "running": "🤖", "done": "✅", "partial": "⚠️", "failed": "❌",
+                "needs_key": "🔑"}[job["status"]]
+        with st.expander(f"{icon} {job['file_name']} — {job['status']}", expanded=job["status"] != "done"):
+            if job["status"] in ("queued", "running"):
+                total = job["parts_total"] or 0
+                st.progress(job["parts_done"] / total if total else 0.0,
+                            text=f"{job['parts_done']}/{total} parts" if total else "Waiting for a worker...")
+                partial = job_store.partial_metrics(job)
+                if partial:
+                    st.dataframe(to_results_frame(add_source_info(partial, job["file_name"])))
+                continue
 
-    # -------------------------
-    # Combine and save results
-    # -------------------------
-    if all_metrics:
-        df = pd.DataFrame(all_metrics)
-        # Reorder columns
-        columns_order = ["metric_name", "value", "unit", "year", "category", "source"]
-        df = df[columns_order]
-        df.to_csv(result_csv, index=False)
-        st.subheader("📊 Extracted ESG Metrics")
-        st.dataframe(df)
-        st.success(f"✅ Combined results saved to {result_csv}")
-    else:
-        st.warning("⚠️ No metrics were extracted from any part of the PDF.")
+            summary = job["result"] or {}
+            if job["status"] == "failed":
+                st.error(f"❌ Error processing PDF: {job['error']}")
+            elif job["status"] == "needs_key":
+                st.warning(f"🔑 {job['error']}")
+            else:
+                if summary.get("resumed_parts"):
+                    st.info(f"⏯️ Resumed {summary['resumed_parts']} parts from the checkpoint.")
+                st.info(f"📨 Sent {summary['requests']} Gemini requests for {summary['pages']} pages.")
+                if summary.get("table_metrics"):
+                    st.info(f"📋 {summary['table_metrics']} metrics parsed locally from KPI tables.")
+                if summary.get("duplicates_merged"):
+                    st.info(f"🧬 {summary['duplicates_merged']} repeated metrics merged"
+                            + (f"; {summary['conflicts']} rows have conflicting values." if summary.get("conflicts")
+                               else "."))
+                if summary.get("cache_hits"):
+                    st.info(f"♻️ {summary['cache_hits']} pages served from the page cache.")
+                if summary.get("routing"):
+                    tiers = ", ".join(f"{tier['requests']} × {tier['model']}"
+                                      for tier in summary["routing"]["tiers"].values())
+                    st.info(f"🔀 Routed requests: {tiers or 'none'} ({summary['routing']['escalations']} "
+                            f"escalated), about ${summary['routing']['cost_usd']:.4f}.")
+                if summary.get("failed_pages"):
+                    st.error(f"❌ Extraction failed for pages: {', '.join(map(str, summary['failed_pages']))}. "
+                             "Retry to send only the failed parts again.")
+                    for failure in summary.get("failures", []):
+                        st.caption(f"Pages {failure['pages']}: {failure['error']}")
+            if job["status"] != "done" and st.button("🔁 Retry", key=f"retry-{job_id}"):
+                if not api_key:
+                    st.error("Please enter your Google API key in the sidebar first.")
+                else:
+                    # Finished parts are reused from the checkpoint
+                    runner.retry(job_id, api_key=api_key)
+
+            if summary.get("csv") and Path(summary["csv"]).exists():
+                result_csv = Path(summary["csv"])
+                st.dataframe(load_csv(str(result_csv), result_csv.stat().st_mtime))
+                st.success(f"✅ Combined results saved to {result_csv}")
+            elif job["status"] not in ("failed", "needs_key"):
+                st.warning("⚠️ No metrics were extracted from any part of the PDF.")
+
+            decisions_csv = Path("data/prefilter_reports") / f"{Path(job['file_name']).stem}.csv"
+            if decisions_csv.exists():
+                decisions_df = load_csv(str(decisions_csv), decisions_csv.stat().st_mtime)
+                # Expanders cannot be nested, so the decisions go in a toggle
+                if st.toggle(f"🧹 Prefilter decisions ({(decisions_df['decision'] == 'skip').sum()} pages skipped)",
+                             key=f"decisions-{job_id}"):
+                    st.dataframe(decisions_df)
+
+
+show_jobs()
@@ -1,12 +1,17 @@
 import streamlit as st
+import asyncio
 import os
 import json
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
-import re
 
-from extractor import PDFParser, MetricsExtractor
+from extractor import MetricsExtractor
+from extractor.checkpoint import PartCheckpoint
+from extractor.page_text import page_markdown
+from extractor.pipeline import extract_report_async, report_key
+from extractor.text_store import PageTextStore, content_hash
+from extractor.utils import load_json_output
 from extractor.compare_metrics import compare_metrics_page
 
 
@@ -25,6 +30,9 @@ st.set_page_config(
 with st.sidebar:
     st.header("Configuration")
     api_key = st.text_input("Enter Google API Key", type="password")
+    pages_per_part = st.number_input("Pages per request", min_value=1, max_value=20, value=1)
+    markdown_workers = st.number_input("Markdown conversion processes", min_value=1,
+                                       max_value=os.cpu_count() or 1, value=os.cpu_count() or 1)
     if api_key:
         os.environ["GOOGLE_API_KEY"] = api_key
 
@@ -40,19 +48,11 @@ def parse_gemini_output(output):
     if not isinstance(output, str):
         return {}
 
-    # Remove code fences like ```json ... ```
-    cleaned = re.sub(r"^```json|```$", "", output.strip(), flags=re.IGNORECASE | re.MULTILINE).strip()
-
-    # Extract JSON structure (list or dict)
-    match = re.search(r"(\[.*\]|\{.*\})", cleaned, re.DOTALL)
-    if not match:
-        return {}
-
-    try:
-        return json.loads(match.group())
-    except json.JSONDecodeError:
+    parsed = load_json_output(output)
+    if parsed is None:
         st.warning("⚠️ Gemini output is not valid JSON.")
         return {}
+    return parsed
     
 def flatten_metrics(data):
     """Flatten the parsed Gemini output into a list of dicts for DataFrame."""
@@ -153,30 +153,35 @@ def main():
         else:
 
             try:
-                with st.spinner("Converting PDF to text..."):
-                    import fitz  # PyMuPDF
-                    import pymupdf4llm
-                    try:
-                        md_text = pymupdf4llm.to_markdown(str(temp_path))
-                    except Exception as e:
-                        print(f"⚠️ pymupdf4llm failed, using fallback text extraction: {e}")
-                        doc = fitz.open(temp_path)
-                        md_text = ""
-                        for page in doc:
-                            md_text += page.get_text("text") + "\n"
-                        doc.close()
+                page_store = PageTextStore()
+                with st.spinner("Converting PDF to markdown..."):
+                    # Pages are converted in parallel processes; reruns read them from the store
+                    md_pages = page_markdown(temp_path, store=page_store, workers=int(markdown_workers))
 
                 st.subheader("Extracted Markdown Preview")
-                st.code(md_text[:2000], language="markdown")
+                st.code("\n".join(md_pages)[:2000], language="markdown")
 
-                text_chunks = [md_text]
-
-            # Extract metrics using Gemini
+            # Extract metrics using Gemini, one request per part of `pages_per_part` pages
                 with st.spinner("Extracting metrics via Gemini..."):
-                    pdf_parser = PDFParser()
                     metrics_extractor = MetricsExtractor()
-                    metrics = metrics_extractor.extract_metrics(text_chunks)
-                
+                    checkpoint = PartCheckpoint(report_key(content_hash(temp_path), metrics_extractor,
+                                                           backend="markdown"))
+                    result = asyncio.run(extract_report_async(
+                        temp_path, file_name, metrics_extractor,
+                        pages_per_part=int(pages_per_part),
+                        backend="markdown",
+                        checkpoint=checkpoint,
+                        page_store=page_store
+                    ))
+                    metrics = result["metrics"]
+                if result["failed_pages"]:
+                    st.error(f"❌ Extraction failed for pages: {', '.join(map(str, result['failed_pages']))}. "
+                             "Upload the report again to retry only those pages.")
+                    # Nothing is cached yet, so the retry is not answered from the cache;
+                    # finished parts are reused from the checkpoint
+                    st.dataframe(pd.DataFrame(metrics))
+                    return
+
                 with open(json_cache_path, "w") as f:
                     json.dump(metrics, f, indent=2)
                 st.success("✅ Saved Gemini output to cache.")
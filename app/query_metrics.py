@@ -0,0 +1,51 @@
+"""
+Query the Parquet metrics store from the command line.
+
+Run from the app directory:
+
+    python query_metrics.py --ingest                      # load CSVs from data/extracted_results
+    python query_metrics.py --category Environmental --company adm cargill
+    python query_metrics.py --year 2024 --columns report metric_name value_numeric unit -o out.csv
+
+Filters on category, company and year prune whole partitions; only the
+requested columns are read.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from extractor.metrics_store import MetricsStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store-dir", default="data/metrics_store")
+    parser.add_argument("--ingest", action="store_true", help="First ingest new or changed CSVs")
+    parser.add_argument("--results-dir", default="data/extracted_results", help="CSV directory for --ingest")
+    parser.add_argument("--category")
+    parser.add_argument("--company", nargs="+")
+    parser.add_argument("--year", nargs="+", type=int)
+    parser.add_argument("--report", nargs="+")
+    parser.add_argument("--columns", nargs="+")
+    parser.add_argument("-o", "--output", type=Path, help="Write the result as CSV instead of printing it")
+    args = parser.parse_args()
+
+    store = MetricsStore(args.store_dir)
+    if args.ingest:
+        ingested = store.ingest_csvs(args.results_dir)
+        print(f"📥 Ingested {len(ingested)} CSV files.")
+
+    started = time.perf_counter()
+    frame = store.query(columns=args.columns, category=args.category, reports=args.report,
+                        companies=args.company, years=args.year)
+    print(f"🔎 {len(frame)} rows in {time.perf_counter() - started:.3f}s")
+
+    if args.output:
+        frame.to_csv(args.output, index=False)
+        print(f"✅ Saved to {args.output}")
+    else:
+        print(frame.to_string(max_rows=50))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parents[1]
+# The app imports `extractor` as a top-level package, as when run from app/
+sys.path.insert(0, str(APP_DIR))
+
+
+@pytest.fixture
+def sample_pdf() -> Path:
+    return APP_DIR / "data" / "pdf_parts" / "Pepsico Sustainability 2024.pdf"
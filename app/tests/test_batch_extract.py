@@ -0,0 +1,10 @@
+from batch_extract import collect_pdfs, duplicate_stems
+
+
+def test_same_file_name_in_two_directories_is_reported(tmp_path):
+    for path in ("a/report.pdf", "b/report.pdf", "b/other.pdf", "b/notes.txt"):
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_bytes(b"%PDF-1.4")
+    pdfs = collect_pdfs([str(tmp_path)])
+    assert [p.name for p in pdfs] == ["report.pdf", "other.pdf", "report.pdf"]
+    assert duplicate_stems(pdfs) == {"report": [tmp_path / "a/report.pdf", tmp_path / "b/report.pdf"]}
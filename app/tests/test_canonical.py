@@ -0,0 +1,29 @@
+import pytest
+
+from extractor.canonical import CanonicalLexicon
+
+
+@pytest.fixture(scope="module")
+def lexicon():
+    return CanonicalLexicon(learned_path=None)
+
+
+@pytest.mark.parametrize("name, kpi", [
+    ("Scope 1 GHG emissions (tCO2e)", "Scope 1 GHG emissions"),
+    ("Total water withdrawal (m3)", "Water withdrawal"),
+    ("Women in management (%)", "Women in management"),
+])
+def test_match(lexicon, name, kpi):
+    assert lexicon.match(name)[0] == kpi
+
+
+@pytest.mark.parametrize("name", [
+    "Waste to landfill",
+    "Water withdrawal intensity",
+    "Scope 1 and 2 GHG emissions reduction vs 2019",
+    "Renewable energy",
+    "Water consumption",
+    "",
+])
+def test_no_match(lexicon, name):
+    assert lexicon.match(name)[0] is None
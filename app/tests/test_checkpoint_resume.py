@@ -0,0 +1,55 @@
+import asyncio
+
+from extractor.checkpoint import PartCheckpoint
+from extractor.fake_client import FakeGeminiClient
+from extractor.gemini_extractor import MetricsExtractor
+from extractor.pipeline import extract_report_async, report_key
+
+
+def run(pdf, checkpoint, client):
+    extractor = MetricsExtractor(client=client)
+    return asyncio.run(extract_report_async(pdf.read_bytes(), pdf.name, extractor, pages_per_part=3,
+                                            checkpoint=checkpoint))
+
+
+def test_finished_report_is_resumed_without_requests(sample_pdf, tmp_path):
+    first = run(sample_pdf, PartCheckpoint("report", str(tmp_path)), FakeGeminiClient(latency=0))
+    assert first["resumed_parts"] == 0
+    assert first["metrics"]
+
+    client = FakeGeminiClient(latency=0)
+    second = run(sample_pdf, PartCheckpoint("report", str(tmp_path)), client)
+    assert client.calls == 0
+    assert second["resumed_parts"] == second["parts"]
+    assert second["metrics"] == first["metrics"]
+
+
+def test_interrupted_report_only_sends_missing_parts(sample_pdf, tmp_path):
+    full_client = FakeGeminiClient(latency=0)
+    full = run(sample_pdf, PartCheckpoint("report", str(tmp_path)), full_client)
+
+    # Keep the first finished part only, as if the run had crashed after it
+    checkpoint = PartCheckpoint("report", str(tmp_path))
+    first_line = checkpoint.path.read_text().splitlines()[0]
+    checkpoint.path.write_text(first_line + "\n")
+
+    client = FakeGeminiClient(latency=0)
+    resumed = run(sample_pdf, checkpoint, client)
+    assert resumed["resumed_parts"] == 1
+    assert 0 < client.calls < full_client.calls
+    assert resumed["metrics"] == full["metrics"]
+
+
+def test_report_key_depends_on_text_backend():
+    extractor = MetricsExtractor(client=FakeGeminiClient(latency=0))
+    keys = {report_key("0" * 64, extractor, backend=backend) for backend in ("pdfplumber", "pymupdf", "markdown")}
+    assert len(keys) == 3
+
+
+def test_record_after_torn_line_is_kept(tmp_path):
+    checkpoint = PartCheckpoint("report", str(tmp_path))
+    checkpoint.record((1, 3), [{"metric_name": "Water use"}], [])
+    with open(checkpoint.path, "a") as f:
+        f.write('{"pages": [4, 6], "sta')  # interrupted write
+    checkpoint.record((7, 9), [], [])
+    assert set(checkpoint.completed()) == {(1, 3), (7, 9)}
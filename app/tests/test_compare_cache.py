@@ -0,0 +1,32 @@
+from extractor.compare_cache import ComparisonCache, table_hash
+
+
+def row(name, value):
+    return {"metric_name": name, "value": value, "unit": "t", "year": "2024", "source": "report - page 1"}
+
+
+ADM = [row("Scope 1", "10"), row("Water", "5")]
+CARGILL = [row("Energy", "7"), row("Scope 1 emissions", "12")]
+PEPSICO = [row("Direct emissions", "30")]
+
+
+def test_same_tables_in_any_order_hit_the_same_entry(tmp_path):
+    cache = ComparisonCache(str(tmp_path))
+    cache.put([ADM, CARGILL], "Environmental", [{"common_metric": "Scope 1 emissions", "ids": ["d1:0", "d2:1"]}])
+
+    # Tables swapped and rows reordered: ids point at the same rows
+    groups = cache.get([CARGILL[::-1], ADM], "environmental")
+    assert [group["common_metric"] for group in groups] == ["Scope 1 emissions"]
+    assert sorted(groups[0]["ids"]) == ["d1:0", "d2:0"]
+    assert table_hash(CARGILL[::-1]) == table_hash(CARGILL)
+    assert cache.get([ADM, CARGILL], "Social") is None
+
+
+def test_larger_comparison_starts_from_a_cached_subset(tmp_path):
+    cache = ComparisonCache(str(tmp_path))
+    cache.put([ADM, CARGILL], "Environmental", [{"common_metric": "Scope 1 emissions", "ids": ["d1:0", "d2:1"]}])
+
+    assert cache.get([PEPSICO, CARGILL, ADM], "Environmental") is None
+    groups, covered = cache.best_subset([PEPSICO, CARGILL, ADM], "Environmental")
+    assert covered == {2, 3}
+    assert [sorted(group["ids"]) for group in groups] == [["d2:1", "d3:0"]]
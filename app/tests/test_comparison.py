@@ -0,0 +1,10 @@
+from extractor.comparison import resolve_groups
+
+
+def test_made_up_and_negative_ids_are_dropped():
+    tables = [[{"metric_name": "Scope 1"}], [{"metric_name": "Scope 1 emissions"}, {"metric_name": "Water"}]]
+    groups = resolve_groups(tables, [
+        {"common_metric": "Scope 1 emissions", "ids": ["d1:0", "d2:0", "d2:-1", "d1:-1", "d3:0", "d0:0", "x"]},
+        {"common_metric": "Water", "ids": ["d2:1", "d1:-1"]},
+    ])
+    assert groups == [{"common_metric": "Scope 1 emissions", "ids": ["d1:0", "d2:0"]}]
@@ -0,0 +1,31 @@
+from extractor.dedupe import dedupe_metrics
+
+
+def metric(value, unit, page, year="2024", name="Scope 1 emissions"):
+    return {"metric_name": name, "value": value, "unit": unit, "year": year, "source_page": page}
+
+
+def test_same_value_in_other_units_is_merged():
+    merged = dedupe_metrics([
+        metric("251,712", "tCO2e", 3),
+        metric("251.712", "thousand tCO2e", 9, year="FY2024", name="Scope 1 Emissions"),
+    ])
+    assert len(merged) == 1
+    assert merged[0]["value"] == "251,712"
+    assert merged[0]["source_pages"] == [3, 9]
+    assert merged[0]["occurrences"] == 2
+    assert merged[0]["conflict"] is False
+
+
+def test_different_values_are_kept_and_flagged():
+    merged = dedupe_metrics([metric("251,712", "tCO2e", 3), metric("260,000", "tCO2e", 12)])
+    assert [m["value"] for m in merged] == ["251,712", "260,000"]
+    assert all(m["conflict"] for m in merged)
+
+
+def test_other_years_and_unnamed_rows_pass_through():
+    unnamed = {"value": "raw model output"}
+    merged = dedupe_metrics([metric("1", "t", 1), metric("2", "t", 2, year="2023"), unnamed])
+    assert len(merged) == 3
+    assert not any(m.get("conflict") for m in merged)
+    assert merged[-1] is unnamed
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from google.genai import types
+from pydantic import BaseModel, Field
+
+from extractor.fake_client import FakeGeminiClient
+from extractor.schema import Metric
+
+
+class WithExamples(BaseModel):
+    name: str = Field(examples=["Water withdrawal"])
+
+
+def test_requests_the_sdk_would_refuse_fail():
+    client = FakeGeminiClient(latency=0)
+    bad = types.GenerateContentConfig(response_mime_type="application/json", response_schema=list[WithExamples])
+    with pytest.raises(Exception, match="Extra inputs are not permitted"):
+        client.models.generate_content(model="gemini-2.5-flash", contents="=== PAGE 1 ===\nx\n=== END PAGE 1 ===",
+                                       config=bad)
+    with pytest.raises(Exception, match="Extra inputs are not permitted"):
+        asyncio.run(client.aio.models.generate_content(model="gemini-2.5-flash", contents="", config=bad))
+    assert client.calls == 0
+
+
+def test_valid_config_gets_a_reply():
+    client = FakeGeminiClient(latency=0)
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=list[Metric])
+    response = client.models.generate_content(model="gemini-2.5-flash",
+                                              contents="=== PAGE 4 ===\ntext\n=== END PAGE 4 ===", config=config)
+    assert client.calls == 1
+    assert '"source_page": 4' in response.text
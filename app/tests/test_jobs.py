@@ -0,0 +1,32 @@
+import time
+
+from extractor.fake_client import FakeGeminiClient
+from extractor.jobs import JobRunner, JobStore
+from extractor.text_store import PageTextStore
+
+
+def wait_for(store, job_id, statuses, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_job_without_api_key_waits_for_one(sample_pdf, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"), str(tmp_path / "uploads"))
+    keys = []
+    runner = JobRunner(store, workers=1, page_store=PageTextStore(str(tmp_path / "page_text")),
+                       client_factory=lambda key: keys.append(key) or FakeGeminiClient(latency=0),
+                       poll_interval=0.01)
+    # As after a restart: the job is in the store but its key was never seen
+    job_id = store.enqueue(sample_pdf.name, sample_pdf.read_bytes())
+    runner.start()
+    try:
+        job = wait_for(store, job_id, {"needs_key"})
+        assert job["error"]
+        assert keys == []
+    finally:
+        runner.stop()
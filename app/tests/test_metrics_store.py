@@ -0,0 +1,66 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from extractor.metrics_store import MetricsStore
+
+ROWS = [
+    {"metric_name": "Scope 1 emissions", "value": "1,200", "unit": "tCO2e", "year": "FY2024",
+     "category": "environmental", "source": "ADM - page 3"},
+    {"metric_name": "Women in management", "value": "31%", "unit": "%", "year": None,
+     "category": "Social", "source": "ADM - page 4"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetricsStore(str(tmp_path / "store"))
+    assert store.write_report("ADM-2024-sustainability", pd.DataFrame(ROWS)) == 2
+    return store
+
+
+def test_write_report_types_and_partitions_rows(store):
+    frame = store.query().set_index("metric_name")
+    assert frame.loc["Scope 1 emissions", "company"] == "adm"
+    assert frame.loc["Scope 1 emissions", "year"] == 2024
+    assert frame.loc["Scope 1 emissions", "category"] == "Environmental"
+    assert frame.loc["Scope 1 emissions", "canonical_value"] == 1200.0
+    assert pd.isna(frame.loc["Women in management", "year"])
+    assert {path.parent.name for path in store.root.rglob("*.parquet")} == {"category=Environmental", "category=Social"}
+
+
+def test_query_prunes_partitions(store):
+    # An unreadable file in the Social partition is never opened for an Environmental query
+    [social] = store.root.rglob("category=Social/*.parquet")
+    social.write_bytes(b"not parquet")
+    frame = store.query(columns=["metric_name", "year"], category="Environmental", years=[2024])
+    assert frame.to_dict("records") == [{"metric_name": "Scope 1 emissions", "year": 2024}]
+
+
+def test_null_years_match_no_year_filter(store):
+    assert store.query(years=[2024])["metric_name"].tolist() == ["Scope 1 emissions"]
+    assert store.query(category="Social")["year"].isna().all()
+
+
+def test_rewriting_a_report_replaces_only_its_rows(store):
+    store.write_report("ADM 2024 sustainability", pd.DataFrame(ROWS[:1]))  # same slug, other report
+    store.write_report("ADM-2024-sustainability", pd.DataFrame([{**ROWS[0], "value": "1,300"}]))
+    frame = store.query(columns=["report", "value"]).sort_values("report")
+    assert frame.values.tolist() == [["ADM 2024 sustainability", "1,200"], ["ADM-2024-sustainability", "1,300"]]
+
+    store.delete_report("ADM-2024-sustainability")
+    assert store.reports() == ["ADM 2024 sustainability"]
+
+
+def test_ingest_csvs_skips_unchanged_and_unreadable_files(tmp_path, caplog):
+    results = tmp_path / "results"
+    results.mkdir()
+    pd.DataFrame(ROWS).to_csv(results / "Cargill Impact Report.csv", index=False)
+    (results / "broken.csv").write_bytes(b"\xff\xfe\x00bad")
+    store = MetricsStore(str(tmp_path / "store"))
+    with caplog.at_level(logging.WARNING, logger="extractor.metrics_store"):
+        assert store.ingest_csvs(str(results)) == ["Cargill Impact Report"]
+    assert "Could not ingest broken.csv" in caplog.text
+    assert store.ingest_csvs(str(results)) == []
+    assert sorted(store.query(companies=["Cargill"])["metric_name"]) == ["Scope 1 emissions", "Women in management"]
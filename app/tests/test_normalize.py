@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from extractor.normalize import parse_values, unit_factor
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,234", 1234.0),
+    ("0.27", 0.27),
+    ("1,234.5", 1234.5),
+    ("1.234,5", 1234.5),
+    ("12,5", 12.5),
+    ("$3.4 million", 3.4e6),
+    ("2.1 bn", 2.1e9),
+    ("approximately 66%", 66.0),
+    ("(12.5)", -12.5),
+    ("100 m", 100.0),
+    ("1,234 tonnes", 1234.0),
+])
+def test_parse_values_numbers(text, expected):
+    assert parse_values(pd.Series([text]))["value_numeric"].iloc[0] == pytest.approx(expected)
+
+
+def test_parse_values_text_and_percent():
+    parsed = parse_values(pd.Series(["in place since 2018", None, "45%", "45"]))
+    assert np.isnan(parsed["value_numeric"].iloc[0])
+    assert np.isnan(parsed["value_numeric"].iloc[1])
+    assert parsed["is_percent"].tolist() == [False, False, True, False]
+
+
+@pytest.mark.parametrize("unit, expected", [
+    ("Mt CO2e", ("tCO2e", 1e6)),
+    ("MT CO2e", ("tCO2e", 1.0)),
+    ("million metric tons of CO2e", ("tCO2e", 1e6)),
+    ("GWh", ("MWh", 1e3)),
+])
+def test_unit_factor(unit, expected):
+    canonical, factor = unit_factor(unit)
+    assert canonical == expected[0]
+    assert factor == pytest.approx(expected[1])
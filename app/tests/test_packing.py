@@ -0,0 +1,42 @@
+from extractor.fake_client import FakeGeminiClient
+from extractor.gemini_extractor import MetricsExtractor
+from extractor.utils import estimate_tokens
+
+
+def pages(*sizes):
+    return [{"page_number": number, "text": "x" * size} for number, size in enumerate(sizes, start=1)]
+
+
+def test_consecutive_pages_are_packed_under_the_budget():
+    extractor = MetricsExtractor(client=FakeGeminiClient(latency=0), max_input_tokens=2000)
+    budget_for_pages = 2000 - estimate_tokens(extractor.base_prompt)
+    # Pages of 40% of the budget each (4 characters per token), and one larger than the whole budget
+    size = budget_for_pages * 4 * 2 // 5
+    batches = extractor.pack_pages(pages(size, size, size, 20_000, size))
+    assert [[chunk["page_number"] for chunk in batch] for batch in batches] == [[1, 2], [3], [4], [5]]
+    for batch in batches:
+        if len(batch) > 1:
+            assert estimate_tokens(extractor._build_prompt(batch)) <= 2000
+
+
+def test_zero_budget_sends_one_page_per_request():
+    extractor = MetricsExtractor(client=FakeGeminiClient(latency=0), max_input_tokens=0)
+    assert [len(batch) for batch in extractor.pack_pages(pages(10, 10, 10))] == [1, 1, 1]
+
+
+def test_metrics_of_a_packed_request_keep_their_own_page():
+    extractor = MetricsExtractor(client=FakeGeminiClient(latency=0), max_input_tokens=8000)
+    assert extractor._parse_response('[{"metric_name": "Water", "source_page": "13"}, '
+                                     '{"metric_name": "Energy", "source_page": 40}, '
+                                     '{"metric_name": "Waste"}]', [12, 13, 14]) == [
+        {"metric_name": "Water", "source_page": 13},
+        {"metric_name": "Energy", "source_page": "12-14"},
+        {"metric_name": "Waste", "source_page": "12-14"},
+    ]
+
+    client = FakeGeminiClient(latency=0)
+    extractor = MetricsExtractor(client=client, max_input_tokens=8000)
+    chunks = [{"page_number": number, "text": f"Water withdrawal on page {number}: 1,200 m3"} for number in (3, 4, 5)]
+    metrics = extractor.extract_metrics(chunks)
+    assert client.calls == 1
+    assert {m["source_page"] for m in metrics} == {3, 4, 5}
@@ -0,0 +1,27 @@
+import itertools
+from types import SimpleNamespace
+
+import extractor.page_cache as page_cache
+from extractor.page_cache import PageCache
+
+
+def test_least_recently_used_pages_are_evicted_first(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(page_cache, "time", SimpleNamespace(time=lambda: next(clock)))
+    metrics = [{"metric_name": "Water use", "value": "1,200", "source_page": 4}]
+    size = len('[{"metric_name": "Water use", "value": "1,200"}]')
+    cache = PageCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * size)
+
+    cache.put("a", metrics)
+    cache.put("b", metrics)
+    assert cache.get("a") == [{"metric_name": "Water use", "value": "1,200"}]  # source_page is not cached
+    cache.put("c", metrics)  # over budget: "b" was used least recently
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_key_changes_with_prompt_and_model():
+    keys = {PageCache.make_key("page text", prompt, model)
+            for prompt in ("prompt v1", "prompt v2") for model in ("flash", "flash-lite")}
+    assert len(keys) == 4
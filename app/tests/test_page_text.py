@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+
+from extractor.page_text import iter_page_texts, page_markdown
+from extractor.text_store import PageTextStore, content_hash
+
+
+def test_process_pool_matches_single_open(sample_pdf):
+    single = [chunk for window in iter_page_texts(sample_pdf, backend="pymupdf", pages_per_window=4)
+              for chunk in window]
+    pooled = [chunk for window in iter_page_texts(sample_pdf.read_bytes(), backend="pymupdf", workers=2,
+                                                  pages_per_window=4) for chunk in window]
+    assert [chunk["page_number"] for chunk in single] == list(range(1, len(single) + 1))
+    assert pooled == single
+
+
+@pytest.fixture
+def numbered_pdf(tmp_path):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for number in range(1, 6):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {number}", fontsize=16)
+        page.insert_text((72, 110), f"Water withdrawal reported on page {number}: {number},200 m3", fontsize=10)
+    path = tmp_path / "numbered.pdf"
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def assert_own_page(pages):
+    assert len(pages) == 5
+    for number, text in enumerate(pages, start=1):
+        assert f"page {number}:" in text
+        assert not any(f"page {other}:" in text for other in range(1, 6) if other != number)
+
+
+def test_page_markdown_keeps_pages_apart(numbered_pdf, tmp_path):
+    pages = page_markdown(numbered_pdf)
+    assert_own_page(pages)
+    assert page_markdown(numbered_pdf.read_bytes(), workers=2) == pages
+
+    store = PageTextStore(str(tmp_path / "page_text"))
+    assert page_markdown(numbered_pdf, store=store) == pages
+    assert store.texts(content_hash(numbered_pdf), "markdown") == pages
+    chunks = [chunk for window in iter_page_texts(numbered_pdf, backend="markdown", pages_per_window=2, store=store)
+              for chunk in window]
+    assert [chunk["page_number"] for chunk in chunks] == [1, 2, 3, 4, 5]
+
+
+def test_markdown_failure_falls_back_to_plain_text(numbered_pdf, monkeypatch, caplog):
+    import pymupdf4llm
+
+    to_markdown = pymupdf4llm.to_markdown
+
+    def flaky(doc, pages, **kwargs):
+        if pages == [2]:
+            raise RuntimeError("layout analysis failed")
+        return to_markdown(doc, pages=pages, **kwargs)
+    monkeypatch.setattr(pymupdf4llm, "to_markdown", flaky)
+    with caplog.at_level(logging.WARNING, logger="extractor.page_text"):
+        pages = page_markdown(numbered_pdf)
+    assert_own_page(pages)
+    assert "pymupdf4llm failed on page 3" in caplog.text
@@ -0,0 +1,47 @@
+import re
+
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from extractor.page_text import iter_page_texts
+from extractor.pdf_parser import PDFParser
+
+WORD = re.compile(r"\bp(\d+)w\d+\b")
+
+
+@pytest.fixture
+def word_pdf(tmp_path):
+    """Six pages of words tagged with their page: "p3w17" is word 17 of page 3."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for number in range(1, 7):
+        words = " ".join(f"p{number}w{index}" for index in range(120))
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), words, fontsize=10)
+    path = tmp_path / "words.pdf"
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def test_chunks_match_the_whole_document_splitter(word_pdf):
+    chunks = list(PDFParser(chunk_size=300, chunk_overlap=60).iter_chunks(str(word_pdf)))
+    text = "".join(page["text"] + "\n" for window in iter_page_texts(word_pdf, backend="pypdf2") for page in window)
+    reference = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=60).split_text(text)
+    assert [chunk["text"] for chunk in chunks] == reference
+
+
+def test_page_range_and_overlap_across_page_boundaries(word_pdf):
+    # The splitter overlaps whole lines, so the overlap is longer than one line (about 90 characters)
+    chunks = list(PDFParser(chunk_size=300, chunk_overlap=150).iter_chunks(str(word_pdf)))
+    for chunk in chunks:
+        pages = [int(page) for page in WORD.findall(chunk["text"])]
+        assert (chunk["page_start"], chunk["page_end"]) == (min(pages), max(pages))
+        assert chunk["page_number"] == chunk["page_start"]
+    assert chunks[0]["page_start"] == 1 and chunks[-1]["page_end"] == 6
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["text"].split()[0] in previous["text"].split()
+    # Overlap carried over a page break: the chunk repeats the end of page 1 before page 2 starts
+    assert any(chunk["page_start"] == 1 and chunk["page_end"] == 2 and chunk["text"].startswith("p1w119\np2w0")
+               for chunk in chunks)
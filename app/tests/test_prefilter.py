@@ -0,0 +1,31 @@
+from extractor.prefilter import RelevancePrefilter, score_page
+
+KPI_PAGE = "Scope 1 emissions 2024: 251,712 tCO2e. Water withdrawal 1,200 m3, down 12% against the 2019 baseline."
+NARRATIVE = "We work with farmers, customers and communities on the journey to a more sustainable future."
+CONTENTS = "Contents 3 Our purpose 7 Strategy 12 People 18 Planet 24 Governance 30 Index 41"
+
+
+def test_kpi_figures_score_high():
+    scores = score_page(KPI_PAGE)
+    assert scores["score"] == 1.0
+    assert scores["years"] == 2
+    assert scores["units"] == 3
+
+
+def test_pages_without_esg_figures_score_low():
+    assert score_page(NARRATIVE)["score"] == 0
+    assert score_page("Published in 2024. " + NARRATIVE)["score"] == 0  # years alone are not figures
+    assert score_page(CONTENTS)["score"] < 0.2  # numbers without units or keywords
+    assert score_page("")["score"] == 0
+
+
+def test_split_keeps_pages_at_or_above_the_threshold():
+    chunks = [{"page_number": 1, "text": CONTENTS}, {"page_number": 2, "text": KPI_PAGE},
+              {"page_number": 3, "text": NARRATIVE}]
+    kept, decisions = RelevancePrefilter(0.2).split(chunks)
+    assert [chunk["page_number"] for chunk in kept] == [2]
+    assert [(d["page_number"], d["decision"]) for d in decisions] == [(1, "skip"), (2, "extract"), (3, "skip")]
+    assert set(decisions[1]) >= {"score", "numeric_density", "units", "years", "keywords"}
+
+    kept, _ = RelevancePrefilter(0).split(chunks)
+    assert kept == chunks
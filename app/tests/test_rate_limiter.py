@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from extractor.rate_limiter import RateLimiter
+
+
+def test_requests_per_minute_allows_a_burst_then_throttles():
+    limiter = RateLimiter(requests_per_minute=2)
+    asyncio.run(limiter.acquire())
+    limiter.acquire_sync()
+    assert limiter._reserve(0) == pytest.approx(30.0, abs=0.1)
+
+
+def test_token_quota_holds_back_large_requests():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    assert limiter._reserve(800) == 0
+    # 300 more tokens needed at 1000/min; the request bucket is not charged for the refused call
+    assert limiter._reserve(500) == pytest.approx(18.0, abs=0.1)
+    assert limiter.requests.available == pytest.approx(59.0, abs=0.1)
+    assert limiter._reserve(100) == 0
+
+
+def test_request_larger_than_the_quota_waits_for_a_full_bucket():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    assert limiter._reserve(5000) == 0
+    assert limiter._reserve(5000) == pytest.approx(60.0, abs=0.1)
+
+
+def test_configure_changes_quotas_in_place():
+    limiter = RateLimiter(requests_per_minute=1)
+    assert limiter._reserve(0) == 0
+    limiter.configure(requests_per_minute=120, tokens_per_minute=10)
+    assert limiter.requests.capacity == 120
+    assert limiter._reserve(20) == pytest.approx(0.5, abs=0.1)  # the first request's slot has not refilled yet
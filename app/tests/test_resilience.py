@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from extractor.resilience import CircuitBreaker, ResilientCaller, server_retry_delay
+
+
+def api_error(code, retry_delay=None):
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}] if retry_delay else []
+    return errors.APIError(code, {"error": {"code": code, "status": "ERROR", "details": details}})
+
+
+def flaky(failures):
+    """A send() that raises each of `failures` in turn, then returns "ok"."""
+    remaining = list(failures)
+
+    def send():
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+    return send
+
+
+def test_transient_errors_are_retried():
+    caller = ResilientCaller(max_attempts=3, base_delay=0.001, seed=0)
+    assert caller.call_sync(flaky([api_error(503), api_error(429)])) == "ok"
+    assert caller.retries == 2
+
+
+def test_async_call_gives_up_after_max_attempts():
+    caller = ResilientCaller(max_attempts=3, base_delay=0.001, seed=0)
+    send = flaky([api_error(503)] * 3)
+
+    async def send_async():
+        return send()
+    with pytest.raises(errors.APIError):
+        asyncio.run(caller.call(send_async))
+    assert caller.retries == 2
+
+
+def test_client_errors_are_not_retried():
+    caller = ResilientCaller(base_delay=0.001)
+    with pytest.raises(errors.APIError):
+        caller.call_sync(flaky([api_error(400)]))
+    assert caller.retries == 0
+
+
+def test_backoff_grows_and_waits_for_the_server_hint():
+    caller = ResilientCaller(base_delay=1.0, max_delay=60.0, seed=0)
+    assert all(0 <= caller.backoff(attempt, api_error(503)) <= 2 ** attempt for attempt in range(1, 6))
+    assert caller.backoff(10, api_error(503)) <= 60.0
+    assert server_retry_delay(api_error(429, "12s")) == 12.0
+    assert 12.0 <= caller.backoff(1, api_error(429, "12s")) <= 13.0
+
+
+def test_breaker_opens_on_quota_errors_and_repeated_server_errors():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30.0)
+    breaker.record_failure(api_error(429), delay=5.0)
+    assert 4.0 < breaker.remaining() <= 5.0
+
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30.0)
+    breaker.record_failure(api_error(503), delay=1.0)
+    assert breaker.remaining() == 0
+    breaker.record_failure(api_error(503), delay=1.0)
+    assert 29.0 < breaker.remaining() <= 30.0
+    assert breaker.trips == 1
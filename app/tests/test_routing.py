@@ -0,0 +1,45 @@
+from extractor.routing import ModelRouter
+
+SIMPLE = {"page_number": 1, "text": "Our purpose is to make life better for farmers and communities."}
+TABLE = {"page_number": 2, "text": "Scope 1 251,712 240,100\nScope 2 120,000 118,500\nWater 1.2 1.1\nNotes"}
+DENSE = {"page_number": 3, "text": "word " * 2000}
+
+
+def test_page_tier_and_route():
+    router = ModelRouter(dense_tokens=1000, table_lines=0.35)
+    assert router.page_tier(SIMPLE) == ("light", "simple")
+    assert router.page_tier(TABLE) == ("full", "tables")
+    assert router.page_tier(DENSE) == ("full", "dense")
+    assert router.route([SIMPLE]) == ("gemini-2.5-flash-lite", "simple")
+    assert router.route([SIMPLE, TABLE, DENSE]) == ("gemini-2.5-flash", "dense+tables")
+
+
+def test_empty_or_invalid_light_answers_escalate():
+    router = ModelRouter()
+    assert router.escalation("gemini-2.5-flash-lite", []) == "empty"
+    assert router.escalation("gemini-2.5-flash-lite", [{"raw_output": "not json"}]) == "invalid"
+    assert router.escalation("gemini-2.5-flash-lite", [{"metric_name": "Water"}]) is None
+    assert router.escalation("gemini-2.5-flash", []) is None
+
+
+def test_same_model_for_both_tiers_never_escalates():
+    router = ModelRouter(light_model="gemini-2.5-flash", full_model="gemini-2.5-flash")
+    assert router.escalation("gemini-2.5-flash", []) is None
+
+
+def test_budget_stops_full_model_and_escalation():
+    router = ModelRouter(token_budget=1000)
+    router.record("1", "gemini-2.5-flash", "tables", input_tokens=900, output_tokens=50, seconds=1.0)
+    assert router.route([TABLE]) == ("gemini-2.5-flash", "tables")
+    router.record("2", "gemini-2.5-flash-lite", "simple", input_tokens=40, output_tokens=10, seconds=0.5)
+    assert router.over_budget()
+    assert router.route([TABLE]) == ("gemini-2.5-flash-lite", "budget")
+    assert router.escalation("gemini-2.5-flash-lite", []) is None
+
+    summary = router.summary()
+    assert summary["tiers"]["full"]["requests"] == summary["tiers"]["light"]["requests"] == 1
+    assert summary["cost_usd"] > 0
+
+    router = ModelRouter(latency_budget=2.0)
+    router.record("1", "gemini-2.5-flash", "dense", input_tokens=10, output_tokens=10, seconds=2.5)
+    assert router.route([DENSE]) == ("gemini-2.5-flash-lite", "budget")
@@ -0,0 +1,16 @@
+from google.genai import _transformers
+
+from extractor.schema import Metric, MetricList
+
+
+def test_metric_schema_converts_for_the_sdk():
+    # The conversion generate_content applies to `response_schema`
+    schema = _transformers.t_schema(None, list[Metric])
+    assert schema.items.required == ["metric_name", "value", "category", "source_page"]
+    assert set(schema.items.properties) == {"metric_name", "value", "unit", "year", "category", "source_page"}
+
+
+def test_replies_validate_against_the_schema():
+    [metric] = MetricList.validate_json('[{"metric_name": "Water withdrawal", "value": "1,2", "unit": "m3", '
+                                        '"year": 2024, "category": "Environmental", "source_page": 3}]')
+    assert metric.model_dump(mode="json")["category"] == "Environmental"
@@ -0,0 +1,33 @@
+from extractor.tables import parse_table
+
+
+def test_kpi_table_becomes_metric_rows():
+    metrics, confidence = parse_table([
+        ["Metric", "Unit", "FY2023", "2024"],
+        ["Environment", "", "", ""],
+        ["Scope 1 emissions", "tCO2e", "251,712", "240,100"],
+        ["Water withdrawal (m3)", "", "1.2", "1.1"],
+        ["Women in management", "", "31%2", "33%"],
+    ], page_number=7)
+    assert confidence == 1.0
+    assert len(metrics) == 6
+    assert metrics[0] == {"metric_name": "Scope 1 emissions", "value": "251,712", "unit": "tCO2e", "year": 2023,
+                          "category": "Environmental", "source_page": 7}
+    water = metrics[2]
+    assert (water["metric_name"], water["unit"], water["year"]) == ("Water withdrawal", "m3", 2023)
+    # The footnote marker after the percent sign is dropped
+    assert [m["value"] for m in metrics[4:]] == ["31%", "33%"]
+    assert metrics[4]["unit"] == "%"
+
+
+def test_table_without_year_header_is_left_to_the_llm():
+    assert parse_table([["Site", "Country"], ["Plant A", "Brazil"]], page_number=1) == ([], 0.0)
+
+
+def test_unparsed_values_lower_confidence():
+    metrics, confidence = parse_table([
+        ["KPI", "2023", "2024"],
+        ["Energy use", "n/a", "1,500"],
+    ], page_number=2)
+    assert [m["value"] for m in metrics] == ["1,500"]
+    assert confidence == 0.5
@@ -0,0 +1,11 @@
+from extractor.telemetry import RunTelemetry
+
+
+def test_reruns_overwrite_one_prometheus_file(tmp_path):
+    for run_id in ("20260101-120000", "20260101-130000"):
+        telemetry = RunTelemetry("report.pdf")
+        telemetry.record_request(started=0.0, seconds=0.5, pages=2, input_tokens=100, output_tokens=20)
+        telemetry.write("report", str(tmp_path), run_id=run_id)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "report-20260101-120000.json", "report-20260101-130000.json", "report.prom"]
+    assert 'esg_extract_requests_total{report="report.pdf",status="ok"} 1' in (tmp_path / "report.prom").read_text()
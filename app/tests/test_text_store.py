@@ -0,0 +1,47 @@
+import pytest
+
+from extractor import page_text
+from extractor.page_text import iter_page_texts
+from extractor.text_store import PageTextStore
+
+PDF_HASH = "ab" + "0" * 62
+
+
+def test_pages_round_trip(tmp_path):
+    store = PageTextStore(str(tmp_path))
+    pages = ["Scope 1: 251,712 tCO2e", "", "Wasser – 1,2 Mio. m³"]
+    assert store.put(PDF_HASH, "pdfplumber", pages) == 3
+    assert store.texts(PDF_HASH, "pdfplumber") == pages
+    assert store.texts(PDF_HASH, "pymupdf") is None
+
+    stored = store.get(PDF_HASH, "pdfplumber")
+    try:
+        assert len(stored) == 3
+        assert stored[2] == pages[2]
+        with pytest.raises(IndexError):
+            stored[3]
+    finally:
+        stored.close()
+
+
+def test_interrupted_write_is_not_stored(tmp_path):
+    store = PageTextStore(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with store.writer(PDF_HASH, "markdown") as writer:
+            writer.append("# Page 1")
+            raise RuntimeError("extraction failed")
+    assert not store.has(PDF_HASH, "markdown")
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+def test_rerun_reads_the_store_without_opening_the_pdf(sample_pdf, tmp_path, monkeypatch):
+    store = PageTextStore(str(tmp_path))
+    first = [chunk for window in iter_page_texts(sample_pdf, backend="pymupdf", store=store) for chunk in window]
+
+    def refuse(source):
+        raise AssertionError("the PDF was opened again")
+    _, count, pages = page_text.BACKENDS["pymupdf"]
+    monkeypatch.setitem(page_text.BACKENDS, "pymupdf", (refuse, count, pages))
+    windows = list(iter_page_texts(sample_pdf, backend="pymupdf", pages_per_window=4, store=store))
+    assert [chunk for window in windows for chunk in window] == first
+    assert len(windows[0]) == 4